@@ -7,7 +7,7 @@ import board
 import time
 
 # this package
-from mfrc522 import MFRC522
+from mfrc522 import MFRC522, CardInfo
 
 # Define SPI pins for RP2040-Zero
 sck = board.GP2
@@ -22,6 +22,18 @@ rdr = MFRC522(sck, mosi, miso, rst, cs)
 # Default key for authentication
 default_key = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
 
+def print_block(data, uid_hex):
+    print(list(data))
+
+    if list(data) == [0] * 16:  # Check if the block is empty
+        print("Block is empty.")
+        print(uid_hex)  # Output the UID as keyboard input
+
+    else:
+        password = bytes(data).decode().rstrip('\x00')
+        print("Password Retrieved. Typing password...")
+        print(password)  # Type the password as keyboard input
+
 def do_read():
 
     print('')
@@ -41,49 +53,17 @@ def do_read():
                     uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
                     
                     print("Card UID:", uid_hex)
-                    print("  - tag type: 0x%02x" % tag_type)
-                    
-                    if rdr.IsNTAG():
-                        print("Got NTAG{}".format(rdr.NTAG))
-                        data = rdr.read(8)
-                        
-                        print(list(data))
-                        
-                        if list(data) == [0] * 16:  # Check if the block is empty
-                            print("Block is empty.")
-                            print(uid_hex)  # Output the UID as keyboard input
-
-                        else:
-                            password = bytes(data).decode().rstrip('\x00')
-                            print("Password Retrieved. Typing password...")
-                            print(password)  # Type the password as keyboard input
-                    
+                    print("  - card:", rdr.card_info.family_name)
+
+                    if rdr.card_info.family == CardInfo.ULTRALIGHT:
+                        print_block(rdr.read(8), uid_hex)
+
+                    elif rdr.auth(rdr.AUTHENT1A, 8, default_key, raw_uid) == rdr.OK:
+                        print_block(rdr.read(8), uid_hex)
+
                     else:
-                        (stat, tag_type) = rdr.request(rdr.REQIDL)
-                        if stat == rdr.OK:
-                            (stat, raw_uid) = rdr.SelectTagSN()
-                            if stat == rdr.OK:
-                                
-                                if rdr.auth(rdr.AUTHENT1A, 8, default_key, raw_uid) == rdr.OK:
-                                    data = rdr.read(8)
-                                    
-                                    print(list(data))
-                                    
-                                    if list(data) == [0] * 16:  # Check if the block is empty
-                                        print("Block is empty.")
-                                        print(uid_hex)  # Output the UID as keyboard input
-
-                                    else:
-                                        password = bytes(data).decode().rstrip('\x00')
-                                        print("Password Retrieved. Typing password...")
-                                        print(password)  # Type the password as keyboard input
-                                        
-                                else:
-                                    print("Authentication failed.")
-                                    
-                            else:
-                                print("Failed to read card.")
-                                
+                        print("Authentication failed.")
+
                     rdr.stop_crypto1()
 
             time.sleep(1)
@@ -0,0 +1,56 @@
+import board
+import time
+from mfrc522 import MFRC522, CardInfo
+from isodep import IsoDep
+
+# Define SPI pins for RP2040-Zero
+sck = board.GP2
+mosi = board.GP3
+miso = board.GP4
+cs = board.GP0
+rst = board.GP1
+
+# Initialize MFRC522
+rfid = MFRC522(sck, mosi, miso, rst, cs)
+
+# DESFire GetVersion wrapped in an ISO 7816-4 APDU
+GET_VERSION = [0x90, 0x60, 0x00, 0x00, 0x00]
+GET_MORE = [0x90, 0xAF, 0x00, 0x00, 0x00]
+
+print("Waiting for an ISO-DEP card...")
+while True:
+    (status, tag_type) = rfid.request(rfid.REQIDL)
+
+    if status == rfid.OK:
+        (status, raw_uid) = rfid.SelectTagSN()
+
+        if status == rfid.OK and rfid.card_info.family == CardInfo.ISO_DEP:
+            print("Card:", rfid.card_info)
+
+            card = IsoDep(rfid)
+            if card.activate(max_kbps=424) == rfid.OK:
+                print("  - ATS: {}".format(rfid.tohexstring(card.ats)))
+                print("  - {} kbit/s, frame size {}, FWI {}".format(card.kbps, card.fsc, card.fwi))
+
+                version = []
+                apdu = GET_VERSION
+                while True:
+                    (status, resp) = card.transceive(apdu)
+                    if status != rfid.OK or len(resp) < 2:
+                        print("Exchange failed:", rfid.error_text())
+                        break
+
+                    version += resp[:-2]
+                    if resp[-2:] != [0x91, 0xAF]:
+                        break
+                    apdu = GET_MORE
+
+                print("  - version: {}".format(rfid.tohexstring(version)))
+                card.deselect()
+            else:
+                print("RATS failed:", rfid.error_text())
+
+        elif status == rfid.OK:
+            print("Not an ISO-DEP card:", rfid.card_info)
+
+    time.sleep(1)
@@ -0,0 +1,35 @@
+"""
+Example of polling three readers on one SPI bus with ``readerpool``.
+"""
+
+# 3rd party
+import board
+import busio
+import time
+
+# this package
+from mfrc522 import MFRC522
+from readerpool import ReaderPool
+
+# One SPI bus for all readers on the RP2040-Zero
+spi = busio.SPI(board.GP2, MOSI=board.GP3, MISO=board.GP4)
+
+# Every reader has its own SDA/CS and RST pin
+readers = (
+    ("desk", MFRC522(None, None, None, board.GP1, board.GP0, spi=spi)),
+    ("side", MFRC522(None, None, None, board.GP6, board.GP5, spi=spi)),
+    ("badge", MFRC522(None, None, None, board.GP8, board.GP7, spi=spi)),
+)
+
+pool = ReaderPool(readers)
+
+print("Waiting for a card on any reader...")
+while True:
+    for (reader, raw_uid) in pool.poll():
+        uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+        print("Card on", reader.name, "reader:", uid_hex)
+        print("  - card:", reader.rfid.card_info.family_name)
+        print("  - taps on this reader:", reader.taps)
+        reader.rfid.stop_crypto1()
+
+    time.sleep(0.1)  # Poll interval
@@ -36,18 +36,11 @@ while True:
             ndef_bytes = NDEF.encode(text, "utf-8")
             print("NDEF Message to Write:", ndef_bytes.hex())
 
-            # Write NDEF data to the tag
-            start_page = 4  # Start writing from page 4 (user memory)
-            for i in range(0, len(ndef_bytes), 4):
-                page_data = ndef_bytes[i:i+4]
-                if len(page_data) < 4:
-                    page_data += b"\x00" * (4 - len(page_data))  # Pad with zeros
-                status = rfid.writeNTAGPage(start_page + i // 4, list(page_data))
-                if status != rfid.OK:
-                    print("Failed to write NDEF data.")
-                    break
-            else:
+            # Write NDEF data to the tag, one native WRITE per page from page 4 (user memory)
+            if NDEF.write_ndef_data(ndef_bytes, rfid.write_block_ntag, start_block=4):
                 print("NDEF data written successfully!")
+            else:
+                print("Failed to write NDEF data.")
 
             time.sleep(2)
 
@@ -0,0 +1,55 @@
+"""
+CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF, not reflected) of the v1
+slot format and the slot directory, one table lookup per byte.
+"""
+
+from array import array
+
+POLY = 0x1021
+INIT = 0xFFFF
+
+
+def _table():
+    table = array('H', bytes(512))
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ POLY) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table[i] = crc
+    return table
+
+
+TABLE = _table()
+
+
+class CRC16:
+    """
+    Incremental CRC, ``update()`` takes anything iterable as bytes,
+    e.g. a ``memoryview`` slice of a slot buffer, without copying it.
+    """
+
+    def __init__(self):
+        self.value = INIT
+
+    def update(self, data):
+        crc = self.value
+        table = TABLE
+        for byte in data:
+            crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+        self.value = crc
+        return self
+
+
+def crc16(data):
+    """
+    CRC of ``data`` in one go.
+    """
+
+    crc = INIT
+    table = TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
@@ -0,0 +1,258 @@
+"""
+ISO/IEC 14443-4 (T=CL) transport for ISO-DEP cards (e.g. DESFire) on top
+of the ``mfrc522`` driver.
+"""
+
+import time
+
+
+class IsoDep:
+    """
+    Block transmission protocol for an ISO-DEP card that has already been
+    selected with ``SelectTagSN()`` (SAK bit 5 set, see ``CardInfo``).
+
+    Frames are exchanged through ``MFRC522._tocard`` with the chip doing the
+    CRC_A, so a frame of up to ``FSD`` bytes streams through the 64 byte FIFO.
+
+    :param rfid: The ``MFRC522`` instance.
+    :param cid: Card identifier sent in every block, ``None`` for no CID.
+    """
+
+    # FSDI/FSCI to frame size in bytes
+    FSC_TABLE = (16, 24, 32, 40, 48, 64, 96, 128, 256)
+
+    # Reader frame size we announce in RATS (FSDI 8, 256 bytes)
+    FSDI = 8
+    FSD = 256
+
+    # Bit rates in the ATS TA(1) DS/DR bits and the PPS1 DSI/DRI codes
+    BITRATES = ((848, 0x04, 3), (424, 0x02, 2), (212, 0x01, 1))
+
+    # One ETU-based frame waiting time unit, 256 * 16 / fc
+    FWT_UNIT_US = 302
+
+    def __init__(self, rfid, cid=None):
+        self.rfid = rfid
+        self.cid = cid
+        self.ats = None
+        self.fsc = 32
+        self.fwi = 4
+        self.sfgi = 0
+        self.ta = 0
+        self.kbps = 106
+        self.rx_kbps = 106
+        self.block_num = 0
+
+    def _frame(self, pcb, data=()):
+        if self.cid is None:
+            return [pcb] + list(data)
+        return [pcb | 0x08, self.cid] + list(data)
+
+    def _header_len(self, pcb):
+        return 1 + (1 if pcb & 0x08 else 0) + (1 if pcb & 0x04 else 0)
+
+    def _fwt_us(self, fwi):
+        # One extra unit of slack for the chip's own latency
+        return self.FWT_UNIT_US * ((1 << fwi) + 1)
+
+    def activate(self, max_kbps=424):
+        """
+        Switch the selected card to ISO-DEP: RATS, then PPS up to
+        ``max_kbps`` when the card supports it, then the FWI timeout.
+
+        :return: ``OK`` or an error status of the driver.
+        """
+
+        rfid = self.rfid
+        rfid.set_framing(106, crc=True)
+
+        stat = self.rats()
+        if stat != rfid.OK:
+            self.close()
+            return stat
+
+        if max_kbps > 106:
+            self.pps(max_kbps)
+
+        rfid.set_timeout_us(self._fwt_us(self.fwi))
+        return rfid.OK
+
+    def rats(self):
+        """
+        Send RATS and parse the ATS into frame size, FWI and SFGI.
+        """
+
+        rfid = self.rfid
+        cid = self.cid or 0
+
+        (stat, ats, _) = rfid._tocard(0x0C, [0xE0, (self.FSDI << 4) | cid], self.FSD)
+        if stat != rfid.OK or not ats or ats[0] != len(ats):
+            return rfid.ERR
+
+        self.ats = ats
+        self.fsc = 32
+        self.fwi = 4
+        self.sfgi = 0
+        self.block_num = 0
+        self.ta = 0
+
+        if len(ats) > 1:
+            t0 = ats[1]
+            self.fsc = self.FSC_TABLE[min(t0 & 0x0F, 8)]
+            i = 2
+            if t0 & 0x10:
+                self.ta = ats[i]
+                i += 1
+            if t0 & 0x20:
+                self.fwi = ats[i] >> 4
+                self.sfgi = ats[i] & 0x0F
+                i += 1
+
+            # FWI and SFGI 15 are RFU and mean the default
+            if self.fwi == 15:
+                self.fwi = 4
+            if self.sfgi == 15:
+                self.sfgi = 0
+
+        if self.sfgi:
+            time.sleep(self.FWT_UNIT_US * (1 << self.sfgi) / 1000000)
+
+        return rfid.OK
+
+    def pps(self, max_kbps=424):
+        """
+        Negotiate the fastest bit rate both the card (ATS TA(1)) and
+        ``max_kbps`` allow, then switch the reader to it.
+        """
+
+        rfid = self.rfid
+        ta = self.ta
+        dri = dsi = 0
+        tx_kbps = rx_kbps = 106
+
+        for kbps, bit, code in self.BITRATES:
+            if kbps > max_kbps:
+                continue
+            if not dsi and (ta & (bit << 4)):
+                dsi = code
+                rx_kbps = kbps
+            if not dri and (ta & bit):
+                dri = code
+                tx_kbps = kbps
+
+        # TA(1) b8: the card only takes the same bit rate in both directions
+        if ta & 0x80 and dri != dsi:
+            dri = dsi = min(dri, dsi)
+            tx_kbps = rx_kbps = min(tx_kbps, rx_kbps)
+
+        if not (dri or dsi):
+            return rfid.OK
+
+        (stat, recv, _) = rfid._tocard(0x0C, [0xD0 | (self.cid or 0), 0x11, (dsi << 2) | dri])
+        if stat != rfid.OK or not recv or (recv[0] & 0xF0) != 0xD0:
+            return rfid.ERR
+
+        rfid.set_framing(tx_kbps, crc=True, rx_kbps=rx_kbps)
+        self.kbps = tx_kbps
+        self.rx_kbps = rx_kbps
+        return rfid.OK
+
+    def _exchange_block(self, frame):
+        """
+        Send one block and return the card's answer, recovering from lost
+        or broken blocks with R(NAK) (ISO 14443-4 rules 4 and 6).
+        """
+
+        rfid = self.rfid
+        (stat, recv, _) = rfid._tocard(0x0C, frame, self.FSD)
+
+        tries = rfid.retries
+        while (stat != rfid.OK or not recv) and tries:
+            tries -= 1
+            (stat, recv, _) = rfid._tocard(0x0C, self._frame(0xB2 | self.block_num), self.FSD)
+
+            # An R(ACK) for the other block number: our block never arrived
+            if stat == rfid.OK and recv and (recv[0] & 0xF6) == 0xA2 \
+                    and (recv[0] & 0x01) != self.block_num:
+                (stat, recv, _) = rfid._tocard(0x0C, frame, self.FSD)
+
+        if stat == rfid.OK and not recv:
+            stat = rfid.ERR
+        return stat, recv
+
+    def transceive(self, apdu):
+        """
+        Send an APDU in as many chained I-blocks as the card's frame size
+        needs and collect the (possibly chained) answer.
+
+        :return: ``(status, response)``, the response without block headers.
+        """
+
+        rfid = self.rfid
+        room = self.fsc - len(self._frame(0)) - 2
+        pos = 0
+
+        while True:
+            chunk = apdu[pos:pos + room]
+            pos += len(chunk)
+            chaining = pos < len(apdu)
+
+            pcb = 0x02 | self.block_num | (0x10 if chaining else 0x00)
+            (stat, recv) = self._exchange_block(self._frame(pcb, chunk))
+            if stat != rfid.OK:
+                return stat, []
+
+            if not chaining:
+                break
+
+            # Each chained block must be acknowledged with our block number
+            if (recv[0] & 0xF6) != 0xA2 or (recv[0] & 0x01) != self.block_num:
+                return rfid.ERR, []
+            self.block_num ^= 1
+
+        data = []
+        while True:
+            pcb = recv[0]
+
+            if (pcb & 0xF7) == 0xF2:
+                # S(WTX): the card needs WTXM times the frame waiting time
+                wtxm = recv[self._header_len(pcb)] & 0x3F
+                rfid.set_timeout_us(self._fwt_us(self.fwi) * max(1, wtxm))
+                (stat, recv) = self._exchange_block(self._frame(0xF2, [wtxm]))
+                rfid.set_timeout_us(self._fwt_us(self.fwi))
+                if stat != rfid.OK:
+                    return stat, []
+                continue
+
+            if (pcb & 0xE2) != 0x02:
+                return rfid.ERR, []
+
+            self.block_num ^= 1
+            data += recv[self._header_len(pcb):]
+
+            if not (pcb & 0x10):
+                return rfid.OK, data
+
+            # The card chains its answer, R(ACK) asks for the next block
+            (stat, recv) = self._exchange_block(self._frame(0xA2 | self.block_num))
+            if stat != rfid.OK:
+                return stat, []
+
+    def deselect(self):
+        """
+        Send S(DESELECT) and return the reader to 106 kbit/s MIFARE framing.
+        """
+
+        (stat, recv, _) = self.rfid._tocard(0x0C, self._frame(0xC2))
+        self.close()
+        return stat
+
+    def close(self):
+        """
+        Restore the reader's MIFARE framing and timeout without talking
+        to the card.
+        """
+
+        self.rfid.set_framing(106, crc=False)
+        self.rfid.set_timeout_us(self.rfid.DEFAULT_TIMEOUT_US)
+        self.kbps = self.rx_kbps = 106
@@ -2,6 +2,8 @@
 CircuitPython Interface for RC522 boards.
 """
 
+import time
+
 # 3rd party
 import busio
 import digitalio
@@ -9,6 +11,107 @@ from adafruit_bus_device.spi_device import SPIDevice
 from microcontroller import Pin
 
 
+class CardInfo:
+    """
+    What the card told us about itself during request and select.
+
+    The family is inferred from the SAK (NXP AN10833), so no extra RF
+    commands are needed to pick a code path.
+
+    :param uid: The card UID, without cascade tags or BCC.
+    :param atqa: The ATQA as a 16 bit integer, e.g. ``0x0004``.
+    :param sak: The SAK of the last cascade level.
+    """
+
+    UNKNOWN = 0
+    CLASSIC_MINI = 1
+    CLASSIC_1K = 2
+    CLASSIC_4K = 3
+    ULTRALIGHT = 4
+    ISO_DEP = 5
+
+    FAMILY_NAMES = {
+        UNKNOWN: "unknown",
+        CLASSIC_MINI: "MIFARE Classic Mini",
+        CLASSIC_1K: "MIFARE Classic 1K",
+        CLASSIC_4K: "MIFARE Classic 4K",
+        ULTRALIGHT: "MIFARE Ultralight/NTAG",
+        ISO_DEP: "ISO-DEP",
+    }
+
+    # Sectors of the Classic sizes. The 4K has 32 sectors of 4 blocks and
+    # then 8 sectors of 16 blocks, block 3 (or 15) of each is the trailer.
+    SECTORS = {
+        CLASSIC_MINI: 5,
+        CLASSIC_1K: 16,
+        CLASSIC_4K: 40,
+    }
+
+    def __init__(self, uid, atqa, sak):
+        self.uid = uid
+        self.uid_size = len(uid)
+        self.atqa = atqa
+        self.sak = sak
+        self.family = self.family_from_sak(sak)
+
+    @classmethod
+    def family_from_sak(cls, sak):
+        if sak is None:
+            return cls.UNKNOWN
+
+        # Bit 7 is RFU and some clones set it, bit 5 only adds ISO-DEP on
+        # top of a Classic emulation (SmartMX)
+        sak &= 0x7F
+        if sak == 0x09:
+            return cls.CLASSIC_MINI
+        if sak in (0x08, 0x28):
+            return cls.CLASSIC_1K
+        if sak in (0x18, 0x38):
+            return cls.CLASSIC_4K
+        if sak == 0x00:
+            return cls.ULTRALIGHT
+        if sak & 0x20:
+            return cls.ISO_DEP
+        return cls.UNKNOWN
+
+    @property
+    def is_classic(self):
+        return self.family in (self.CLASSIC_MINI, self.CLASSIC_1K, self.CLASSIC_4K)
+
+    @property
+    def sectors(self):
+        return self.SECTORS.get(self.family, 0)
+
+    @staticmethod
+    def first_block(sector):
+        if sector < 32:
+            return sector * 4
+        return 128 + (sector - 32) * 16
+
+    @staticmethod
+    def sector_blocks(sector):
+        return 4 if sector < 32 else 16
+
+    @classmethod
+    def trailer_block(cls, sector):
+        return cls.first_block(sector) + cls.sector_blocks(sector) - 1
+
+    @staticmethod
+    def sector_of(block):
+        if block < 128:
+            return block // 4
+        return 32 + (block - 128) // 16
+
+    @property
+    def family_name(self):
+        return self.FAMILY_NAMES[self.family]
+
+    def __repr__(self):
+        return "<CardInfo uid={} atqa=0x{:04X} sak=0x{:02X} {}>".format(
+            ''.join('{:02X}'.format(x) for x in self.uid),
+            self.atqa or 0, self.sak or 0, self.family_name)
+
+
 class MFRC522:
     """
     CircuitPython Interface for RC522 boards.
@@ -18,6 +121,14 @@ class MFRC522:
     :param miso: The SPI MISO Pin. Typically ``board.MISO``.
     :param rst: The pin connected to the RST terminal on the RC522 board.
     :param cs: The SPI chip select pin, connected to the SDA terminal on the RC522 board.
+    :param retries: How many times a failed frame is repeated before giving up.
+    :param rx_gain: Receiver gain applied on every init(), e.g. ``RXGAIN_38DB``.
+        ``None`` keeps the chip's power-on gain.
+    :param trace: A ``spitrace.SpiTrace`` that records every register access,
+        can also be set later through the ``trace`` attribute.
+    :param spi: A ``busio.SPI`` shared with other readers, each with its own
+        ``cs`` and ``rst``. ``sck``, ``mosi`` and ``miso`` are ignored then.
+        CS lines of readers not constructed yet need a pull-up.
     """
 
     DEBUG = 0
@@ -26,6 +137,32 @@ class MFRC522:
     NOTAGERR = 1
     ERR = 2
 
+    # Detailed status of the last frame, see ``last_error``
+    ERR_CRC = 3
+    ERR_PARITY = 4
+    ERR_COLLISION = 5
+    ERR_BUFFER = 6
+    ERR_PROTOCOL = 7
+    ERR_TIMEOUT = 8
+    ERR_NAK = 9
+
+    ERROR_NAMES = {
+        OK: "ok",
+        NOTAGERR: "no tag",
+        ERR: "error",
+        ERR_CRC: "crc error",
+        ERR_PARITY: "parity error",
+        ERR_COLLISION: "collision",
+        ERR_BUFFER: "buffer overflow",
+        ERR_PROTOCOL: "protocol error",
+        ERR_TIMEOUT: "timeout",
+        ERR_NAK: "nak",
+    }
+
+    # Errors worth repeating the same frame for; a NAK is an answer and a
+    # collision means a second card, neither goes away by asking again
+    RETRY_ERRORS = (ERR_CRC, ERR_PARITY, ERR_BUFFER, ERR_PROTOCOL, ERR_TIMEOUT)
+
     REQIDL = 0x26
     REQALL = 0x52
     AUTHENT1A = 0x60
@@ -40,9 +177,91 @@ class MFRC522:
     PICC_ANTICOLL2 = 0x95
     PICC_ANTICOLL3 = 0x97
 
-    def __init__(self, sck: Pin, mosi: Pin, miso: Pin, rst: Pin, cs: Pin):
-
+    # FIFO level that raises LoAlert/HiAlert while streaming long frames
+    WATER_LEVEL = 32
+
+    # Register/value pairs written by init(), in order. Reading them back is
+    # also the signature that tells a chip that is still configured.
+    INIT_TABLE = (
+        (0x2A, 0x8D),  # TModeReg: TAuto, prescaler high nibble
+        (0x2B, 0x3E),  # TPrescalerReg: ~2 kHz timer clock
+        (0x2D, 30),    # TReloadReg low byte: ~15 ms receive timeout
+        (0x2C, 0),     # TReloadReg high byte
+        (0x15, 0x40),  # TxASKReg: force 100% ASK modulation
+        (0x11, 0x3D),  # ModeReg: CRC preset 0x6363
+        (0x14, 0x83),  # TxControlReg: antenna on (Tx1RFEn, Tx2RFEn)
+        (0x12, 0x00),  # TxModeReg: 106 kbit/s, no hardware CRC
+        (0x13, 0x00),  # RxModeReg: 106 kbit/s, no hardware CRC
+        (0x24, 0x26),  # ModWidthReg: 106 kbit/s
+        (0x0B, WATER_LEVEL),  # WaterLevelReg
+    )
+
+    # TxModeReg/RxModeReg speed bits and ModWidthReg value per bit rate
+    BITRATES = {
+        106: (0x00, 0x26),
+        212: (0x10, 0x15),
+        424: (0x20, 0x0A),
+        848: (0x30, 0x05),
+    }
+
+    # RFCfgReg RxGain settings, see set_antenna_gain()
+    RXGAIN_18DB = 0x00 << 4
+    RXGAIN_23DB = 0x01 << 4
+    RXGAIN_33DB = 0x04 << 4
+    RXGAIN_38DB = 0x05 << 4
+    RXGAIN_43DB = 0x06 << 4
+    RXGAIN_48DB = 0x07 << 4
+
+    # The distinct settings with their gain in dB, weakest first
+    RX_GAINS = (
+        (RXGAIN_18DB, 18),
+        (RXGAIN_23DB, 23),
+        (RXGAIN_33DB, 33),
+        (RXGAIN_38DB, 38),
+        (RXGAIN_43DB, 43),
+        (RXGAIN_48DB, 48),
+    )
+
+    # One timer tick with the INIT_TABLE prescaler, (2 * 0xD3E + 1) / 13.56 MHz
+    TIMER_TICK_US = 500
+    DEFAULT_TIMEOUT_US = 15000
+
+    # Seconds between two check_health() register reads, and how long a
+    # hardware reset may take to bring the oscillator back
+    HEALTH_INTERVAL = 2.0
+    RECOVERY_TIMEOUT = 0.05
+
+    def __init__(self, sck: Pin, mosi: Pin, miso: Pin, rst: Pin, cs: Pin, retries: int = 2, rx_gain=None, spi=None, trace=None):
+
+        self.retries = retries
+        self.rx_gain = rx_gain
+        self.trace = trace
+        self.last_error = self.OK
+        self.last_nak = None
+        self.error_reg = 0
+
+        # Filled in by request()/select, see CardInfo
+        self.atqa = None
+        self.sak = None
+        self.card_info = None
+
+        # (uid, SELECT frames) of the last card passed to reselect()
+        self._select_cache = None
+
+        # ErrorReg bits that fail a frame (CRCErr only with hardware CRC) and
+        # the bus poll limit that backs up the receive timer
+        self._err_mask = 0x1B
+        self._watchdog = 2000
+
+        # VersionReg seen after the first full init, see check_health()
+        self.version = None
+        self._next_health = 0
+        self.stats = {"health_checks": 0, "recoveries": 0, "failed_recoveries": 0}
+
+        # Deselected right away, a floating CS would let this chip answer
+        # on a bus shared with other readers
         self.cs = digitalio.DigitalInOut(cs)
+        self.cs.switch_to_output(value=True)
 
         self.rst = digitalio.DigitalInOut(rst)
         self.rst.switch_to_output()
@@ -53,8 +272,13 @@ class MFRC522:
         self.NTAG = 0
         self.NTAG_MaxPage = 0
 
-        self.spi = busio.SPI(sck, MOSI=mosi, MISO=miso)
-        self.spi_device = SPIDevice(self.spi, self.cs)
+        if spi is None:
+            spi = busio.SPI(sck, MOSI=mosi, MISO=miso)
+        self.spi = spi
+        # Kept here, the native SPIDevice does not expose its settings and
+        # _wregs() configures the bus itself
+        self.spi_settings = {'baudrate': 100000, 'polarity': 0, 'phase': 0}
+        self.spi_device = SPIDevice(self.spi, self.cs, **self.spi_settings)
 
         self.init()
 
@@ -64,6 +288,9 @@ class MFRC522:
             bus_device.write(b'%c' % int(0xff & ((reg << 1) & 0x7e)))
             bus_device.write(b'%c' % int(0xff & val))
 
+        if self.trace is not None:
+            self.trace.record(reg, val)
+
     def _rreg(self, reg: int):
 
         with self.spi_device as bus_device:
@@ -71,6 +298,9 @@ class MFRC522:
             val = bytearray(1)
             bus_device.readinto(val)
 
+        if self.trace is not None:
+            self.trace.record(reg, val[0], True)
+
         return val[0]
 
     def _sflags(self, reg: int, mask: int):
@@ -79,11 +309,53 @@ class MFRC522:
     def _cflags(self, reg: int, mask: int):
         self._wreg(reg, self._rreg(reg) & (~mask))
 
-    def _tocard(self, cmd: int, send):
+    def _classify(self, err: int):
+
+        if err & 0x10:
+            return self.ERR_BUFFER
+        if err & 0x08:
+            return self.ERR_COLLISION
+        if err & 0x02:
+            return self.ERR_PARITY
+        if err & 0x04:
+            return self.ERR_CRC
+        return self.ERR_PROTOCOL
+
+    def _wfifo(self, data):
+        """
+        Write data to the FIFO in one chip select cycle.
+        """
+
+        buf = bytearray(len(data) + 1)
+        buf[0] = 0x12
+        buf[1:] = bytes(data)
+
+        with self.spi_device as bus_device:
+            bus_device.write(buf)
+
+        if self.trace is not None:
+            for val in buf[1:]:
+                self.trace.record(0x09, val)
+
+    def _rfifo(self, n: int):
+        return list(self._rregs((0x09,) * n))
+
+    def _tocard(self, cmd: int, send, maxlen: int = 16):
+        """
+        Run a command with ``send`` as FIFO data.
+
+        Frames longer than the 64 byte FIFO are streamed: the FIFO is refilled
+        while it drains below the water level (LoAlert) and emptied while the
+        answer fills it above (HiAlert).
+
+        :param maxlen: Maximum number of response bytes returned.
+        """
 
         recv = []
         bits = irq_en = wait_irq = 0
         stat = self.ERR
+        self.last_error = self.ERR_TIMEOUT
+        self.error_reg = 0
 
         if cmd == 0x0E:
             irq_en = 0x12
@@ -97,56 +369,114 @@ class MFRC522:
         self._sflags(0x0A, 0x80)
         self._wreg(0x01, 0x00)
 
-        for c in send:
-            self._wreg(0x09, c)
+        pos = min(len(send), 64)
+        self._wfifo(send[:pos])
         self._wreg(0x01, cmd)
 
         if cmd == 0x0C:
             self._sflags(0x0D, 0x80)
 
-        i = 2000
+        stream = (pos < len(send)) or (maxlen > 64)
+        chunk = 64 - self.WATER_LEVEL
+
+        # Stop on completion or when the timer (TAuto) expires; the counter
+        # only guards against a chip that stopped answering on the bus.
+        i = self._watchdog
         while True:
             n = self._rreg(0x04)
             i -= 1
-            if ~((i != 0) and ~(n & 0x01) and ~(n & wait_irq)):
+            if (i == 0) or (n & wait_irq) or (n & 0x01):
                 break
 
+            if stream:
+                status1 = self._rreg(0x07)
+                if pos < len(send):
+                    if status1 & 0x01:
+                        self._wfifo(send[pos:pos + chunk])
+                        pos += chunk
+                elif status1 & 0x02:
+                    recv += self._rfifo(chunk)
+
         self._cflags(0x0D, 0x80)
 
         if i:
-            if (self._rreg(0x06) & 0x1B) == 0x00:
+            err = self._rreg(0x06)
+            self.error_reg = err
+
+            if err & self._err_mask:
+                stat = self.ERR
+                self.last_error = self._classify(err)
+            elif (n & 0x01) and not (n & wait_irq):
+                stat = self.NOTAGERR
+            else:
                 stat = self.OK
+                self.last_error = self.OK
 
-                if n & irq_en & 0x01:
-                    stat = self.NOTAGERR
-                elif cmd == 0x0C:
+                if cmd == 0x0C:
                     n = self._rreg(0x0A)
                     lbits = self._rreg(0x0C) & 0x07
+                    total = len(recv) + n
                     if lbits != 0:
-                        bits = (n - 1) * 8 + lbits
+                        bits = (total - 1) * 8 + lbits
                     else:
-                        bits = n * 8
+                        bits = total * 8
 
-                    if n == 0:
+                    if total == 0:
                         n = 1
-                    elif n > 16:
-                        n = 16
+                    elif total > maxlen:
+                        n = max(0, maxlen - len(recv))
 
-                    for _ in range(n):
-                        recv.append(self._rreg(0x09))
-            else:
-                stat = self.ERR
+                    if n:
+                        recv += self._rfifo(n)
 
         return stat, recv, bits
 
+    def _transceive(self, send, expect_bits=None, retry=True):
+        """
+        Transceive one frame, repeating just this frame on transient errors.
+
+        :param expect_bits: Required response length in bits, ``4`` for an ACK.
+        :param retry: Set to ``False`` for frames that must not be sent twice.
+        """
+
+        attempts = (self.retries + 1) if retry else 1
+        self.last_nak = None
+
+        while True:
+            (stat, recv, bits) = self._tocard(0x0C, send)
+
+            if stat == self.OK:
+                if bits == 4 and (recv[0] & 0x0F) != 0x0A:
+                    self.last_nak = recv[0] & 0x0F
+                    self.last_error = self.ERR_NAK
+                    return self.ERR, recv, bits
+
+                if (expect_bits is None) or (bits == expect_bits):
+                    return stat, recv, bits
+
+                stat = self.ERR
+                self.last_error = self.ERR_PROTOCOL
+
+            attempts -= 1
+            if (attempts == 0) or (self.last_error not in self.RETRY_ERRORS):
+                return stat, recv, bits
+
+    def error_text(self, code=None):
+        """
+        Human readable name of a status code, by default ``last_error``.
+        """
+        if code is None:
+            code = self.last_error
+        text = self.ERROR_NAMES.get(code, "unknown")
+        if code == self.ERR_NAK and self.last_nak is not None:
+            text = "{} 0x{:X}".format(text, self.last_nak)
+        return text
+
     def _crc(self, data):
 
         self._cflags(0x05, 0x04)
         self._sflags(0x0A, 0x80)
-
-        for c in data:
-            self._wreg(0x09, c)
-
+        self._wfifo(data)
         self._wreg(0x01, 0x03)
 
         i = 0xFF
@@ -158,20 +488,208 @@ class MFRC522:
 
         return [self._rreg(0x22), self._rreg(0x21)]
 
-    def init(self):
+    def _wregs(self, table):
+        """
+        Write a table of register/value pairs in one burst: the bus is
+        locked and configured once and only chip select toggles per register.
+        """
+
+        spi = self.spi
+        buf = bytearray(2)
+
+        while not spi.try_lock():
+            pass
+        try:
+            spi.configure(**self.spi_settings)
+            for reg, val in table:
+                buf[0] = (reg << 1) & 0x7E
+                buf[1] = val & 0xFF
+                self.cs.value = False
+                spi.write(buf)
+                self.cs.value = True
+        finally:
+            spi.unlock()
+
+        if self.trace is not None:
+            for reg, val in table:
+                self.trace.record(reg, val)
+
+    def _rregs(self, regs):
+        """
+        Read several registers in one chip select cycle, the chip answers
+        every address byte with the value of the previous one.
+        """
+
+        out = bytearray(len(regs) + 1)
+        for i, reg in enumerate(regs):
+            out[i] = ((reg << 1) & 0x7E) | 0x80
+        val = bytearray(len(out))
+
+        with self.spi_device as bus_device:
+            bus_device.write_readinto(out, val)
+
+        if self.trace is not None:
+            for i, reg in enumerate(regs):
+                self.trace.record(reg, val[i + 1], True)
+
+        return val[1:]
+
+    def is_configured(self):
+        """
+        Check in one burst read whether the chip still holds the
+        ``INIT_TABLE`` configuration.
+        """
+
+        values = self._rregs([reg for reg, _ in self.INIT_TABLE])
+        for i, (_, val) in enumerate(self.INIT_TABLE):
+            if values[i] != val:
+                return False
+        return True
+
+    def init(self, force=False):
+        """
+        Soft reset and configure the chip.
+
+        A chip that is already configured (e.g. the utilities calling
+        ``init()`` before every card) is left alone apart from dropping
+        Crypto1, unless ``force`` is set.
+
+        :return: ``OK``, or ``ERR`` if the chip did not come out of reset.
+        """
+
+        self._err_mask = 0x1B
+        self._watchdog = 2000
+
+        if not force and self.is_configured():
+            self.stop_crypto1()
+            return self.OK
+
+        if self.reset() != self.OK:
+            return self.ERR
+
+        self._wregs(self.INIT_TABLE)
+
+        # The soft reset puts RFCfgReg back to its 33 dB default
+        if self.rx_gain is not None:
+            self.set_antenna_gain(self.rx_gain)
+
+        if self.version is None:
+            self.version = self._rreg(0x37)
+
+        return self.OK
+
+    def check_health(self, now=None):
+        """
+        Cheap idle-time check that the chip is still there and configured:
+        VersionReg and the ``INIT_TABLE`` registers in one burst read, at
+        most every ``HEALTH_INTERVAL`` seconds. A chip that browned out or
+        lost its configuration is recovered with ``recover()``.
+
+        Call it when no card is in the field, the timeout and framing
+        changed by ISO-DEP or HLTA would otherwise look like drift.
+
+        :return: ``OK`` if the chip is healthy or was recovered, else ``ERR``.
+        """
+
+        if now is None:
+            now = time.monotonic()
+        if now < self._next_health:
+            return self.OK
+        self._next_health = now + self.HEALTH_INTERVAL
+        self.stats["health_checks"] += 1
+
+        values = self._rregs([0x37] + [reg for reg, _ in self.INIT_TABLE])
+
+        # 0x00 or 0xFF is a floating MISO line, not a chip
+        if self.version is None and values[0] not in (0x00, 0xFF):
+            self.version = values[0]
+
+        healthy = values[0] == self.version
+        for i, (_, val) in enumerate(self.INIT_TABLE):
+            if values[i + 1] != val:
+                healthy = False
+
+        if healthy:
+            return self.OK
+
+        return self.recover()
 
-        self.reset()
-        self._wreg(0x2A, 0x8D)
-        self._wreg(0x2B, 0x3E)
-        self._wreg(0x2D, 30)
-        self._wreg(0x2C, 0)
-        self._wreg(0x15, 0x40)
-        self._wreg(0x11, 0x3D)
-        self.antenna_on()
+    def recover(self):
+        """
+        Hardware reset through the ``rst`` pin and configure the chip again,
+        without a power cycle. Counted in ``stats``.
+
+        :return: ``OK`` once the chip answers with its version again, else ``ERR``.
+        """
+
+        self.rst.value = 0
+        time.sleep(0.0001)
+        self.rst.value = 1
+
+        # The chip answers SPI once the oscillator runs and PowerDown clears
+        deadline = time.monotonic() + self.RECOVERY_TIMEOUT
+        while True:
+            version = self._rreg(0x37)
+            if version not in (0x00, 0xFF) and not (self._rreg(0x01) & 0x10):
+                break
+            if time.monotonic() > deadline:
+                self.stats["failed_recoveries"] += 1
+                return self.ERR
+
+        if self.version is None:
+            self.version = version
+
+        if version != self.version or self.init(force=True) != self.OK:
+            self.stats["failed_recoveries"] += 1
+            return self.ERR
+
+        self.stats["recoveries"] += 1
+        return self.OK
+
+    def set_framing(self, kbps=106, crc=False, rx_kbps=None):
+        """
+        Select the bit rate and whether the chip appends and checks the
+        CRC_A itself, which is mandatory above 106 kbit/s.
+
+        :param kbps: PCD to PICC bit rate, one of ``BITRATES``.
+        :param crc: Hardware CRC in both directions.
+        :param rx_kbps: PICC to PCD bit rate, by default the same as ``kbps``.
+        """
+
+        tx_speed, mod_width = self.BITRATES[kbps]
+        rx_speed = self.BITRATES[rx_kbps or kbps][0]
+        crc_en = 0x80 if crc else 0x00
+
+        self._wregs(((0x12, crc_en | tx_speed), (0x13, crc_en | rx_speed), (0x24, mod_width)))
+        self._err_mask = 0x1F if crc else 0x1B
+
+    def set_timeout_us(self, us):
+        """
+        Program the receive timeout, e.g. an ISO-DEP frame waiting time.
+        """
+
+        reload = min(0xFFFF, (us + self.TIMER_TICK_US - 1) // self.TIMER_TICK_US)
+        self._wregs(((0x2C, reload >> 8), (0x2D, reload & 0xFF)))
+
+        # A bus poll takes well over 25 us, keep the watchdog behind the timer
+        self._watchdog = max(2000, us // 25)
 
     def reset(self):
+        """
+        Soft reset, then wait for the oscillator to come back up, which
+        the chip signals by clearing PowerDown (CommandReg bit 4).
+        """
+
         self._wreg(0x01, 0x0F)
 
+        i = 100
+        while i:
+            if not (self._rreg(0x01) & 0x10):
+                return self.OK
+            i -= 1
+
+        return self.ERR
+
     def antenna_on(self, on=True):
 
         if on and ~(self._rreg(0x14) & 0x03):
@@ -186,6 +704,9 @@ class MFRC522:
 
         if (stat != self.OK) | (bits != 0x10):
             stat = self.ERR
+            self.atqa = None
+        else:
+            self.atqa = recv[0] | (recv[1] << 8)
 
         return stat, bits
 
@@ -195,16 +716,14 @@ class MFRC522:
         ser = [anticolN, 0x20]
 
         self._wreg(0x0D, 0x00)
-        (stat, recv, bits) = self._tocard(0x0C, ser)
+        (stat, recv, bits) = self._transceive(ser, 0x28)
 
         if stat == self.OK:
-            if len(recv) == 5:
-                for i in range(4):
-                    ser_chk = ser_chk ^ recv[i]
-                if ser_chk != recv[4]:
-                    stat = self.ERR
-            else:
+            for i in range(4):
+                ser_chk = ser_chk ^ recv[i]
+            if ser_chk != recv[4]:
                 stat = self.ERR
+                self.last_error = self.ERR_CRC
 
         return stat, recv
 
@@ -212,8 +731,12 @@ class MFRC522:
 
         buf = [0x93, 0x70] + ser[:5]
         buf += self._crc(buf)
-        (stat, recv, bits) = self._tocard(0x0C, buf)
-        return self.OK if (stat == self.OK) and (bits == 0x18) else self.ERR
+        (stat, recv, bits) = self._transceive(buf, 0x18)
+        if stat != self.OK:
+            return self.ERR
+
+        self.sak = recv[0]
+        return self.OK
 
     def auth(self, mode, addr, sect, ser):
         return self._tocard(0x0E, [mode, addr] + sect + ser[:4])[0]
@@ -221,32 +744,68 @@ class MFRC522:
     def stop_crypto1(self):
         self._cflags(0x08, 0x08)
 
+    def halt(self):
+        """
+        Send HLTA, afterwards the card only answers a WUPA (``REQALL``).
+
+        Send it before stop_crypto1() on an authenticated card.
+        """
+
+        buf = [0x50, 0x00]
+        buf += self._crc(buf)
+
+        # The card acknowledges HLTA by staying silent for 1 ms
+        self.set_timeout_us(1000)
+        (stat, recv, bits) = self._tocard(0x0C, buf)
+        self.set_timeout_us(self.DEFAULT_TIMEOUT_US)
+
+        return self.OK if stat == self.NOTAGERR else self.ERR
+
     def read(self, addr):
 
         data = [0x30, addr]
         data += self._crc(data)
-        (stat, recv, _) = self._tocard(0x0C, data)
+        (stat, recv, _) = self._transceive(data, 0x90)
         return recv if stat == self.OK else None
 
     def write(self, addr, data):
 
         buf = [0xA0, addr]
         buf += self._crc(buf)
-        (stat, recv, bits) = self._tocard(0x0C, buf)
+        (stat, recv, bits) = self._transceive(buf, 4)
 
-        if not (stat == self.OK) or not (bits == 4) or not ((recv[0] & 0x0F) == 0x0A):
+        if stat != self.OK:
             stat = self.ERR
         else:
             buf = []
             for i in range(16):
                 buf.append(data[i])
             buf += self._crc(buf)
-            (stat, recv, bits) = self._tocard(0x0C, buf)
-            if not (stat == self.OK) or not (bits == 4) or not ((recv[0] & 0x0F) == 0x0A):
+            # The card may have stored the data even if its ACK got lost, so
+            # the data frame is never repeated on its own.
+            (stat, recv, bits) = self._transceive(buf, 4, retry=False)
+            if stat != self.OK:
                 stat = self.ERR
 
         return stat
 
+    def write_page(self, page, data):
+        """
+        Ultralight/NTAG native WRITE (0xA2) of one 4 byte page, a single
+        frame instead of the two of the 16 byte ``write()``.
+
+        Writing the same page twice stores the same bytes (OTP and lock
+        bits are OR-ed), so unlike ``write()`` the frame may be repeated.
+        """
+
+        buf = [0xA2, page]
+        for i in range(4):
+            buf.append(data[i])
+        buf += self._crc(buf)
+        (stat, recv, bits) = self._transceive(buf, 4)
+
+        return self.OK if stat == self.OK else self.ERR
+
     def write_block_ntag(self, page, data):
         """
         Write data to a specific page on an NTAG213 tag.
@@ -264,7 +823,7 @@ class MFRC522:
             return False
 
         # Write the data to the specified page
-        status = self.write(page, data)
+        status = self.write_page(page, data)
         return status == self.OK
 
     def read_block_ntag(self, page):
@@ -334,9 +893,10 @@ class MFRC522:
         pOut = self._crc(buf)
         buf.append(pOut[0])
         buf.append(pOut[1])
-        (status, backData, backLen) = self._tocard(0x0C, buf)
+        (status, backData, backLen) = self._transceive(buf, 0x18)
 
-        if (status == self.OK) and (backLen == 0x18):
+        if status == self.OK:
+            self.sak = backData[0]
             return  1
         else:
             return 0
@@ -351,6 +911,7 @@ class MFRC522:
         if self.PcdSelect(puid, self.PICC_ANTICOLL1) == 0:
             return (self.ERR, [])
 
+        self.card_info = CardInfo(uid, self.atqa, self.sak)
         return (self.OK, uid)
 
     def tohexstring(self, v):
@@ -381,6 +942,8 @@ class MFRC522:
 
     def SelectTagSN(self):
         valid_uid = []
+        self.sak = None
+        self.card_info = None
         (status, uid) = self.anticoll(self.PICC_ANTICOLL1)
 
         if status != self.OK:
@@ -431,13 +994,98 @@ class MFRC522:
                     print("PcdSelect(3) {}".format(uid))
 
         valid_uid.extend(uid[0:5])
+        valid_uid = valid_uid[:len(valid_uid) - 1]
+        self.card_info = CardInfo(valid_uid, self.atqa, self.sak)
+
+        return (self.OK, valid_uid)
+
+    def _select_frames(self, uid):
+        """
+        SELECT frames for every cascade level of a known UID, BCC and CRC
+        included. Only the frames of the last UID are kept.
+        """
+
+        key = bytes(uid)
+        if self._select_cache is not None and self._select_cache[0] == key:
+            return self._select_cache[1]
+
+        if len(uid) == 4:
+            parts = [uid]
+        elif len(uid) == 7:
+            parts = [[0x88] + uid[0:3], uid[3:7]]
+        elif len(uid) == 10:
+            parts = [[0x88] + uid[0:3], [0x88] + uid[3:6], uid[6:10]]
+        else:
+            return None
+
+        frames = []
+        for level, part in zip((self.PICC_ANTICOLL1, self.PICC_ANTICOLL2, self.PICC_ANTICOLL3), parts):
+            buf = [level, 0x70] + list(part)
+            buf.append(part[0] ^ part[1] ^ part[2] ^ part[3])
+            buf += self._crc(buf)
+            frames.append(buf)
+
+        self._select_cache = (key, frames)
+        return frames
 
-        return (self.OK, valid_uid[:len(valid_uid) - 1])
+    def reselect(self, uid):
+        """
+        Wake up and select a card whose UID is already known, skipping
+        anticollision: one WUPA plus one SELECT per cascade level.
+
+        Use it after stop_crypto1() or a failed authentication, while the
+        card is still in the field.
+
+        :param uid: The UID as returned by SelectTagSN().
+        :return: ``OK`` or ``ERR``.
+        """
+
+        frames = self._select_frames(uid)
+        if frames is None:
+            return self.ERR
+
+        # A WUPA would go out encrypted while Crypto1 is on
+        self.stop_crypto1()
+
+        # A card still in ACTIVE state drops to IDLE on the first WUPA
+        # without answering, so it gets one more chance
+        self._wreg(0x0D, 0x07)
+        for _ in range(2):
+            (stat, recv, bits) = self._tocard(0x0C, [self.REQALL])
+            if (stat == self.OK) and (bits == 0x10):
+                break
+        else:
+            return self.ERR
+
+        self.atqa = recv[0] | (recv[1] << 8)
+        self._wreg(0x0D, 0x00)
+
+        for buf in frames:
+            (stat, recv, bits) = self._transceive(buf, 0x18)
+            if stat != self.OK:
+                return self.ERR
+
+        self.sak = recv[0]
+        self.card_info = CardInfo(list(uid), self.atqa, self.sak)
+        return self.OK
+
+    def _sector_block(self, sector, block):
+        """
+        Absolute block number of a block in a sector, ``None`` past the end
+        of the card (4K geometry while the size is unknown).
+        """
+
+        sectors = self.card_info.sectors if self.card_info else 0
+        if not sectors:
+            sectors = CardInfo.SECTORS[CardInfo.CLASSIC_4K]
+        if sector < 0 or sector >= sectors:
+            return None
+        return CardInfo.first_block(sector) + (block % CardInfo.sector_blocks(sector))
 
     def writeSectorBlock(self, uid, sector, block, data, keyA=None, keyB=None):
-        absoluteBlock =  sector * 4 + (block % 4)
+        absoluteBlock = self._sector_block(sector, block)
 
-        if absoluteBlock > 63 :
+        if absoluteBlock is None:
             return self.ERR
 
         if len(data) != 16:
@@ -449,9 +1097,9 @@ class MFRC522:
         return self.ERR
 
     def readSectorBlock(self, uid, sector, block, keyA=None, keyB=None):
-        absoluteBlock =  sector * 4 + (block % 4)
+        absoluteBlock = self._sector_block(sector, block)
 
-        if absoluteBlock > 63 :
+        if absoluteBlock is None:
             return self.ERR, None
 
         if self.authKeys(uid, absoluteBlock, keyA, keyB) != self.ERR :
@@ -463,7 +1111,8 @@ class MFRC522:
         for absoluteBlock in range(Start, End):
             status = self.authKeys(uid, absoluteBlock, keyA, keyB)
 
-            print("{:02d} S{:02d} B{:1d}: ".format(absoluteBlock, absoluteBlock//4 , absoluteBlock % 4),end="")
+            sector = CardInfo.sector_of(absoluteBlock)
+            print("{:02d} S{:02d} B{:1d}: ".format(absoluteBlock, sector, absoluteBlock - CardInfo.first_block(sector)),end="")
 
             if status == self.OK:
                 block = self.read(absoluteBlock)
@@ -549,7 +1198,7 @@ class MFRC522:
         if len(data) != 4:
             return self.ERR
 
-        return self.write(page, data+[0]*12)
+        return self.write_page(page, data)
 
     def readNTAGPage(self, page):
         """
@@ -64,7 +64,8 @@ class NDEF:
         """
         Write NDEF data to a tag using a provided write function.
         :param ndef_bytes: The NDEF data as bytes.
-        :param write_function: A function that writes data to a specific block (e.g., mfrc522.write).
+        :param write_function: A function that writes 4 bytes to a page and returns True on
+            success, e.g. ``rfid.write_block_ntag`` (native 0xA2 WRITE, one frame per page).
         :param start_block: The starting block address for writing (default is 4).
         :return: True if successful, False otherwise.
         """
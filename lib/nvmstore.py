@@ -0,0 +1,82 @@
+"""
+Settings kept in ``microcontroller.nvm`` across power cycles.
+
+Every setting is a tag byte followed by its value at a fixed offset, so an
+erased (0xFF) or foreign NVM reads back as "not set".
+"""
+
+import microcontroller
+
+# (offset, tag, length) of each setting
+RX_GAIN = (0, 0x47, 1)
+# 16 byte secret and the 2 byte KDF cost (big-endian) of the slot keys
+DEVICE_SECRET = (2, 0x4B, 18)
+
+
+def load(setting):
+    """
+    Read a setting, ``None`` if it was never saved or there is no NVM.
+    """
+
+    offset, tag, length = setting
+    nvm = microcontroller.nvm
+    if nvm is None or len(nvm) < offset + 1 + length:
+        return None
+
+    if nvm[offset] != tag:
+        return None
+
+    return bytes(nvm[offset + 1:offset + 1 + length])
+
+
+def save(setting, value):
+    """
+    Store a setting, only touching the flash when the value changed.
+    """
+
+    offset, tag, length = setting
+    nvm = microcontroller.nvm
+    if nvm is None or len(value) != length:
+        return False
+
+    record = bytes([tag]) + bytes(value)
+    if bytes(nvm[offset:offset + 1 + length]) != record:
+        nvm[offset:offset + 1 + length] = record
+
+    return True
+
+
+def load_rx_gain():
+    """
+    The calibrated receiver gain for ``MFRC522(rx_gain=...)``, or ``None``.
+    """
+
+    value = load(RX_GAIN)
+    if value is None or value[0] & 0x8F:
+        return None
+    return value[0]
+
+
+def save_rx_gain(gain):
+    return save(RX_GAIN, [gain & 0x70])
+
+
+def load_device_secret():
+    """
+    ``(secret, rounds)`` of the slot key derivation, ``None`` if this
+    device was never provisioned.
+    """
+
+    value = load(DEVICE_SECRET)
+    if value is None:
+        return None
+    rounds = (value[16] << 8) | value[17]
+    if rounds == 0:
+        return None
+    return value[:16], rounds
+
+
+def save_device_secret(secret, rounds):
+    if len(secret) != 16 or not 0 < rounds <= 0xFFFF:
+        return False
+    return save(DEVICE_SECRET, bytes(secret) + bytes([rounds >> 8, rounds & 0xFF]))
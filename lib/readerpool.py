@@ -0,0 +1,92 @@
+"""
+Round-robin polling of several ``mfrc522`` readers sharing one SPI bus.
+"""
+
+import time
+
+
+class ReaderState:
+    """
+    What the pool remembers about one reader between polls.
+
+    :param name: Label used in events and prints, e.g. ``"desk"``.
+    :param rfid: The ``MFRC522`` instance.
+    """
+
+    def __init__(self, name, rfid):
+        self.name = name
+        self.rfid = rfid
+        self.card_present = False
+        self.last_uid = None
+        self.last_seen = 0
+        self.taps = 0
+
+
+class ReaderPool:
+    """
+    Polls every reader once per ``poll()`` call, starting one reader later
+    each round so no antenna is always served last.
+
+    A REQA without a card costs one receive timeout, so a round takes
+    about ``len(readers) * DEFAULT_TIMEOUT_US`` and a tap on any antenna is
+    seen within one poll interval plus one round.
+
+    :param readers: ``(name, rfid)`` pairs, the readers built with a shared ``spi=``.
+    :param debounce_time: Seconds before the same card on the same reader
+        counts as a new tap, and before a silent reader counts as empty.
+    """
+
+    def __init__(self, readers, debounce_time=2.0):
+        self.readers = [ReaderState(name, rfid) for name, rfid in readers]
+        self.debounce_time = debounce_time
+        self._next = 0
+
+    def poll(self):
+        """
+        Run one round over all readers.
+
+        :return: List of ``(state, uid)`` for every new tap this round, the
+            reader is left with the card selected so the caller can go on
+            with auth/read through ``state.rfid``.
+        """
+
+        taps = []
+        count = len(self.readers)
+        start = self._next
+        self._next = (start + 1) % count
+
+        for i in range(count):
+            state = self.readers[(start + i) % count]
+            uid = self._poll_one(state)
+            if uid is not None:
+                taps.append((state, uid))
+
+        return taps
+
+    def _poll_one(self, state):
+        rfid = state.rfid
+        now = time.monotonic()
+
+        (status, tag_type) = rfid.request(rfid.REQIDL)
+        if status != rfid.OK:
+            if state.card_present and (now - state.last_seen) > self.debounce_time:
+                state.card_present = False
+                state.last_uid = None
+
+            # No card on this antenna, make sure the reader is still alive
+            rfid.check_health(now)
+            return None
+
+        (status, raw_uid) = rfid.SelectTagSN()
+        if status != rfid.OK:
+            return None
+
+        new = raw_uid != state.last_uid or (now - state.last_seen) > self.debounce_time
+        state.card_present = True
+        state.last_seen = now
+        if not new:
+            return None
+
+        state.last_uid = raw_uid
+        state.taps += 1
+        return raw_uid
@@ -0,0 +1,19 @@
+"""
+Shared code of the rfid-hid-password firmwares and utilities:
+
+- ``config``: board pins and the sector key file
+- ``reader``: the MFRC522 on those pins and tap detection
+- ``crypto``: slot keys and their cache, AES-CMAC and AES-CTR
+- ``slots``: the v1/v2 slot formats on MIFARE Classic sectors
+- ``slotdir``: the slot directory in sector 0
+- ``snapshot``: the slots of a tapped card in RAM
+- ``provision``: job queue and writes of host-encoded slot images
+- ``migrate``: re-encoding legacy slots into the current format
+- ``protocol``, ``service``: the binary command channel on ``usb_cdc.data``
+- ``hid``: typing over USB HID
+- ``ui``: LEDs, the slot button and console prompts
+- ``app``: the tap-to-type main loop
+
+Modules are imported on demand so a firmware only loads what it uses;
+compile them with ``mpy-cross`` to save RAM and boot time.
+"""
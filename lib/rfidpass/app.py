@@ -0,0 +1,156 @@
+"""
+The tap-to-type loop shared by the ``rfid-hid-password-*.py`` firmwares.
+"""
+
+import time
+
+from mfrc522 import CardInfo
+from rfidpass import config, crypto, slots, ui
+from rfidpass.hid import Typist
+from rfidpass.reader import TapDetector, open_reader
+from rfidpass.snapshot import CardSnapshot
+
+
+class PasswordApp:
+    """
+    Reader, keyboard, LEDs and sector key of a password firmware.
+
+    :param debounce_time: Seconds before the same card types again.
+    :param plain_v1: v1 slots are stored unencrypted (the non-AES firmwares).
+    :param type_uid_fallback: Type the card UID when there is no password.
+    :param hold_time: Seconds to wait after a tap before polling again.
+    :param snapshot_ttl: Keep the slots of a tapped card with a slot
+        directory in RAM while it stays in the field, and this many seconds
+        after it left, so ``type_slot()`` can type another slot without a
+        new tap. 0 reads only the chosen slot on every tap, so do cards
+        without a directory, which would need every sector read.
+    """
+
+    def __init__(self, debounce_time=5.0, plain_v1=False, type_uid_fallback=False, hold_time=0,
+                 snapshot_ttl=0):
+        self.rfid = open_reader()
+        self.typist = Typist()
+        self.leds = ui.Leds()
+        self.auth_key = config.load_default_key()
+        self.key_cache = crypto.load_key_cache()
+        self.taps = TapDetector(self.rfid, debounce_time)
+        self.plain_v1 = plain_v1
+        self.type_uid_fallback = type_uid_fallback
+        self.hold_time = hold_time
+        self.snapshot_ttl = snapshot_ttl
+        self.snapshot = None
+        # Slots of the last Classic card tapped, slot N is in sector N
+        self.slot_count = CardInfo.SECTORS[CardInfo.CLASSIC_1K] - 1
+
+    def step(self, choose_slot):
+        """
+        Poll once and type the password of a new tap.
+
+        :param choose_slot: Called with the reader for a new tap, returns the
+            slot to read or ``None`` to skip the card.
+        """
+
+        (status, raw_uid) = self.taps.poll()
+        if status == self.rfid.ERR:
+            self.leds.red.value = True
+        elif status == self.rfid.OK:
+            self.handle_tap(raw_uid, choose_slot)
+        else:
+            now = time.monotonic()
+            self.key_cache.expire(now)
+            self.expire_snapshot(now)
+
+    def handle_tap(self, raw_uid, choose_slot):
+        rfid = self.rfid
+        uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+        print("Card detected!")
+        print("Card UID:", uid_hex)
+        print("  - card:", rfid.card_info.family_name)
+        if rfid.card_info.sectors:
+            self.slot_count = rfid.card_info.sectors - 1
+
+        slot = choose_slot(rfid)
+        if slot is None:
+            return
+
+        # One set of ciphers per tap, the derived key comes from the cache
+        keys = self.key_cache.slot_keys(raw_uid)
+        self.drop_snapshot()
+        if self.snapshot_ttl:
+            self.snapshot = CardSnapshot.take(rfid, raw_uid, self.auth_key, keys, scan=False)
+        if self.snapshot is not None:
+            password = self.snapshot.password(slot, self.plain_v1)
+        else:
+            password = slots.read_password(rfid, raw_uid, self.auth_key, slot, keys, self.plain_v1)
+        rfid.stop_crypto1()
+        self.type_password(password, uid_hex, slot)
+
+        if self.hold_time:
+            time.sleep(self.hold_time)
+
+    def type_slot(self, slot):
+        """
+        Type another slot of the card in the snapshot, e.g. after the slot
+        button was pressed.
+
+        :return: ``False`` if there is no snapshot and the card has to be
+            tapped again.
+        """
+
+        self.expire_snapshot(time.monotonic())
+        if self.snapshot is None:
+            return False
+        password = self.snapshot.password(slot, self.plain_v1)
+        uid_hex = ''.join('{:02X}'.format(x) for x in self.snapshot.raw_uid)
+        self.type_password(password, uid_hex, slot)
+        return True
+
+    def expire_snapshot(self, now):
+        """
+        Wipe the snapshot once its card has been out of the field for
+        ``snapshot_ttl`` seconds.
+        """
+
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        taps = self.taps
+        seen = snapshot.taken_at
+        if taps.present_uid == snapshot.raw_uid:
+            seen = max(seen, taps.last_present)
+        if now - seen > self.snapshot_ttl:
+            print("Card snapshot wiped.")
+            self.drop_snapshot()
+
+    def drop_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.wipe()
+            self.snapshot = None
+
+    def type_password(self, password, uid_hex, slot):
+        if password:
+            print("Password retrieved:", password)
+            self.typist.type(password)
+            self.leds.green.value = True
+        elif self.type_uid_fallback:
+            print("Failed to read password. Typing UID instead.")
+            self.typist.type(uid_hex)
+            self.leds.blue.value = True
+        else:
+            print("Failed to read password from slot.", slot)
+            self.leds.red.value = True
+
+        # Add a newline after typing
+        self.typist.enter()
+
+    def run(self, choose_slot, interval=0.1):
+        """
+        Main loop of the simple firmwares, never returns.
+        """
+
+        print("Waiting for RFID/NFC card...")
+        while True:
+            # Turn off LEDs at the start of each loop
+            self.leds.off()
+            self.step(choose_slot)
+            time.sleep(interval)  # Small delay to reduce CPU usage
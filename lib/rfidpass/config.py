@@ -0,0 +1,43 @@
+"""
+Wiring of the RP2040-Zero board and the settings every firmware and
+utility reads at startup.
+"""
+
+import json
+
+import board
+
+# SPI pins of the MFRC522
+SCK = board.GP2
+MOSI = board.GP3
+MISO = board.GP4
+CS = board.GP0
+RST = board.GP1
+
+# Status LEDs
+RED_LED = board.GP27
+GREEN_LED = board.GP28
+BLUE_LED = board.GP29
+
+# Key A of the password sectors, see utils/validate-key-file.py
+DEFAULT_KEY_FILE = 'default_key.json'
+FACTORY_KEY = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+
+# KDF cost of the slot keys, stored with the device secret when it is
+# provisioned, see utils/provision-device-secret.py
+KDF_ROUNDS = 500
+
+
+def load_default_key(file_path=DEFAULT_KEY_FILE):
+    """
+    The sector key from the JSON file, the factory key if it is missing or
+    invalid.
+    """
+
+    try:
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+            return data.get('default_key', FACTORY_KEY)
+    except Exception as e:
+        print("Error loading default key: {}. Using default key.".format(e))
+        return FACTORY_KEY
@@ -0,0 +1,262 @@
+"""
+AES primitives of the slot formats: the per-card slot key, AES-CMAC and
+AES-CTR on top of one-block AES-ECB.
+
+A provisioned device derives the slot key of a card from its UID and a
+device secret kept in NVM (``derive_key()``), otherwise the slot key is the
+padded UID (``uid_key()``). ``KeyCache`` keeps the derived keys of the last
+few cards so a repeat tap does not pay the derivation again.
+"""
+
+import time
+
+try:
+    import aesio
+except ImportError:
+    aesio = None
+
+BLOCK = 16
+
+# Encrypted with the slot key to derive the CMAC key, and the first byte of
+# every CTR counter block; neither can collide with a header (MAGIC_V2)
+MAC_KEY_LABEL = b'\x02slot-mac-key\x00\x00\x00'
+CTR_PREFIX = 0x01
+
+# First byte of the KDF input, under the device secret instead of a slot key
+KDF_LABEL = 0x03
+
+
+def uid_key(raw_uid):
+    """
+    The 16 byte slot key of a card: its UID padded with leading zeros.
+    """
+
+    return b'\x00' * (16 - len(raw_uid)) + bytes(raw_uid)
+
+
+def new_cipher(key):
+    """
+    AES-ECB cipher with ``encrypt_into``/``decrypt_into`` of one block.
+    Host tools replace this function with their own backend.
+    """
+
+    return aesio.AES(key, aesio.MODE_ECB)
+
+
+def _dbl(block):
+    # Doubling in GF(2^128) for the CMAC subkeys
+    out = bytearray(BLOCK)
+    carry = 0
+    for i in range(BLOCK - 1, -1, -1):
+        out[i] = ((block[i] << 1) | carry) & 0xFF
+        carry = block[i] >> 7
+    if carry:
+        out[BLOCK - 1] ^= 0x87
+    return out
+
+
+def _subkeys(cipher):
+    # CMAC subkeys K1 and K2 of a cipher
+    zero = bytearray(BLOCK)
+    l = bytearray(BLOCK)
+    cipher.encrypt_into(zero, l)
+    k1 = _dbl(l)
+    return k1, _dbl(k1)
+
+
+def derive_key(raw_uid, secret, rounds):
+    """
+    The 16 byte slot key of a card on a provisioned device: AES-CMAC under
+    the device secret of ``KDF_LABEL``, the UID length and the UID, then
+    ``rounds - 1`` more times AES-CMAC of the previous result.
+
+    :param secret: 16 byte device secret, see ``nvmstore.load_device_secret()``.
+    :param rounds: KDF cost, one AES block per round.
+    """
+
+    cipher = new_cipher(secret)
+    k1, k2 = _subkeys(cipher)
+
+    # A UID is at most 10 bytes, so the first message is one padded block
+    x = bytearray(BLOCK)
+    y = bytearray(BLOCK)
+    x[0] = KDF_LABEL
+    x[1] = len(raw_uid)
+    x[2:2 + len(raw_uid)] = bytes(raw_uid)
+    x[2 + len(raw_uid)] = 0x80
+    for j in range(BLOCK):
+        x[j] ^= k2[j]
+    cipher.encrypt_into(x, y)
+
+    # Every further round is the CMAC of one complete block
+    for _ in range(rounds - 1):
+        for j in range(BLOCK):
+            y[j] ^= k1[j]
+        cipher.encrypt_into(y, x)
+        x, y = y, x
+
+    x[:] = bytes(BLOCK)
+    return y
+
+
+class SlotKeys:
+    """
+    The ciphers of one card, created once per tap: the slot key for the
+    header, the CTR keystream and v1 blocks, and the derived CMAC key.
+
+    :param key: 16 byte slot key, see ``KeyCache.key()``.
+    """
+
+    def __init__(self, key):
+        self.enc = new_cipher(key)
+        self.mac = new_cipher(self.encrypt(MAC_KEY_LABEL))
+        self.k1, self.k2 = _subkeys(self.mac)
+
+    def encrypt(self, block):
+        out = bytearray(BLOCK)
+        self.enc.encrypt_into(bytes(block), out)
+        return out
+
+    def decrypt(self, block):
+        out = bytearray(BLOCK)
+        self.enc.decrypt_into(bytes(block), out)
+        return out
+
+    def cmac(self, data):
+        """
+        AES-CMAC (RFC 4493) of ``data``.
+        """
+
+        n = max(1, (len(data) + BLOCK - 1) // BLOCK)
+        x = bytearray(BLOCK)
+        y = bytearray(BLOCK)
+
+        for i in range(n):
+            block = data[i * BLOCK:(i + 1) * BLOCK]
+            if i == n - 1:
+                if len(block) == BLOCK:
+                    sub = self.k1
+                else:
+                    block = bytes(block) + b'\x80' + b'\x00' * (BLOCK - 1 - len(block))
+                    sub = self.k2
+                for j in range(BLOCK):
+                    y[j] = x[j] ^ block[j] ^ sub[j]
+            else:
+                for j in range(BLOCK):
+                    y[j] = x[j] ^ block[j]
+            self.mac.encrypt_into(y, x)
+
+        return x
+
+    def ctr(self, nonce, data):
+        """
+        AES-CTR en/decryption of ``data`` with an 8 byte nonce.
+        """
+
+        out = bytearray(len(data))
+        counter = bytearray(BLOCK)
+        counter[0] = CTR_PREFIX
+        counter[1:9] = nonce
+        stream = bytearray(BLOCK)
+
+        for i in range(0, len(data), BLOCK):
+            counter[14] = (i // BLOCK) >> 8
+            counter[15] = (i // BLOCK) & 0xFF
+            self.enc.encrypt_into(counter, stream)
+            for j in range(min(BLOCK, len(data) - i)):
+                out[i + j] = data[i + j] ^ stream[j]
+
+        return out
+
+
+def _wipe(buf):
+    for i in range(len(buf)):
+        buf[i] = 0
+
+
+class KeyCache:
+    """
+    Slot keys of the most recently tapped cards, least recently used first
+    out. Evicted keys are overwritten with zeros, and so are all keys once
+    no card was looked up for ``idle_timeout`` seconds.
+
+    Without a device secret the slot key is the padded UID, which costs
+    nothing to compute and is not cached.
+
+    :param secret: 16 byte device secret, ``None`` for UID keys.
+    :param rounds: KDF cost, see ``derive_key()``.
+    :param size: Number of cards kept.
+    :param idle_timeout: Seconds before an unused cache is wiped.
+    """
+
+    def __init__(self, secret=None, rounds=1, size=4, idle_timeout=300.0):
+        self.secret = secret
+        self.rounds = rounds
+        self.size = size
+        self.idle_timeout = idle_timeout
+        # [uid, key] pairs, most recently used last
+        self.entries = []
+        self.last_used = 0
+
+    def key(self, raw_uid, now=None):
+        """
+        The 16 byte slot key of a card.
+        """
+
+        if self.secret is None:
+            return uid_key(raw_uid)
+
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+        self.last_used = now
+
+        uid = bytes(raw_uid)
+        entries = self.entries
+        for i in range(len(entries)):
+            if entries[i][0] == uid:
+                entry = entries.pop(i)
+                entries.append(entry)
+                return entry[1]
+
+        key = derive_key(uid, self.secret, self.rounds)
+        if len(entries) >= self.size:
+            _wipe(entries.pop(0)[1])
+        entries.append([uid, key])
+        return key
+
+    def slot_keys(self, raw_uid, now=None):
+        """
+        ``SlotKeys`` of a card, built from the cached key.
+        """
+
+        return SlotKeys(self.key(raw_uid, now))
+
+    def expire(self, now):
+        """
+        Wipe the cache if it was idle for ``idle_timeout`` seconds. The
+        firmwares call this while no card is in the field.
+        """
+
+        if self.entries and now - self.last_used > self.idle_timeout:
+            self.clear()
+
+    def clear(self):
+        for entry in self.entries:
+            _wipe(entry[1])
+        self.entries = []
+
+
+def load_key_cache(**kwargs):
+    """
+    ``KeyCache`` with the device secret from NVM, UID keys on a device that
+    was never provisioned (utils/provision-device-secret.py). Keyword
+    arguments go to ``KeyCache``.
+    """
+
+    import nvmstore
+
+    device = nvmstore.load_device_secret()
+    if device is None:
+        return KeyCache(**kwargs)
+    return KeyCache(device[0], device[1], **kwargs)
@@ -0,0 +1,83 @@
+"""
+Typing passwords over USB HID on a US keyboard layout.
+"""
+
+import usb_hid
+from adafruit_hid.keyboard import Keyboard
+from adafruit_hid.keycode import Keycode
+
+# Punctuation keys in the same order as their keycodes below, unshifted and
+# with Shift held; space has no shifted character
+_PLAIN = " -=[]\\;',./`"
+_SHIFTED = "\x00_+{}|:\"<>?~"
+_KEYS = (
+    Keycode.SPACE, Keycode.MINUS, Keycode.EQUALS, Keycode.LEFT_BRACKET,
+    Keycode.RIGHT_BRACKET, Keycode.BACKSLASH, Keycode.SEMICOLON, Keycode.QUOTE,
+    Keycode.COMMA, Keycode.PERIOD, Keycode.FORWARD_SLASH, Keycode.GRAVE_ACCENT,
+)
+
+# Shift + 0 ... Shift + 9
+_SHIFTED_DIGITS = ")!@#$%^&*("
+
+
+def keycode(char):
+    """
+    ``(keycode, shift)`` that types ``char``, ``None`` if the layout has no
+    key for it.
+    """
+
+    if 'a' <= char <= 'z':
+        return Keycode.A + ord(char) - ord('a'), False
+    if 'A' <= char <= 'Z':
+        return Keycode.A + ord(char) - ord('A'), True
+    if '1' <= char <= '9':
+        return Keycode.ONE + ord(char) - ord('1'), False
+    if char == '0':
+        return Keycode.ZERO, False
+
+    i = _SHIFTED_DIGITS.find(char)
+    if i >= 0:
+        return keycode(str(i))[0], True
+    i = _PLAIN.find(char)
+    if i >= 0:
+        return _KEYS[i], False
+    i = _SHIFTED.find(char)
+    if i > 0:
+        return _KEYS[i], True
+    return None
+
+
+# (keycode, shift) of every printable ASCII character from space on, so
+# typing a password is one table lookup per character
+_ASCII_FIRST = 0x20
+_ASCII_KEYS = [keycode(chr(c)) for c in range(_ASCII_FIRST, 0x7F)]
+
+
+class Typist:
+    """
+    Types text as keyboard input.
+
+    :param kbd: ``Keyboard`` to type on, a new one on all USB HID devices
+        by default.
+    """
+
+    def __init__(self, kbd=None):
+        self.kbd = kbd if kbd is not None else Keyboard(usb_hid.devices)
+
+    def type(self, text):
+        kbd = self.kbd
+        for char in text:
+            i = ord(char) - _ASCII_FIRST
+            key = _ASCII_KEYS[i] if 0 <= i < len(_ASCII_KEYS) else keycode(char)
+            if key is None:
+                print("Unsupported character: {}".format(char))
+                continue
+
+            if key[1]:
+                kbd.press(Keycode.SHIFT)
+            kbd.press(key[0])
+            kbd.release_all()
+
+    def enter(self):
+        self.kbd.press(Keycode.ENTER)
+        self.kbd.release_all()
@@ -0,0 +1,153 @@
+"""
+Re-encoding the legacy slots of a card into the current format, so the
+readers only ever meet v2 slots under the card's slot key.
+
+A slot is tried in turn as:
+
+- ``CURRENT``: v2 under the card's slot key, left alone
+- ``V2_UID_KEY``: v2 under the UID key, written before the device got a secret
+- ``V1_AES``: v1 encrypted with either key (the AES firmwares)
+- ``V1_PLAIN``: v1 in plaintext (mfc-store-password-slots.py), with the
+  CRC over the password or, as that utility wrote it before lib/crc.py,
+  over the zero padded blocks
+
+A legacy v1 payload must be printable ASCII as well, so a slot written
+with another device's key is reported as ``UNKNOWN`` and never rewritten
+as if its ciphertext was a password.
+"""
+
+from rfidpass import provision, slots
+
+CURRENT = 'current'
+V2_UID_KEY = 'v2 uid key'
+V1_AES = 'v1 aes'
+V1_PLAIN = 'v1 plain'
+UNKNOWN = 'unknown'
+UNREADABLE = 'unreadable'
+
+
+class Migration:
+    """
+    One slot of a card, what it was found to be and its new image.
+    """
+
+    def __init__(self, sector, span, kind, payload=None, label=''):
+        self.sector = sector
+        self.span = span
+        self.kind = kind
+        self.payload = payload
+        self.label = label
+        self.image = None
+
+    @property
+    def legacy(self):
+        return self.payload is not None and self.kind != CURRENT
+
+
+def _printable(payload):
+    return bool(payload) and all(0x20 <= b <= 0x7E for b in payload)
+
+
+def classify(snapshot, sector, legacy_keys=None):
+    """
+    ``(kind, payload, span)`` of the slot at ``sector`` of ``snapshot``.
+
+    :param legacy_keys: ``SlotKeys`` of the UID key on a provisioned
+        device, ``None`` if the slot key is the UID key.
+    """
+
+    data = snapshot.data.get(sector)
+    if data is None:
+        return UNREADABLE, None, 1
+
+    # A chain that runs into an unreadable sector may also be a plaintext
+    # slot whose block 0 decrypts to a v2 header
+    unreadable = False
+    for keys in (snapshot.keys, legacy_keys):
+        if keys is None:
+            continue
+        version, payload = snapshot.decode(sector, keys=keys)
+        if version == 0:
+            unreadable = True
+        if payload is None:
+            continue
+        if version == 2:
+            return (CURRENT if keys is snapshot.keys else V2_UID_KEY), payload, slots.slot_sectors(keys, data)
+        if _printable(payload):
+            return V1_AES, payload, 1
+
+    version, payload = snapshot.decode(sector, plain_v1=True)
+    if version == 1 and payload is not None and _printable(payload):
+        return V1_PLAIN, payload, 1
+    return (UNREADABLE if unreadable else UNKNOWN), None, 1
+
+
+def plan(snapshot, legacy_keys=None, recovered=None):
+    """
+    Classify every slot of ``snapshot`` and encode the legacy ones under
+    the snapshot's slot keys.
+
+    :param legacy_keys: See ``classify()``.
+    :param recovered: ``{sector: Migration}`` of slots whose migration was
+        cut short on an earlier tap; they are written again if the slot no
+        longer decodes.
+    :return: List of ``Migration``, one per slot.
+    """
+
+    directory = snapshot.directory
+    labels = directory.labels if directory is not None else {}
+
+    found = []
+    taken = set()
+    for sector, span in snapshot.slots(plain_v1=True):
+        if sector in taken:
+            continue
+        kind, payload, found_span = classify(snapshot, sector, legacy_keys)
+        if payload is not None:
+            slot = Migration(sector, max(span, found_span), kind, payload, labels.get(sector, ''))
+        elif recovered and sector in recovered and kind != CURRENT:
+            slot = recovered[sector]
+        else:
+            slot = Migration(sector, span, kind)
+        taken.update(range(sector, sector + slot.span))
+        found.append(slot)
+
+    for slot in found:
+        if not slot.legacy:
+            continue
+        payload = bytes(slot.payload)
+        image = slots.encode(snapshot.keys, payload, packed=slots.should_pack(payload))
+        if len(image) > slot.span * slots.SLOT_BYTES:
+            # Taking more sectors could overwrite the next slot
+            slot.kind = UNKNOWN
+            slot.payload = None
+            continue
+        slot.image = image
+
+    return found
+
+
+def apply(rfid, raw_uid, auth_key, keys, migrations):
+    """
+    Write the new images of ``migrations`` in one pass, verify them in
+    another and update the slot directory. Sectors a slot no longer needs
+    are cleared along with it.
+
+    :return: ``(failed sector or None, directory updated)``.
+    """
+
+    written = []
+    images = []
+    for slot in migrations:
+        if slot.image is None:
+            continue
+        padded = slot.image + bytes(slot.span * slots.SLOT_BYTES - len(slot.image))
+        written.append(provision.SlotImage(slot.sector, padded))
+        images.append(provision.SlotImage(slot.sector, slot.image, len(slot.payload), slot.label))
+    if not images:
+        return None, False
+
+    failed = provision.write_images(rfid, raw_uid, auth_key, written)
+    if failed is not None:
+        return failed, False
+    return None, provision.update_directory(rfid, raw_uid, auth_key, images, keys)
@@ -0,0 +1,164 @@
+"""
+Binary frames of the ``usb_cdc.data`` command channel, shared by the
+device (``rfidpass.service``) and the host client
+(utils/host/rfidpass_client.py)::
+
+    0     SOF
+    1-2   length of the body (bytes 3 up to the CRC), big-endian
+    3     command, with RESPONSE set in a reply
+    4     sequence number, echoed in the reply
+    5-    payload, a reply starts with a status byte
+    last  CRC-16 of the body, big-endian
+
+A frame with a bad CRC is dropped, the reader resynchronizes on the next
+SOF and the host retries after its timeout. A partial frame, e.g. from a
+stray SOF, is dropped when a new frame starts after ``FRAME_TIMEOUT``
+seconds without a byte, the host sends a frame in one go. A retry
+keeps its sequence number, the device answers it with the reply it already
+sent instead of running the command again.
+
+Payloads (a UID is its length byte followed by the UID)::
+
+    PING        -> VERSION
+    LIST_SLOTS  -> uid, sectors, flags (DIRECTORY, WRITABLE), count,
+                   count * (sector, span, version, length (2), label (3))
+    WRITE_SLOT  uid, sector, length (2), label (3), image
+                -> directory updated (0/1), or the failed sector on CARD_ERROR
+    CLEAR_SLOT  uid, sector -> sectors cleared
+    DUMP_CARD   -> uid, sectors, per sector: readable (0/1) and its data
+                   blocks when readable (3 blocks, 15 past sector 31)
+    STATS       -> JSON object
+"""
+
+import time
+
+from crc import crc16
+
+SOF = 0xA5
+VERSION = 1
+MAX_BODY = 4096
+RESPONSE = 0x80
+# Seconds without a byte after which a partial frame is dropped
+FRAME_TIMEOUT = 0.5
+
+# Commands
+PING = 0x01
+LIST_SLOTS = 0x10
+WRITE_SLOT = 0x11
+CLEAR_SLOT = 0x12
+DUMP_CARD = 0x13
+STATS = 0x20
+
+# Reply status
+OK = 0
+NO_CARD = 1
+WRONG_CARD = 2
+CARD_ERROR = 3
+BAD_REQUEST = 4
+UNKNOWN_COMMAND = 5
+
+STATUS_NAMES = {
+    OK: "ok", NO_CARD: "no card", WRONG_CARD: "wrong card", CARD_ERROR: "card error",
+    BAD_REQUEST: "bad request", UNKNOWN_COMMAND: "unknown command",
+}
+
+# LIST_SLOTS flags
+DIRECTORY = 0x01
+WRITABLE = 0x02
+
+# Length of a slot that is not in the directory labels
+NO_LENGTH = 0xFFFF
+LABEL_LEN = 3
+
+
+def encode_frame(command, seq, payload=b''):
+    body = bytes([command, seq & 0xFF]) + bytes(payload)
+    crc = crc16(body)
+    return bytes([SOF, len(body) >> 8, len(body) & 0xFF]) + body + bytes([crc >> 8, crc & 0xFF])
+
+
+def pack_uid(uid):
+    return bytes([len(uid)]) + bytes(uid)
+
+
+def unpack_uid(payload, at=0):
+    """
+    ``(uid, offset after it)``.
+    """
+
+    end = at + 1 + payload[at]
+    if end > len(payload):
+        raise ValueError("truncated UID")
+    return bytes(payload[at + 1:end]), end
+
+
+def data_blocks(sector):
+    """
+    Data blocks of a MIFARE Classic sector, without the trailer.
+    """
+
+    return 3 if sector < 32 else 15
+
+
+class FrameReader:
+    """
+    Reassembles frames from the bytes of a stream.
+
+    :param timeout: Drop a partial frame when a new one starts more than
+        this many seconds after the last byte.
+    """
+
+    def __init__(self, timeout=FRAME_TIMEOUT):
+        self.buf = bytearray()
+        self.timeout = timeout
+        self.fed_at = 0
+        # Bytes thrown away while looking for a good frame
+        self.dropped = 0
+
+    def feed(self, data):
+        now = time.monotonic()
+        if self.buf and data and data[0] == SOF and now - self.fed_at > self.timeout:
+            # A frame is sent in one go, this one is never completed
+            self.dropped += len(self.buf)
+            self.buf = bytearray()
+        self.fed_at = now
+        self.buf += data
+
+    def next_frame(self):
+        """
+        ``(command, seq, payload)`` of the next good frame, ``None`` until
+        one is complete.
+        """
+
+        buf = self.buf
+        while True:
+            skip = 0
+            while skip < len(buf) and buf[skip] != SOF:
+                skip += 1
+            if skip:
+                self.dropped += skip
+                buf = buf[skip:]
+            if len(buf) < 3:
+                break
+
+            length = (buf[1] << 8) | buf[2]
+            if not 2 <= length <= MAX_BODY:
+                self.dropped += 1
+                buf = buf[1:]
+                continue
+
+            end = 3 + length + 2
+            if len(buf) < end:
+                break
+
+            body = bytes(buf[3:3 + length])
+            if crc16(body) != (buf[end - 2] << 8) | buf[end - 1]:
+                self.dropped += 1
+                buf = buf[1:]
+                continue
+
+            self.buf = buf[end:]
+            return body[0], body[1], body[2:]
+
+        self.buf = buf
+        return None
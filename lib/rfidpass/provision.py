@@ -0,0 +1,153 @@
+"""
+Writing slot images prepared on a host (utils/host/encode-slot-images.py)
+to cards: the job queue and the per-card write and verify.
+
+A job file has one JSON object per line::
+
+    {"uid": "DEADBEEF", "sector": 1, "image": "<hex>", "length": 8, "label": "web"}
+
+The images are already encrypted for the card, so writing them needs the
+sector key but no slot key.
+"""
+
+import binascii
+import json
+
+from rfidpass import slotdir, slots
+
+
+class SlotImage:
+    """
+    One encoded slot, 48 bytes per sector from ``sector`` on.
+    """
+
+    def __init__(self, sector, image, length=None, label=''):
+        self.sector = sector
+        self.image = image
+        self.length = length
+        self.label = label
+
+    @property
+    def span(self):
+        return len(self.image) // slots.SLOT_BYTES
+
+
+class JobQueue:
+    """
+    Slot images by card UID, cards leave the queue once written.
+    """
+
+    def __init__(self):
+        # uid bytes -> [SlotImage]
+        self.pending = {}
+        self.done = set()
+
+    def add_line(self, line):
+        """
+        Queue one job file line, ``False`` if it is not a valid job.
+        """
+
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return True
+        try:
+            job = json.loads(line)
+            uid = binascii.unhexlify(job['uid'])
+            image = binascii.unhexlify(job['image'])
+            sector = int(job['sector'])
+        except (ValueError, KeyError, TypeError):
+            return False
+        if not image or len(image) % slots.SLOT_BYTES or sector < 1:
+            return False
+
+        self.pending.setdefault(uid, []).append(
+            SlotImage(sector, image, job.get('length'), job.get('label', '')))
+        return True
+
+    def load_file(self, file_path):
+        """
+        Queue every job of a file, returns the number of bad lines.
+        """
+
+        bad = 0
+        with open(file_path, 'r') as file:
+            for line in file:
+                if not self.add_line(line):
+                    bad += 1
+        return bad
+
+    def load_console(self):
+        """
+        Queue jobs pasted on the console, up to an empty line. Returns the
+        number of bad lines.
+        """
+
+        bad = 0
+        while True:
+            line = input()
+            if not line.strip():
+                return bad
+            if not self.add_line(line):
+                print("Not a valid job line, skipped.")
+                bad += 1
+
+    def images(self, raw_uid):
+        return self.pending.get(bytes(raw_uid))
+
+    def finish(self, raw_uid):
+        uid = bytes(raw_uid)
+        self.pending.pop(uid, None)
+        self.done.add(uid)
+
+    def is_done(self, raw_uid):
+        return bytes(raw_uid) in self.done
+
+
+def write_images(rfid, raw_uid, auth_key, images):
+    """
+    Write the images, one auth and three writes per sector, then read every
+    written sector back in one verify pass.
+
+    :return: ``None`` on success, otherwise the sector that failed.
+    """
+
+    sectors = rfid.card_info.sectors
+    for slot in images:
+        if slot.sector + slot.span > sectors:
+            return slot.sector
+
+    for slot in images:
+        if not slots.write_slot(rfid, raw_uid, auth_key, slot.sector, slot.image):
+            return slot.sector
+
+    for slot in images:
+        if slots.read_sectors(rfid, raw_uid, auth_key, slot.sector, slot.span) != slot.image:
+            return slot.sector
+
+    return None
+
+
+def update_directory(rfid, raw_uid, auth_key, images, keys):
+    """
+    Add the written slots to the card's slot directory, creating it on a
+    card with a blank sector 0.
+
+    :param keys: ``SlotKeys`` of the card, only needed to rebuild a torn
+        directory.
+    :return: ``True`` if the directory was written, ``False`` if the card
+        has none that may be written or the write failed.
+    """
+
+    directory, writable = slotdir.load(rfid, raw_uid, auth_key)
+    if not writable:
+        return False
+    if directory is None:
+        # Blank or torn, the images written above show up in the scan
+        directory = slotdir.scan(rfid, raw_uid, auth_key, keys)
+
+    for slot in images:
+        for sector in range(slot.sector, slot.sector + slot.span):
+            directory.remove(sector)
+        directory.add(slot.sector, slot.span, slotdir.V2, slot.length, slot.label)
+    return slotdir.save(rfid, raw_uid, auth_key, directory)
+
@@ -0,0 +1,100 @@
+"""
+The MFRC522 as the firmwares use it: built from ``rfidpass.config`` with
+the calibrated receiver gain, and a tap detector with debounce.
+"""
+
+import time
+
+import nvmstore
+from mfrc522 import MFRC522
+from rfidpass import config
+
+
+def open_reader(**kwargs):
+    """
+    ``MFRC522`` on the configured pins. The receiver gain comes from
+    utils/calibrate-rx-gain.py, ``None`` keeps the chip default; other
+    keyword arguments go to the driver.
+    """
+
+    kwargs.setdefault('rx_gain', nvmstore.load_rx_gain())
+    return MFRC522(config.SCK, config.MOSI, config.MISO, config.RST, config.CS, **kwargs)
+
+
+class TapDetector:
+    """
+    Turns REQA polling into taps: the same card counts again only after it
+    left the field for ``debounce_time`` seconds, or stayed that long.
+
+    :param rfid: The ``MFRC522``.
+    :param debounce_time: Debounce delay in seconds.
+    """
+
+    def __init__(self, rfid, debounce_time=5.0):
+        self.rfid = rfid
+        self.debounce_time = debounce_time
+        self.card_present = False
+        self.last_uid = None
+        self.last_seen = 0
+        # The last card that answered a select and when, kept after it left
+        # the field (card_present only clears once the debounce is over)
+        self.present_uid = None
+        self.last_present = 0
+
+    def poll(self):
+        """
+        One REQA/select round.
+
+        :return: ``(status, raw_uid)``: ``OK`` and the UID of a new tap,
+            ``NOTAGERR`` when there is nothing new, ``ERR`` when a card could
+            not be selected or the idle reader failed its health check.
+        """
+
+        rfid = self.rfid
+        now = time.monotonic()
+
+        (status, tag_type) = rfid.request(rfid.REQIDL)
+        if status != rfid.OK:
+            if self.card_present and (now - self.last_seen) > self.debounce_time:
+                # Card is no longer detected
+                print("Card removed.")
+                self.card_present = False
+                self.last_uid = None
+
+            # No card in the field, make sure the reader is still alive
+            if rfid.check_health(now) != rfid.OK:
+                print("RFID reader not responding.")
+                return rfid.ERR, None
+            return rfid.NOTAGERR, None
+
+        (status, raw_uid) = rfid.SelectTagSN()
+        if status != rfid.OK:
+            print("Failed to read card UID:", rfid.error_text())
+            return rfid.ERR, None
+
+        # Card is still present, but we've already processed it
+        self.present_uid = raw_uid
+        self.last_present = now
+        if raw_uid == self.last_uid and (now - self.last_seen) <= self.debounce_time:
+            return rfid.NOTAGERR, None
+
+        self.card_present = True
+        self.last_uid = raw_uid
+        self.last_seen = now
+        return rfid.OK, raw_uid
+
+
+def wait_for_removal(rfid, raw_uid, interval=0.05, misses=2):
+    """
+    Block until the card left the field: it is woken up, selected and
+    halted again until it fails to answer ``misses`` times in a row.
+    """
+
+    missed = 0
+    while missed < misses:
+        if rfid.reselect(raw_uid) == rfid.OK:
+            rfid.halt()
+            missed = 0
+        else:
+            missed += 1
+        time.sleep(interval)
@@ -0,0 +1,246 @@
+"""
+The device side of the ``usb_cdc.data`` command channel, see
+``rfidpass.protocol`` for the frames and payloads.
+
+Every command works on the card in the field: it is woken up and
+selected, the command runs in that session and the card is halted again,
+so the next command finds it with a WUPA.
+
+The last reply is kept: a retried command (same command, sequence number
+and payload within ``REPLAY_TIME`` seconds) gets it again instead of
+running twice, a retried CLEAR_SLOT would find its slot gone.
+"""
+
+import json
+import time
+
+from mfrc522 import CardInfo
+from rfidpass import protocol, provision, slotdir, slots
+
+# Seconds a reply is kept for retries, past the client's timeout and retries
+REPLAY_TIME = 10
+
+
+class CardError(Exception):
+    """
+    A command failed with a reply status, see ``rfidpass.protocol``.
+    """
+
+    def __init__(self, status, payload=b''):
+        super().__init__(status)
+        self.status = status
+        self.payload = payload
+
+
+class Service:
+    """
+    Answers the command frames arriving on ``stream``.
+
+    :param rfid: The ``MFRC522``.
+    :param auth_key: Key A of the password sectors.
+    :param key_cache: ``KeyCache`` for the slot keys, used to find the
+        slots of cards without a directory.
+    :param stream: ``usb_cdc.data``, or anything with ``in_waiting``,
+        ``read()`` and ``write()``.
+    """
+
+    def __init__(self, rfid, auth_key, key_cache, stream):
+        self.rfid = rfid
+        self.auth_key = auth_key
+        self.key_cache = key_cache
+        self.stream = stream
+        self.reader = protocol.FrameReader()
+        self.started = time.monotonic()
+        self.counts = {}
+        self.errors = 0
+        self.last_ms = 0
+        # (command, seq, payload, reply frame, status, sent at) of the last reply
+        self.last_reply = None
+
+        self.handlers = {
+            protocol.PING: self.ping,
+            protocol.LIST_SLOTS: self.list_slots,
+            protocol.WRITE_SLOT: self.write_slot,
+            protocol.CLEAR_SLOT: self.clear_slot,
+            protocol.DUMP_CARD: self.dump_card,
+            protocol.STATS: self.stats,
+        }
+
+    def poll(self):
+        """
+        Handle the frames that arrived, call often.
+
+        :return: Status of the last command handled, ``None`` if there was
+            none.
+        """
+
+        waiting = self.stream.in_waiting
+        if waiting:
+            self.reader.feed(self.stream.read(waiting))
+
+        status = None
+        while True:
+            frame = self.reader.next_frame()
+            if frame is None:
+                return status
+            command, seq, payload = frame
+            now = time.monotonic()
+            last = self.last_reply
+            if (last is not None and last[:3] == (command, seq, payload)
+                    and now - last[5] <= REPLAY_TIME):
+                self.stream.write(last[3])
+                status = last[4]
+                continue
+
+            status, reply = self.handle(command, payload)
+            reply = protocol.encode_frame(command | protocol.RESPONSE, seq, bytes([status]) + reply)
+            self.stream.write(reply)
+            self.last_reply = (command, seq, payload, reply, status, time.monotonic())
+
+    def handle(self, command, payload):
+        """
+        Run one command, ``(status, reply payload)``.
+        """
+
+        handler = self.handlers.get(command)
+        if handler is None:
+            return protocol.UNKNOWN_COMMAND, b''
+
+        self.counts[command] = self.counts.get(command, 0) + 1
+        start = time.monotonic_ns()
+        try:
+            status, reply = protocol.OK, handler(payload)
+        except CardError as e:
+            status, reply = e.status, e.payload
+        except (IndexError, ValueError):
+            status, reply = protocol.BAD_REQUEST, b''
+        finally:
+            # Halt before stop_crypto1(), the next command wakes the card up
+            if command != protocol.PING and command != protocol.STATS:
+                self.rfid.halt()
+                self.rfid.stop_crypto1()
+        self.last_ms = (time.monotonic_ns() - start) // 1000000
+
+        if status != protocol.OK:
+            self.errors += 1
+        return status, reply
+
+    def _select(self, expected_uid=None):
+        # Wake up the card in the field, idle or halted
+        rfid = self.rfid
+        (status, tag_type) = rfid.request(rfid.REQALL)
+        if status != rfid.OK:
+            raise CardError(protocol.NO_CARD)
+        (status, raw_uid) = rfid.SelectTagSN()
+        if status != rfid.OK:
+            raise CardError(protocol.NO_CARD)
+        if expected_uid is not None and bytes(raw_uid) != expected_uid:
+            raise CardError(protocol.WRONG_CARD, protocol.pack_uid(raw_uid))
+        return raw_uid
+
+    def _directory(self, raw_uid):
+        directory, writable = slotdir.load(self.rfid, raw_uid, self.auth_key)
+        found = directory is not None
+        if not found:
+            directory = slotdir.scan(self.rfid, raw_uid, self.auth_key, self.key_cache.slot_keys(raw_uid))
+        return directory, found, writable
+
+    def ping(self, payload):
+        return bytes([protocol.VERSION])
+
+    def list_slots(self, payload):
+        raw_uid = self._select()
+        directory, found, writable = self._directory(raw_uid)
+
+        entries = directory.slots()
+        reply = bytearray(protocol.pack_uid(raw_uid))
+        reply.append(directory.sectors)
+        reply.append((protocol.DIRECTORY if found else 0) | (protocol.WRITABLE if writable else 0))
+        reply.append(len(entries))
+        for sector, span, version in entries:
+            length = directory.lengths.get(sector, protocol.NO_LENGTH)
+            label = directory.labels.get(sector, '').encode()[:protocol.LABEL_LEN]
+            reply += bytes([sector, span, version, length >> 8, length & 0xFF])
+            reply += label + b'\x00' * (protocol.LABEL_LEN - len(label))
+        return reply
+
+    def write_slot(self, payload):
+        uid, at = protocol.unpack_uid(payload)
+        sector = payload[at]
+        length = (payload[at + 1] << 8) | payload[at + 2]
+        label = bytes(payload[at + 3:at + 3 + protocol.LABEL_LEN]).rstrip(b'\x00').decode()
+        image = bytes(payload[at + 3 + protocol.LABEL_LEN:])
+        if sector < 1 or not image or len(image) % slots.SLOT_BYTES:
+            raise ValueError("bad slot image")
+
+        raw_uid = self._select(uid)
+        images = [provision.SlotImage(sector, image, length, label)]
+        failed = provision.write_images(self.rfid, raw_uid, self.auth_key, images)
+        if failed is not None:
+            raise CardError(protocol.CARD_ERROR, bytes([failed]))
+
+        keys = self.key_cache.slot_keys(raw_uid)
+        return bytes([int(provision.update_directory(self.rfid, raw_uid, self.auth_key, images, keys))])
+
+    def clear_slot(self, payload):
+        uid, at = protocol.unpack_uid(payload)
+        sector = payload[at]
+        raw_uid = self._select(uid)
+        directory, found, writable = self._directory(raw_uid)
+
+        span = directory.span(sector)
+        if not span:
+            raise CardError(protocol.BAD_REQUEST)
+
+        # Out of the directory first, a torn clear leaves free sectors behind
+        directory.remove(sector)
+        if writable and not slotdir.save(self.rfid, raw_uid, self.auth_key, directory):
+            raise CardError(protocol.CARD_ERROR, bytes([0]))
+
+        empty = bytes(slots.SLOT_BYTES * span)
+        if not slots.write_slot(self.rfid, raw_uid, self.auth_key, sector, empty):
+            raise CardError(protocol.CARD_ERROR, bytes([sector]))
+        return bytes([span])
+
+    def dump_card(self, payload):
+        rfid = self.rfid
+        raw_uid = self._select()
+        sectors = rfid.card_info.sectors
+
+        reply = bytearray(protocol.pack_uid(raw_uid))
+        reply.append(sectors)
+        for sector in range(sectors):
+            block = CardInfo.first_block(sector)
+            if rfid.auth(rfid.AUTHENT1A, block, self.auth_key, raw_uid) != rfid.OK:
+                rfid.reselect(raw_uid)
+                reply.append(0)
+                continue
+
+            data = bytearray()
+            for i in range(protocol.data_blocks(sector)):
+                chunk = rfid.read(block + i)
+                if chunk is None:
+                    break
+                data += bytes(chunk)
+            else:
+                reply.append(1)
+                reply += data
+                continue
+
+            rfid.reselect(raw_uid)
+            reply.append(0)
+        return reply
+
+    def stats(self, payload):
+        import gc
+
+        stats = {
+            'uptime_s': int(time.monotonic() - self.started),
+            'commands': {'0x{:02X}'.format(k): v for k, v in self.counts.items()},
+            'errors': self.errors,
+            'dropped_bytes': self.reader.dropped,
+            'last_command_ms': self.last_ms,
+            'mem_free': gc.mem_free() if hasattr(gc, 'mem_free') else None,
+            'reader': self.rfid.stats,
+        }
+        return json.dumps(stats).encode()
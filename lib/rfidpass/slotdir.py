@@ -0,0 +1,281 @@
+"""
+Slot directory in sector 0 of a MIFARE Classic card, so the utilities can
+list used and free slots with one auth and one read instead of probing
+every sector.
+
+Block 1 is the index and the commit point of every change::
+
+    0     MAGIC
+    1     reserved (0)
+    2-11  2 bits per sector 0-39, LSB first: FREE, V1, V2 (a slot starts
+          here) or CONT (continues the slot before it)
+    12-13 CRC-16 of block 2, big-endian
+    14-15 CRC-16 of bytes 0-13, big-endian
+
+Block 2 holds the length and a short label of up to ``MAX_LABELS`` slots,
+``LABEL_ENTRY`` bytes each::
+
+    0     sector (bits 0-5), length bits 8-9 (bits 6-7)
+    1     length bits 0-7
+    2-4   label, ASCII, zero padded
+
+Block 2 is written first, then block 1; a card pulled away in between
+keeps the old index, whose label CRC no longer matches, so only the labels
+are lost. A torn index fails its CRC and the utilities fall back to
+``scan()``.
+
+Sector 0 blocks 1-2 are zero on a fresh card. A card that holds anything
+else there (e.g. a MIFARE Application Directory) never gets a directory.
+"""
+
+from crc import crc16
+from mfrc522 import CardInfo
+from rfidpass import slots
+
+MAGIC = 0xD1
+INDEX_BLOCK = 1
+LABEL_BLOCK = 2
+LABEL_LEN = 3
+LABEL_ENTRY = 2 + LABEL_LEN
+MAX_LABELS = 16 // LABEL_ENTRY
+
+FREE = 0
+V1 = 1
+V2 = 2
+CONT = 3
+
+
+class SlotDirectory:
+    """
+    The slot map of one card.
+
+    :param sectors: Sectors on the card, ``rfid.card_info.sectors``.
+    """
+
+    def __init__(self, sectors):
+        self.sectors = sectors
+        self.states = bytearray(sectors)
+        self.lengths = {}
+        self.labels = {}
+
+    @classmethod
+    def parse(cls, sectors, index, labels=None):
+        """
+        Directory from the two blocks, ``None`` if ``index`` is not a valid
+        index block. Labels are dropped unless their CRC matches.
+        """
+
+        index = bytes(index)
+        if index[0] != MAGIC or crc16(memoryview(index)[:14]) != (index[14] << 8) | index[15]:
+            return None
+
+        directory = cls(sectors)
+        for sector in range(1, sectors):
+            directory.states[sector] = (index[2 + sector // 4] >> (2 * (sector % 4))) & 3
+
+        if labels is not None and crc16(labels) == (index[12] << 8) | index[13]:
+            for at in range(0, MAX_LABELS * LABEL_ENTRY, LABEL_ENTRY):
+                sector = labels[at] & 0x3F
+                # A label may name a sector past the card, e.g. 4K labels
+                # read under a misdetected SAK
+                if 0 < sector < sectors and directory.states[sector] in (V1, V2):
+                    directory.lengths[sector] = ((labels[at] >> 6) << 8) | labels[at + 1]
+                    directory.labels[sector] = bytes(labels[at + 2:at + LABEL_ENTRY]).rstrip(b'\x00').decode()
+
+        return directory
+
+    def to_blocks(self):
+        """
+        ``(index, labels)``, the 16 bytes of blocks 1 and 2.
+        """
+
+        labels = bytearray(16)
+        at = 0
+        for sector, _, _ in self.slots():
+            if at == MAX_LABELS * LABEL_ENTRY:
+                break
+            if sector in self.lengths or sector in self.labels:
+                length = self.lengths.get(sector, 0)
+                labels[at] = sector | ((length >> 8) << 6)
+                labels[at + 1] = length & 0xFF
+                text = self.labels.get(sector, '').encode()[:LABEL_LEN]
+                labels[at + 2:at + 2 + len(text)] = text
+                at += LABEL_ENTRY
+
+        index = bytearray(16)
+        index[0] = MAGIC
+        for sector in range(1, self.sectors):
+            index[2 + sector // 4] |= self.states[sector] << (2 * (sector % 4))
+        crc = crc16(labels)
+        index[12] = crc >> 8
+        index[13] = crc & 0xFF
+        crc = crc16(memoryview(index)[:14])
+        index[14] = crc >> 8
+        index[15] = crc & 0xFF
+
+        return bytes(index), bytes(labels)
+
+    def span(self, sector):
+        """
+        Sectors of the slot starting at ``sector``, 0 if none starts there.
+        """
+
+        if self.states[sector] not in (V1, V2):
+            return 0
+        end = sector + 1
+        while end < self.sectors and self.states[end] == CONT:
+            end += 1
+        return end - sector
+
+    def slots(self):
+        """
+        ``(sector, span, version)`` of every slot.
+        """
+
+        return [(sector, self.span(sector), self.states[sector])
+                for sector in range(1, self.sectors) if self.states[sector] in (V1, V2)]
+
+    def free_slots(self, count=1):
+        """
+        Sectors where ``count`` free sectors in a row start.
+        """
+
+        return [sector for sector in range(1, self.sectors - count + 1)
+                if not any(self.states[sector:sector + count])]
+
+    def add(self, sector, span, version, length=None, label=''):
+        self.states[sector] = version
+        for i in range(sector + 1, sector + span):
+            self.states[i] = CONT
+        if length is not None:
+            self.lengths[sector] = length
+        if label:
+            self.labels[sector] = label[:LABEL_LEN]
+
+    def remove(self, sector):
+        """
+        Free the slot at ``sector``, returns the sectors it spanned.
+        """
+
+        span = self.span(sector)
+        for i in range(sector, sector + span):
+            self.states[i] = FREE
+        self.lengths.pop(sector, None)
+        self.labels.pop(sector, None)
+        return span
+
+    def describe(self, sector):
+        """
+        One line for slot listings, e.g. ``Slot 3 (Sectors 3-4, v2, 64 bytes) 'ssh'``.
+        """
+
+        span = self.span(sector)
+        if span == 1:
+            text = "Slot {} (Sector {}, v{}".format(sector, sector, self.states[sector])
+        else:
+            text = "Slot {} (Sectors {}-{}, v{}".format(sector, sector, sector + span - 1, self.states[sector])
+        if sector in self.lengths:
+            text += ", {} bytes".format(self.lengths[sector])
+        text += ")"
+        if self.labels.get(sector):
+            text += " '{}'".format(self.labels[sector])
+        return text
+
+
+def load(rfid, raw_uid, auth_key, labels=True):
+    """
+    Read the directory, one auth and one read (two with ``labels``).
+
+    :return: ``(directory, writable)``: the ``SlotDirectory`` or ``None``
+        when the card has none (or a torn one), and whether ``save()`` may
+        write sector 0.
+    """
+
+    if rfid.auth(rfid.AUTHENT1A, CardInfo.first_block(0), auth_key, raw_uid) != rfid.OK:
+        rfid.reselect(raw_uid)
+        return None, False
+
+    index = rfid.read(INDEX_BLOCK)
+    if index is None:
+        return None, False
+    label_data = None
+    if labels or not any(index):
+        label_data = rfid.read(LABEL_BLOCK)
+
+    directory = SlotDirectory.parse(rfid.card_info.sectors, index, label_data)
+    if directory is not None:
+        return directory, True
+
+    # A torn index can be rewritten, so can a blank sector 0
+    if index[0] == MAGIC:
+        return None, True
+    return None, not any(index) and label_data is not None and not any(label_data)
+
+
+def save(rfid, raw_uid, auth_key, directory):
+    """
+    Write the directory: labels first, then the index as the commit point.
+    """
+
+    index, labels = directory.to_blocks()
+    if rfid.auth(rfid.AUTHENT1A, CardInfo.first_block(0), auth_key, raw_uid) != rfid.OK:
+        return False
+    if rfid.write(LABEL_BLOCK, list(labels)) != rfid.OK:
+        return False
+    return rfid.write(INDEX_BLOCK, list(index)) == rfid.OK
+
+
+def scan(rfid, raw_uid, auth_key, keys):
+    """
+    Build the directory by probing every sector, the slow path for cards
+    without one: one auth and up to three reads per sector. Lengths and
+    labels are not known. Sectors that fail to authenticate count as used.
+    """
+
+    directory = SlotDirectory(rfid.card_info.sectors)
+    sector = 1
+    while sector < directory.sectors:
+        block = CardInfo.first_block(sector)
+        if rfid.auth(rfid.AUTHENT1A, block, auth_key, raw_uid) != rfid.OK:
+            # A failed authentication halts the card, wake it up for the next sector
+            rfid.reselect(raw_uid)
+            directory.add(sector, 1, V1)
+            sector += 1
+            continue
+
+        block0 = None
+        used = False
+        for i in range(3):
+            data = rfid.read(block + i)
+            if i == 0:
+                block0 = data
+            if data is not None and any(data):
+                used = True
+                break
+
+        if not used:
+            sector += 1
+            continue
+
+        # v2 header tells the chain length, everything else is one sector
+        span = 1
+        version = V1
+        if block0 is not None and any(block0):
+            header = keys.decrypt(block0)
+            if header[0] == slots.MAGIC_V2:
+                version = V2
+                span = min(max(header[1], 1), slots.MAX_SECTORS)
+
+                # One plaintext v1 block 0 in 256 decrypts to a v2 header
+                block1 = rfid.read(block + 1)
+                block2 = rfid.read(block + 2)
+                if block1 is not None and block2 is not None:
+                    data = bytes(block0) + bytes(block1) + bytes(block2)
+                    if slots.decode(keys, data, plain_v1=True)[0] == 1:
+                        version = V1
+                        span = 1
+        span = min(span, directory.sectors - sector)
+        directory.add(sector, span, version)
+        sector += span
+
+    return directory
@@ -0,0 +1,412 @@
+"""
+Password slot formats on MIFARE Classic sectors, shared by the typing
+firmwares and the mfc utilities. The AES parts live in ``rfidpass.crypto``.
+
+Both formats use the first three blocks (48 bytes) of a sector.
+
+v1 (legacy): blocks 0-1 hold the password, AES-ECB per block, block 2
+holds CRC-16/CCITT (big-endian) and the length (little-endian). Plaintext
+v1 slots written by mfc-store-password-slots.py before lib/crc.py have
+their CRC over the zero padded blocks (16 or 32 bytes) instead of the
+password, the readers accept both.
+
+v2: block 0 is an AES-ECB encrypted header, blocks 1-2 the payload in
+AES-CTR::
+
+    0     magic/version (MAGIC_V2)
+    1     sectors the slot spans
+    2-3   payload length, big-endian; with PACKED set, the number of
+          base-94 characters packed into the payload
+    4-11  random nonce
+    12-15 AES-CMAC over header bytes 0-11 and the payload ciphertext,
+          truncated to MAC_LEN bytes
+
+A v2 slot longer than 32 bytes is chained: the payload goes on in blocks
+0-2 of the following sectors, 48 bytes each, under the same header, nonce
+and MAC.
+
+A packed payload holds a password of the 94 printable ASCII characters
+'!' to '~' as one base-94 number, big-endian: 39 characters in the 32
+bytes of a single sector instead of 32. Readers from before packing reject
+such a slot as too long.
+
+A v1 block 0 decrypts to printable ASCII, so the first byte of one header
+decrypt tells the versions apart. The MAC is checked before the payload is
+decrypted.
+"""
+
+import os
+
+from crc import CRC16, crc16
+from rfidpass.crypto import BLOCK
+
+MAGIC_V2 = 0xA2
+HEADER_LEN = 12
+MAC_LEN = 4
+SLOT_BYTES = 48
+PAYLOAD_BYTES = SLOT_BYTES - BLOCK
+
+# Longest chain, 32 + 7 * 48 = 368 payload bytes
+MAX_SECTORS = 8
+
+# Length flag of a base-94 packed payload, and its alphabet '!' to '~'
+PACKED = 0x8000
+B94_FIRST = 0x21
+B94_BASE = 94
+
+
+def capacity(sectors):
+    """
+    Payload bytes of a v2 slot spanning ``sectors`` sectors.
+    """
+
+    return PAYLOAD_BYTES + (sectors - 1) * SLOT_BYTES
+
+
+def sectors_needed(length):
+    """
+    Sectors a v2 slot with ``length`` payload bytes spans.
+    """
+
+    if length <= PAYLOAD_BYTES:
+        return 1
+    return 1 + (length - PAYLOAD_BYTES + SLOT_BYTES - 1) // SLOT_BYTES
+
+
+def packed_size(chars):
+    """
+    Bytes of ``chars`` base-94 packed characters.
+    """
+
+    return ((B94_BASE ** chars - 1).bit_length() + 7) // 8
+
+
+def packed_chars(size):
+    """
+    Most base-94 characters that pack into ``size`` bytes.
+    """
+
+    # log2(94) is just over 6.554 bits per character, start at or above the
+    # answer and count down
+    chars = size * 8000 // 6554
+    while packed_size(chars) > size:
+        chars -= 1
+    return chars
+
+
+def can_pack(payload):
+    """
+    ``True`` if every byte of ``payload`` is in the base-94 alphabet.
+    """
+
+    for b in payload:
+        if not B94_FIRST <= b < B94_FIRST + B94_BASE:
+            return False
+    return True
+
+
+def should_pack(payload):
+    """
+    ``True`` if packing ``payload`` saves sectors.
+    """
+
+    return can_pack(payload) and sectors_needed(packed_size(len(payload))) < sectors_needed(len(payload))
+
+
+def stored_size(payload, packed=False):
+    """
+    Payload bytes ``payload`` takes on the card.
+    """
+
+    return packed_size(len(payload)) if packed else len(payload)
+
+
+def pack_b94(payload):
+    """
+    ``payload``, all in the base-94 alphabet, as one big-endian number of
+    ``packed_size(len(payload))`` bytes.
+    """
+
+    n = 0
+    for b in payload:
+        n = n * B94_BASE + b - B94_FIRST
+    return n.to_bytes(packed_size(len(payload)), 'big')
+
+
+def unpack_b94(data, chars):
+    """
+    The ASCII bytes of ``chars`` characters packed into ``data``.
+    """
+
+    n = int.from_bytes(bytes(data), 'big')
+    out = bytearray(chars)
+    for i in range(chars - 1, -1, -1):
+        n, digit = divmod(n, B94_BASE)
+        out[i] = B94_FIRST + digit
+    return bytes(out)
+
+
+def encode(keys, payload, nonce=None, packed=False):
+    """
+    Build a v2 slot, 48 bytes for each sector it spans.
+
+    :param keys: ``SlotKeys`` of the card.
+    :param payload: Password bytes, at most ``capacity(MAX_SECTORS)``.
+    :param nonce: 8 bytes, random by default.
+    :param packed: Store the password base-94 packed, see ``can_pack()``.
+    """
+
+    length = len(payload)
+    if packed:
+        if not can_pack(payload):
+            raise ValueError("password has characters outside '!' to '~'")
+        payload = pack_b94(payload)
+
+    sectors = sectors_needed(len(payload))
+    if sectors > MAX_SECTORS:
+        raise ValueError("payload longer than {} bytes".format(capacity(MAX_SECTORS)))
+
+    if nonce is None:
+        nonce = os.urandom(8)
+
+    if packed:
+        length |= PACKED
+
+    header = bytearray(BLOCK)
+    header[0] = MAGIC_V2
+    header[1] = sectors
+    header[2] = length >> 8
+    header[3] = length & 0xFF
+    header[4:12] = nonce
+
+    # Unused payload bytes are encrypted zeros, the MAC covers all of them
+    body = bytes(payload) + b'\x00' * (capacity(sectors) - len(payload))
+    cipher = keys.ctr(nonce, body)
+
+    header[12:16] = keys.cmac(bytes(header[:HEADER_LEN]) + bytes(cipher))[:MAC_LEN]
+
+    return bytes(keys.encrypt(header)) + bytes(cipher)
+
+
+def slot_sectors(keys, block0, plain_v1=False):
+    """
+    Sectors the slot starting with ``block0`` spans, from one header
+    decrypt: 1 for v1, 0 for a header that cannot be valid.
+
+    :param block0: Block 0 of the slot's first sector, blocks 0-2 with
+        ``plain_v1``.
+    :param plain_v1: See ``decode()``; a sector that holds a good
+        plaintext v1 slot spans 1 whatever its block 0 decrypts to.
+    """
+
+    header = keys.decrypt(bytes(block0[:BLOCK]))
+    if header[0] != MAGIC_V2:
+        return 1
+    if plain_v1 and _decode_plain_v1(block0) is not None:
+        return 1
+    if 1 <= header[1] <= MAX_SECTORS:
+        return header[1]
+    return 0
+
+
+def decode(keys, data, plain_v1=False):
+    """
+    Check and decrypt a slot in either format.
+
+    :param keys: ``SlotKeys`` of the card.
+    :param data: Blocks 0-2 of every sector the slot spans, see ``slot_sectors()``.
+    :param plain_v1: v1 slots are stored unencrypted (the non-AES firmwares).
+        The block 0 of one plaintext slot in 256 decrypts to ``MAGIC_V2``,
+        such a slot is decoded as v1 once it fails the v2 checks.
+    :return: ``(version, payload)``, payload ``None`` if the slot is empty,
+        corrupted, incomplete or written with another key.
+    """
+
+    data = bytes(data)
+    header = keys.decrypt(data[:BLOCK])
+
+    if header[0] != MAGIC_V2:
+        if plain_v1:
+            return 1, _decode_plain_v1(data)
+        return 1, _decode_v1(header, keys.decrypt(data[16:32]), keys.decrypt(data[32:48]))
+
+    payload = _decode_v2(keys, header, data)
+    if payload is None and plain_v1:
+        password = _decode_plain_v1(data)
+        if password is not None:
+            return 1, password
+    return 2, payload
+
+
+def _decode_v2(keys, header, data):
+
+    sectors = header[1]
+    length = (header[2] << 8) | header[3]
+    end = sectors * SLOT_BYTES
+    if not 1 <= sectors <= MAX_SECTORS or len(data) < end:
+        return None
+
+    chars = 0
+    if length & PACKED:
+        chars = length & ~PACKED
+        if chars > packed_chars(capacity(sectors)):
+            return None
+        length = packed_size(chars)
+    if length > capacity(sectors):
+        return None
+
+    # Reject before spending any time on the payload
+    mac = keys.cmac(bytes(header[:HEADER_LEN]) + data[BLOCK:end])
+    if bytes(mac[:MAC_LEN]) != bytes(header[12:16]):
+        return None
+
+    payload = keys.ctr(header[4:12], data[BLOCK:BLOCK + length])
+    if chars:
+        return unpack_b94(payload, chars)
+    return bytes(payload)
+
+
+def _decode_plain_v1(data):
+    if len(data) < SLOT_BYTES:
+        return None
+    password = _decode_v1(data[0:16], data[16:32], data[32:48])
+    if password is None:
+        password = _decode_padded_v1(data)
+    return password
+
+
+def _decode_padded_v1(data):
+    # CRC over the password padded to one or two whole blocks
+    stored_crc = (data[32] << 8) | data[33]
+    length = data[34] | (data[35] << 8)
+    if length > PAYLOAD_BYTES:
+        return None
+    padded = BLOCK if length <= BLOCK else PAYLOAD_BYTES
+    if crc16(data[:padded]) != stored_crc:
+        return None
+    return bytes(data[:length])
+
+
+def _decode_v1(block0, block1, block2):
+
+    stored_crc = (block2[0] << 8) | block2[1]
+    length = block2[2] | (block2[3] << 8)
+    if length > PAYLOAD_BYTES:
+        return None
+
+    # Check the CRC over the blocks in place, copy only a good password
+    crc = CRC16()
+    crc.update(memoryview(block0)[:min(length, BLOCK)])
+    crc.update(memoryview(block1)[:max(length - BLOCK, 0)])
+    if crc.value != stored_crc:
+        return None
+    return (bytes(block0) + bytes(block1))[:length]
+
+
+def read_sectors(rfid, raw_uid, auth_key, first, count):
+    """
+    Blocks 0-2 of ``count`` sectors from ``first`` on, one auth and three
+    reads per sector. ``None`` if any auth or read fails.
+    """
+
+    from mfrc522 import CardInfo
+
+    data = bytearray()
+    for sector in range(first, first + count):
+        block = CardInfo.first_block(sector)
+        if rfid.auth(rfid.AUTHENT1A, block, auth_key, raw_uid) != rfid.OK:
+            return None
+        for i in range(3):
+            chunk = rfid.read(block + i)
+            if chunk is None:
+                return None
+            data += bytes(chunk)
+    return data
+
+
+def read_slot(rfid, raw_uid, auth_key, sector, keys, plain_v1=False):
+    """
+    Read and decode the slot starting at ``sector``, following a v2 chain
+    into the next sectors.
+
+    :return: ``(version, payload)`` like ``decode()``, version 0 when the
+        card could not be read.
+    """
+
+    data = read_sectors(rfid, raw_uid, auth_key, sector, 1)
+    if data is None:
+        return 0, None
+
+    sectors = slot_sectors(keys, data, plain_v1)
+    if sectors > 1:
+        if sector + sectors > rfid.card_info.sectors:
+            return 2, None
+        more = read_sectors(rfid, raw_uid, auth_key, sector + 1, sectors - 1)
+        if more is None:
+            return 0, None
+        data += more
+
+    return decode(keys, data, plain_v1)
+
+
+def write_slot(rfid, raw_uid, auth_key, sector, data):
+    """
+    Write an encoded slot to blocks 0-2 of consecutive sectors from
+    ``sector`` on, one auth per sector.
+
+    :return: ``True`` if every block was written.
+    """
+
+    from mfrc522 import CardInfo
+
+    for i in range(len(data) // SLOT_BYTES):
+        block = CardInfo.first_block(sector + i)
+        if rfid.auth(rfid.AUTHENT1A, block, auth_key, raw_uid) != rfid.OK:
+            return False
+        for j in range(3):
+            at = i * SLOT_BYTES + j * BLOCK
+            if rfid.write(block + j, list(data[at:at + BLOCK])) != rfid.OK:
+                return False
+    return True
+
+
+def read_password(rfid, raw_uid, auth_key, slot, keys, plain_v1=False):
+    """
+    Read, check and decode the password of a slot for typing, with the
+    console messages of the firmwares.
+
+    :param slot: Slot number, slot N starts at sector N.
+    :param keys: ``SlotKeys`` of the card, see ``KeyCache.slot_keys()``.
+    :param plain_v1: v1 slots are stored unencrypted (the non-AES firmwares).
+    :return: The password, ``None`` if the slot is missing, unreadable or
+        fails verification.
+    """
+
+    sector = slot
+    if sector >= rfid.card_info.sectors:
+        print("Slot {} does not exist on a {}.".format(slot, rfid.card_info.family_name))
+        return None
+
+    # The header decrypt tells v1 from v2, a chained v2 slot is read on from
+    # the next sectors (one auth and three reads per sector) and authenticated
+    # before its payload gets decrypted.
+    version, password_bytes = read_slot(rfid, raw_uid, auth_key, sector, keys, plain_v1)
+    return report_password(slot, sector, version, password_bytes)
+
+
+def report_password(slot, sector, version, password_bytes):
+    """
+    Print the outcome of reading a slot, the password as text or ``None``.
+    """
+
+    if version == 0:
+        print("Failed to read slot {} (sector {}).".format(slot, sector))
+        return None
+    if password_bytes is None:
+        print("Slot {} (sector {}, v{}) failed verification. Empty, corrupted or from another card.".format(
+            slot, sector, version))
+        return None
+
+    password = password_bytes.decode('utf-8')
+    print("Password retrieved from slot {} (sector {}, v{}): {}".format(slot, sector, version, password))
+    return password
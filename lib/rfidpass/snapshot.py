@@ -0,0 +1,139 @@
+"""
+RAM copy of the slot ciphertext of one card, so the gpio and async
+firmwares can type another slot without a second tap.
+
+The sectors of every used slot are read in one RF session, slot by slot
+with one auth and three reads per sector. With a slot directory only the
+used sectors are read, without one every sector is. Nothing is decrypted
+until a slot is typed, and the copy is wiped when the card leaves or the
+snapshot times out.
+"""
+
+import time
+
+from rfidpass import slotdir, slots
+
+
+class CardSnapshot:
+    """
+    Blocks 0-2 of the slot sectors of one card.
+
+    :param raw_uid: UID of the card.
+    :param keys: ``SlotKeys`` of the card.
+    :param sectors: Number of sectors on the card.
+    """
+
+    def __init__(self, raw_uid, keys, sectors):
+        self.raw_uid = raw_uid
+        self.keys = keys
+        self.sectors = sectors
+        # sector -> 48 bytes
+        self.data = {}
+        # The slot directory the snapshot was read by, None without one
+        self.directory = None
+        self.taken_at = time.monotonic()
+
+    @classmethod
+    def take(cls, rfid, raw_uid, auth_key, keys, labels=False, scan=True):
+        """
+        Read the slots of the card in the field. Sectors that cannot be read
+        are left out, their slots fail like an unreadable card.
+
+        :param labels: Read the directory labels as well.
+        :param scan: Read every sector of a card without a slot directory;
+            when ``False`` such a card gives ``None``.
+        """
+
+        directory, _ = slotdir.load(rfid, raw_uid, auth_key, labels)
+        if directory is None and not scan:
+            return None
+
+        snapshot = cls(raw_uid, keys, rfid.card_info.sectors)
+        snapshot.directory = directory
+        if directory is not None:
+            used = [sector for first, span, _ in directory.slots()
+                    for sector in range(first, first + span)]
+        else:
+            used = range(1, snapshot.sectors)
+
+        for sector in used:
+            data = slots.read_sectors(rfid, raw_uid, auth_key, sector, 1)
+            if data is None:
+                # A failed authentication halts the card
+                rfid.reselect(raw_uid)
+                continue
+            snapshot.data[sector] = data
+
+        return snapshot
+
+    def slots(self, plain_v1=False):
+        """
+        ``(sector, span)`` of every slot: from the directory, or from the
+        sectors that are not blank. An unreadable sector counts as a slot.
+
+        :param plain_v1: The card may hold plaintext v1 slots, see
+            ``slots.slot_sectors()``.
+        """
+
+        if self.directory is not None:
+            return [(sector, span) for sector, span, _ in self.directory.slots()]
+
+        found = []
+        sector = 1
+        while sector < self.sectors:
+            data = self.data.get(sector)
+            span = 1
+            if data is None:
+                found.append((sector, span))
+            elif any(data):
+                span = min(max(slots.slot_sectors(self.keys, data, plain_v1), 1), self.sectors - sector)
+                found.append((sector, span))
+            sector += span
+        return found
+
+    def decode(self, sector, plain_v1=False, keys=None):
+        """
+        Check and decrypt the slot starting at ``sector``.
+
+        :param keys: ``SlotKeys`` to try instead of those of the snapshot.
+        :return: ``(version, payload)`` like ``slots.read_slot()``, version
+            0 if a sector of the slot could not be read.
+        """
+
+        if keys is None:
+            keys = self.keys
+        data = self.data.get(sector)
+        if data is None:
+            return 0, None
+
+        span = slots.slot_sectors(keys, data, plain_v1)
+        if span > 1:
+            data = bytearray(data)
+            for i in range(sector + 1, sector + span):
+                more = self.data.get(i)
+                if more is None:
+                    return 0, None
+                data += more
+
+        return slots.decode(keys, data, plain_v1)
+
+    def password(self, slot, plain_v1=False):
+        """
+        Decode a slot from RAM, with the console messages of
+        ``slots.read_password()``.
+        """
+
+        sector = slot
+        if sector >= self.sectors:
+            print("Slot {} does not exist on this card.".format(slot))
+            return None
+
+        version, payload = self.decode(sector, plain_v1)
+        return slots.report_password(slot, sector, version, payload)
+
+    def wipe(self):
+        for data in self.data.values():
+            for i in range(len(data)):
+                data[i] = 0
+        self.data = {}
+        self.keys = None
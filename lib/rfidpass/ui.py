@@ -0,0 +1,117 @@
+"""
+Status LEDs, the slot button and the console prompts of the firmwares.
+"""
+
+import time
+
+import digitalio
+from rfidpass import config
+
+
+def _output(pin):
+    led = digitalio.DigitalInOut(pin)
+    led.direction = digitalio.Direction.OUTPUT
+    led.value = False
+    return led
+
+
+class Leds:
+    """
+    The red, green and blue status LEDs, off after construction.
+    """
+
+    def __init__(self, red=config.RED_LED, green=config.GREEN_LED, blue=config.BLUE_LED):
+        self.red = _output(red)
+        self.green = _output(green)
+        self.blue = _output(blue)
+
+    def off(self):
+        self.red.value = False
+        self.green.value = False
+        self.blue.value = False
+
+    def any_on(self):
+        return self.red.value or self.green.value or self.blue.value
+
+    @staticmethod
+    def blink(led, times, period=0.2):
+        """Blink one LED a number of times, e.g. to show the selected slot."""
+        for _ in range(times):
+            led.value = True
+            time.sleep(period)
+            led.value = False
+            time.sleep(period)
+
+    @staticmethod
+    async def blink_async(led, times, period=0.2):
+        import asyncio
+
+        for _ in range(times):
+            led.value = True
+            await asyncio.sleep(period)
+            led.value = False
+            await asyncio.sleep(period)
+
+
+class ClickButton:
+    """
+    Push button to GND with the internal pull-up, counting clicks that
+    follow each other within ``click_time_frame`` seconds.
+
+    :param pin: Board pin of the button.
+    :param click_time_frame: Seconds after the last press before the clicks
+        are counted as one gesture.
+    """
+
+    def __init__(self, pin, click_time_frame=1.0):
+        self.button = digitalio.DigitalInOut(pin)
+        self.button.direction = digitalio.Direction.INPUT
+        self.button.pull = digitalio.Pull.UP
+        self.click_time_frame = click_time_frame
+        self.was_pressed = False
+        self.last_press_time = 0
+        self.press_count = 0
+
+    def poll(self):
+        """
+        Sample the button, call often.
+
+        :return: Number of clicks of a finished gesture, 0 otherwise.
+        """
+
+        now = time.monotonic()
+        # button.value is False when pressed
+        if not self.button.value:
+            if not self.was_pressed:
+                self.was_pressed = True
+                self.press_count += 1
+                self.last_press_time = now
+                print("Button pressed! Press count: {}".format(self.press_count))
+        elif self.was_pressed:
+            self.was_pressed = False
+            print("Button released!")
+
+        if self.press_count and now - self.last_press_time > self.click_time_frame:
+            clicks = self.press_count
+            self.press_count = 0
+            return clicks
+        return 0
+
+
+def prompt_slot(rfid):
+    """
+    Ask on the console which slot of the card on ``rfid`` to read, ``None``
+    on invalid input.
+    """
+
+    max_slot = rfid.card_info.sectors - 1
+    try:
+        slot = int(input("Enter the slot number to read (1-{}): ".format(max_slot)))
+    except ValueError:
+        print("Invalid input. Please enter a number.")
+        return None
+
+    if slot < 1 or slot > max_slot:
+        print("Invalid slot number. Please enter a number between 1 and {}.".format(max_slot))
+        return None
+    return slot
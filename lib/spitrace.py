@@ -0,0 +1,75 @@
+"""
+Ring buffer of the register reads and writes the ``mfrc522`` driver puts
+on the SPI bus, see ``MFRC522.trace``.
+
+A dump is ``MAGIC``, the record count (u16 LE) and the records oldest
+first, each ``RECORD`` bytes: address with bit 7 set for a read, value,
+microsecond tick (u32 LE, wraps after ~71 minutes).
+``utils/host/spi-trace-replay.py`` reads it back on a PC.
+"""
+
+import struct
+import time
+
+MAGIC = b"SPT1"
+RECORD = 6
+BEGIN = "-----BEGIN SPI TRACE-----"
+END = "-----END SPI TRACE-----"
+
+
+class SpiTrace:
+    """
+    Fixed size trace, the oldest records are overwritten once it is full.
+
+    :param size: Number of records kept.
+    """
+
+    def __init__(self, size=512):
+        self.size = size
+        self.buf = bytearray(size * RECORD)
+        self.pos = 0
+        self.total = 0
+
+    def record(self, reg, val, read=False):
+        struct.pack_into("<BBI", self.buf, self.pos * RECORD,
+                         (reg & 0x3F) | (0x80 if read else 0), val & 0xFF,
+                         (time.monotonic_ns() // 1000) & 0xFFFFFFFF)
+        self.pos = (self.pos + 1) % self.size
+        self.total += 1
+
+    def clear(self):
+        self.pos = 0
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.size)
+
+    def to_bytes(self):
+        """
+        The trace in the binary dump format.
+        """
+
+        count = len(self)
+        start = (self.pos - count) % self.size
+        out = bytearray(MAGIC + struct.pack("<H", count))
+        for i in range(count):
+            at = ((start + i) % self.size) * RECORD
+            out += self.buf[at:at + RECORD]
+        return bytes(out)
+
+    def dump(self, stream=None, width=32):
+        """
+        Write the binary dump to ``stream`` (e.g. ``usb_cdc.data``), or
+        print it as hex lines between ``BEGIN`` and ``END`` markers on the
+        console when no stream is given.
+        """
+
+        data = self.to_bytes()
+        if stream is not None:
+            stream.write(data)
+            return
+
+        print(BEGIN)
+        for i in range(0, len(data), width):
+            print(''.join('{:02x}'.format(x) for x in data[i:i + width]))
+        print(END)
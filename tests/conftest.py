@@ -0,0 +1,79 @@
+"""
+The driver runs on the host against the mock bus of
+``utils/host/spi-trace-replay.py``, with ``ChipModel`` as the chip.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lib"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mfrc522_model import ChipModel  # noqa: E402
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+
+def _load_replay():
+    path = os.path.join(ROOT, "utils", "host", "spi-trace-replay.py")
+    spec = importlib.util.spec_from_file_location("spi_trace_replay", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# One chip for the whole session, the driver module binds the mock
+# classes when it is first imported
+CHIP = ChipModel()
+_load_replay().install_mock(CHIP)
+
+
+@pytest.fixture
+def chip():
+    CHIP.reset(None)
+    return CHIP
+
+
+@pytest.fixture
+def rfid(chip):
+    from mfrc522 import MFRC522
+
+    return MFRC522(None, None, None, None, None)
+
+
+class HostAES:
+    """
+    ``aesio.AES`` stand-in, see utils/host/encode-slot-images.py.
+    """
+
+    def __init__(self, key):
+        cipher = Cipher(algorithms.AES(bytes(key)), modes.ECB())
+        self.encryptor = cipher.encryptor()
+        self.decryptor = cipher.decryptor()
+
+    def encrypt_into(self, src, dst):
+        dst[:] = self.encryptor.update(bytes(src))
+
+    def decrypt_into(self, src, dst):
+        dst[:] = self.decryptor.update(bytes(src))
+
+
+@pytest.fixture
+def host_aes(monkeypatch):
+    """
+    ``rfidpass.crypto`` on the ``cryptography`` package instead of aesio.
+    """
+
+    if Cipher is None:
+        pytest.skip("needs the cryptography package")
+    from rfidpass import crypto
+
+    monkeypatch.setattr(crypto, "new_cipher", HostAES)
+    return HostAES
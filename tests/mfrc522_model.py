@@ -0,0 +1,222 @@
+"""
+Register-level MFRC522 and ISO-DEP card model for the host tests.
+
+``ChipModel`` plugs into the mock bus of ``utils/host/spi-trace-replay.py``
+(``install_mock()``) in place of its ``ReplayChip``: register writes take
+effect, and every chip select cycle moves a few bytes between the FIFO
+and the RF field, so frames longer than the FIFO really have to be
+streamed by the driver. CRC_A is not modelled, the tests run with the
+hardware CRC that ISO-DEP requires.
+"""
+
+# Bytes moved between FIFO and field per chip select cycle
+RATE = 8
+
+FIFO_SIZE = 64
+
+
+class ChipModel:
+    """
+    The registers, FIFO and Transceive command of one MFRC522, with an
+    ISO-DEP card in the field.
+    """
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, card):
+        self.card = card
+        self.r = [0] * 64
+        self.r[0x37] = 0x92
+        self.fifo = []
+        self.armed = False
+        self.tx = None
+        self.rx = None
+        self.begin()
+
+    # Bus side, see ReplayChip
+
+    def begin(self):
+        self.first = True
+        self.waddr = None
+        self.raddr = None
+        self.tick()
+
+    def xfer(self, byte):
+        out = 0
+        if self.raddr is not None:
+            out = self.read(self.raddr)
+            self.raddr = None
+
+        if self.waddr is not None:
+            self.write(self.waddr, byte)
+        elif byte & 0x80:
+            self.raddr = (byte >> 1) & 0x3F
+        elif self.first:
+            self.waddr = (byte >> 1) & 0x3F
+        self.first = False
+        return out
+
+    # Registers
+
+    def read(self, reg):
+        if reg == 0x09:
+            return self.fifo.pop(0) if self.fifo else 0
+        if reg == 0x0A:
+            return len(self.fifo)
+        if reg == 0x07:
+            water = self.r[0x0B]
+            return ((0x01 if len(self.fifo) <= water else 0)
+                    | (0x02 if FIFO_SIZE - len(self.fifo) <= water else 0))
+        return self.r[reg]
+
+    def write(self, reg, val):
+        if reg == 0x01:
+            self.r[reg] = val & 0x2F
+            cmd = val & 0x0F
+            if cmd == 0x0F:
+                self.reset(self.card)
+            self.armed = cmd == 0x0C
+            if cmd == 0x00:
+                self.tx = self.rx = None
+        elif reg in (0x04, 0x05):
+            if val & 0x80:
+                self.r[reg] |= val & 0x7F
+            else:
+                self.r[reg] &= ~val & 0x7F
+        elif reg == 0x09:
+            if len(self.fifo) < FIFO_SIZE:
+                self.fifo.append(val)
+            else:
+                self.r[0x06] |= 0x10
+        elif reg == 0x0A:
+            if val & 0x80:
+                self.fifo = []
+                self.r[0x06] &= ~0x10
+        else:
+            self.r[reg] = val
+            if reg == 0x0D and val & 0x80 and self.armed and self.tx is None:
+                self.r[0x06] = 0
+                self.tx = []
+
+    @property
+    def timeout_ticks(self):
+        return (self.r[0x2C] << 8) | self.r[0x2D]
+
+    # RF side
+
+    def tick(self):
+        if self.tx is not None:
+            self.tx += self.fifo[:RATE]
+            del self.fifo[:RATE]
+            if not self.fifo:
+                frame, self.tx = self.tx, None
+                self.answer(frame)
+        elif self.rx is not None:
+            for _ in range(RATE):
+                if not self.rx:
+                    break
+                if len(self.fifo) >= FIFO_SIZE:
+                    self.r[0x06] |= 0x10
+                    break
+                self.fifo.append(self.rx.pop(0))
+            if not self.rx:
+                self.rx = None
+                self.r[0x04] |= 0x30
+
+    def answer(self, frame):
+        resp = None
+        if self.card is not None:
+            resp = self.card.frame(bytes(frame), self)
+        if resp is None:
+            # Nothing came back before TReload ran out
+            self.r[0x04] |= 0x01
+            return
+        self.r[0x0C] &= ~0x07
+        self.rx = list(resp)
+
+
+class IsoDepCard:
+    """
+    An ISO-DEP card after anticollision, following the PICC rules of
+    ISO/IEC 14443-4 7.5.4 for block numbers, chaining and recovery.
+
+    :param ats: Answer to RATS, TL byte included.
+    :param handler: Function from a command APDU to the response APDU.
+    :param chunk: Response bytes per I-block, smaller than the FSD to make
+        the card chain its answers.
+    """
+
+    def __init__(self, ats, handler, chunk=253):
+        self.ats = bytes(ats)
+        self.handler = handler
+        self.chunk = chunk
+        self.block_num = 1
+        self.command = bytearray()
+        self.pending = b''
+        self.last = None
+        # S(WTX) requests sent before the next answer, and their WTXM
+        self.wtx = 0
+        self.wtxm = 1
+        # Consumed per frame: None, 'lost' (the frame never reaches the
+        # card) or 'mute' (the card's answer is lost)
+        self.faults = []
+        # (frame, TxModeReg, timeout ticks) of every frame that arrived
+        self.log = []
+        self.apdus = []
+
+    def frame(self, data, chip):
+        fault = self.faults.pop(0) if self.faults else None
+        if fault == 'lost':
+            return None
+        self.log.append((data, chip.r[0x12], chip.timeout_ticks))
+        out = self.handle(data)
+        if out is not None:
+            self.last = out
+        return None if fault == 'mute' else out
+
+    def handle(self, data):
+        pcb = data[0]
+
+        if pcb == 0xE0:
+            self.block_num = 1
+            return self.ats
+        if pcb & 0xF0 == 0xD0:
+            return bytes([pcb])
+        if pcb == 0xC2:
+            return bytes([pcb])
+
+        if pcb & 0xE2 == 0x02:
+            # Rule D, every I-block toggles the block number
+            self.block_num ^= 1
+            self.command += data[1:]
+            if pcb & 0x10:
+                return bytes([0xA2 | self.block_num])
+            apdu, self.command = bytes(self.command), bytearray()
+            self.apdus.append(apdu)
+            self.pending = bytes(self.handler(apdu))
+            return self.next_block()
+
+        if pcb & 0xF7 == 0xF2:
+            return self.next_block()
+
+        if pcb & 0xE6 == 0xA2:
+            nak = pcb & 0x10
+            if pcb & 0x01 == self.block_num:
+                # Rule 11, our last block was lost
+                return self.last
+            if nak:
+                # Rule 12, the reader's block never arrived
+                return bytes([0xA2 | self.block_num])
+            # Rule 13 and E, the next block of a chained answer
+            self.block_num ^= 1
+            return self.next_block()
+
+        return None
+
+    def next_block(self):
+        if self.wtx:
+            self.wtx -= 1
+            return bytes([0xF2, self.wtxm])
+        piece, self.pending = self.pending[:self.chunk], self.pending[self.chunk:]
+        return bytes([0x02 | self.block_num | (0x10 if self.pending else 0)]) + piece
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from crc import CRC16, crc16
+
+
+def calculate_crc(data):
+    # The per-bit loop the scripts carried before lib/crc.py
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+def test_catalogue_check_value():
+    # CRC-16/CCITT-FALSE
+    assert crc16(b"123456789") == 0x29B1
+    assert crc16(b"") == 0xFFFF
+
+
+@pytest.mark.parametrize("length", list(range(49)) + [64, 128, 368])
+def test_matches_per_bit_loop(length):
+    rng = random.Random(length)
+    data = bytes(rng.getrandbits(8) for _ in range(length))
+    expected = calculate_crc(data)
+    assert crc16(data) == expected
+
+    # Incremental over views of one buffer gives the same value
+    split = rng.randint(0, length)
+    view = memoryview(data)
+    assert CRC16().update(view[:split]).update(view[split:]).value == expected
@@ -0,0 +1,109 @@
+import pytest
+
+from rfidpass import crypto
+
+SECRET = bytes(range(16))
+UID_A = [0x04, 0x11, 0x22, 0x33, 0x44, 0x55, 0x66]
+UID_B = [0xDE, 0xAD, 0xBE, 0xEF]
+UID_C = [0x01, 0x02, 0x03, 0x04]
+
+
+def reference_cmac(key, message):
+    from cryptography.hazmat.primitives.cmac import CMAC
+    from cryptography.hazmat.primitives.ciphers import algorithms
+
+    mac = CMAC(algorithms.AES(bytes(key)))
+    mac.update(bytes(message))
+    return mac.finalize()
+
+
+@pytest.mark.parametrize("uid", [UID_B, UID_A, list(range(10))])
+@pytest.mark.parametrize("rounds", [1, 2, 10])
+def test_kdf_is_iterated_cmac(host_aes, uid, rounds):
+    expected = reference_cmac(SECRET, bytes([crypto.KDF_LABEL, len(uid)]) + bytes(uid))
+    for _ in range(rounds - 1):
+        expected = reference_cmac(SECRET, expected)
+
+    assert bytes(crypto.derive_key(uid, SECRET, rounds)) == expected
+
+
+def test_slot_keys_cmac_is_rfc4493(host_aes):
+    keys = crypto.SlotKeys(crypto.uid_key(UID_B))
+    mac_key = keys.encrypt(crypto.MAC_KEY_LABEL)
+    for length in (0, 1, 15, 16, 17, 48, 64):
+        data = bytes(range(length))
+        assert bytes(keys.cmac(data)) == reference_cmac(mac_key, data)
+
+
+def test_kdf_cost_is_one_block_per_round(host_aes, monkeypatch):
+    blocks = []
+
+    class Counting(host_aes):
+        def encrypt_into(self, src, dst):
+            blocks.append(1)
+            super().encrypt_into(src, dst)
+
+    monkeypatch.setattr(crypto, "new_cipher", Counting)
+    for rounds in (1, 5, 20):
+        del blocks[:]
+        crypto.derive_key(UID_B, SECRET, rounds)
+        # The CMAC subkeys take one more
+        assert len(blocks) == rounds + 1
+
+
+@pytest.fixture
+def derived(host_aes, monkeypatch):
+    calls = []
+    derive_key = crypto.derive_key
+
+    def counting(raw_uid, secret, rounds):
+        calls.append(bytes(raw_uid))
+        return derive_key(raw_uid, secret, rounds)
+
+    monkeypatch.setattr(crypto, "derive_key", counting)
+    return calls
+
+
+def test_hit_does_not_derive_again(derived):
+    cache = crypto.KeyCache(SECRET, rounds=3)
+
+    key = cache.key(UID_A, now=0)
+    assert cache.key(UID_A, now=1) is key
+    assert bytes(cache.slot_keys(UID_A, now=2).encrypt(bytes(16))) == bytes(
+        crypto.SlotKeys(bytes(key)).encrypt(bytes(16)))
+    assert derived == [bytes(UID_A)]
+
+
+def test_least_recently_used_evicted_and_zeroed(derived):
+    cache = crypto.KeyCache(SECRET, size=2)
+
+    key_a = cache.key(UID_A, now=0)
+    key_b = cache.key(UID_B, now=1)
+    copy_b = bytes(key_b)
+    cache.key(UID_A, now=2)
+    cache.key(UID_C, now=3)
+
+    assert [uid for uid, _ in cache.entries] == [bytes(UID_A), bytes(UID_C)]
+    assert key_b == bytes(16) and copy_b != bytes(16)
+    assert key_a != bytes(16)
+    # B comes back with a fresh derivation
+    assert bytes(cache.key(UID_B, now=4)) == copy_b
+    assert derived == [bytes(UID_A), bytes(UID_B), bytes(UID_C), bytes(UID_B)]
+
+
+def test_idle_timeout_wipes_every_key(derived):
+    cache = crypto.KeyCache(SECRET, idle_timeout=60)
+    keys = [cache.key(uid, now=10) for uid in (UID_A, UID_B)]
+
+    cache.expire(70)
+    assert len(cache.entries) == 2
+    cache.expire(70.5)
+    assert cache.entries == []
+    assert all(key == bytes(16) for key in keys)
+
+
+def test_uid_keys_are_not_cached(derived):
+    cache = crypto.KeyCache()
+
+    assert cache.key(UID_B) == crypto.uid_key(UID_B)
+    assert cache.entries == [] and derived == []
@@ -0,0 +1,134 @@
+from isodep import IsoDep
+from mfrc522_model import IsoDepCard
+
+# FSCI 8 (256 bytes), TA(1) 212-848 kbit/s both ways, FWI 8, SFGI 1
+ATS = [0x05, 0x78, 0x77, 0x81, 0x02]
+# FSCI 2 (32 bytes), FWI 8
+ATS_FSC32 = [0x03, 0x22, 0x80]
+
+FWT_TICKS = (IsoDep.FWT_UNIT_US * 257 + 499) // 500
+
+
+def echo(apdu):
+    return bytes(reversed(apdu)) + b'\x90\x00'
+
+
+def activate(rfid, chip, ats=ATS, handler=echo, **kwargs):
+    card = IsoDepCard(ats, handler, **kwargs)
+    chip.card = card
+    tag = IsoDep(rfid)
+    assert tag.activate() == rfid.OK
+    return tag, card
+
+
+def test_activate_parses_ats_and_switches_bit_rate(rfid, chip):
+    tag, card = activate(rfid, chip)
+
+    assert (tag.fsc, tag.fwi, tag.sfgi) == (256, 8, 1)
+    assert (tag.kbps, tag.rx_kbps) == (424, 424)
+    rats, pps = card.log[0][0], card.log[1][0]
+    assert rats == bytes([0xE0, (IsoDep.FSDI << 4)])
+    assert pps == bytes([0xD0, 0x11, 0x0A])
+    assert chip.r[0x12] == 0xA0 and chip.r[0x13] == 0xA0
+    assert chip.timeout_ticks == FWT_TICKS
+
+
+def test_short_apdu(rfid, chip):
+    tag, card = activate(rfid, chip)
+
+    stat, resp = tag.transceive([0x00, 0xA4, 0x04, 0x00])
+    assert stat == rfid.OK
+    assert bytes(resp) == echo(bytes([0x00, 0xA4, 0x04, 0x00]))
+    stat, resp = tag.transceive([0x01])
+    assert stat == rfid.OK and bytes(resp) == b'\x01\x90\x00'
+
+
+def test_apdu_chained_to_card_frame_size(rfid, chip):
+    tag, card = activate(rfid, chip, ATS_FSC32)
+    apdu = bytes(range(200))
+
+    stat, resp = tag.transceive(list(apdu))
+    assert stat == rfid.OK
+    assert card.apdus == [apdu]
+    blocks = [frame for frame, _, _ in card.log if frame[0] & 0xE2 == 0x02]
+    assert len(blocks) == 7
+    assert all(len(frame) <= 32 - 2 for frame in blocks)
+    assert [frame[0] & 0x10 for frame in blocks] == [0x10] * 6 + [0]
+    assert bytes(resp) == echo(apdu)
+
+
+def test_chained_answer_through_fifo(rfid, chip):
+    tag, card = activate(rfid, chip, handler=lambda apdu: bytes(range(256)) * 2 + b'\x90\x00', chunk=100)
+
+    stat, resp = tag.transceive([0x90, 0x60, 0x00, 0x00, 0x00])
+    assert stat == rfid.OK
+    assert bytes(resp) == bytes(range(256)) * 2 + b'\x90\x00'
+    acks = [frame for frame, _, _ in card.log if frame[0] & 0xF6 == 0xA2]
+    assert len(acks) == 5
+
+
+def test_long_frames_stream_through_fifo(rfid, chip):
+    # 250 byte blocks both ways, four times the FIFO
+    tag, card = activate(rfid, chip)
+    apdu = bytes(i & 0xFF for i in range(250))
+
+    stat, resp = tag.transceive(list(apdu))
+    assert stat == rfid.OK
+    assert card.apdus == [apdu]
+    assert bytes(resp) == echo(apdu)
+
+
+def test_wtx_extends_timeout(rfid, chip):
+    tag, card = activate(rfid, chip)
+    card.wtx = 2
+    card.wtxm = 5
+
+    stat, resp = tag.transceive([0x01, 0x02])
+    assert stat == rfid.OK and bytes(resp) == b'\x02\x01\x90\x00'
+    replies = [(frame, ticks) for frame, _, ticks in card.log if frame[0] == 0xF2]
+    assert replies == [(bytes([0xF2, 5]), (IsoDep.FWT_UNIT_US * 257 * 5 + 499) // 500)] * 2
+    assert chip.timeout_ticks == FWT_TICKS
+
+
+def test_lost_answer_is_repeated_after_nak(rfid, chip):
+    tag, card = activate(rfid, chip)
+    card.faults = ['mute']
+
+    stat, resp = tag.transceive([0x01, 0x02])
+    assert stat == rfid.OK and bytes(resp) == b'\x02\x01\x90\x00'
+    # The card ran the command once and sent its answer again
+    assert len(card.apdus) == 1
+    assert card.log[-1][0] == bytes([0xB2])
+
+
+def test_lost_block_is_sent_again(rfid, chip):
+    tag, card = activate(rfid, chip)
+    card.faults = ['lost']
+
+    stat, resp = tag.transceive([0x01, 0x02])
+    assert stat == rfid.OK and bytes(resp) == b'\x02\x01\x90\x00'
+    frames = [frame for frame, _, _ in card.log[2:]]
+    assert frames == [bytes([0xB2]), bytes([0x02, 0x01, 0x02])]
+    assert len(card.apdus) == 1
+
+    # Block numbers stay in step for the next command
+    stat, resp = tag.transceive([0x03])
+    assert stat == rfid.OK and card.log[-1][0] == bytes([0x03, 0x03])
+
+
+def test_card_gone(rfid, chip):
+    tag, card = activate(rfid, chip)
+    card.faults = ['lost'] * 10
+
+    stat, resp = tag.transceive([0x01])
+    assert stat != rfid.OK and resp == []
+
+
+def test_deselect_restores_mifare_framing(rfid, chip):
+    tag, card = activate(rfid, chip)
+
+    assert tag.deselect() == rfid.OK
+    assert card.log[-1][0] == bytes([0xC2])
+    assert chip.r[0x12] == 0x00 and chip.r[0x13] == 0x00
+    assert chip.timeout_ticks == rfid.DEFAULT_TIMEOUT_US // rfid.TIMER_TICK_US
+    assert rfid.is_configured()
@@ -0,0 +1,70 @@
+from rfidpass import protocol
+from rfidpass.service import Service
+
+
+class Stream:
+    """
+    ``usb_cdc.data`` stand-in.
+    """
+
+    def __init__(self):
+        self.rx = bytearray()
+        self.tx = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def read(self, count):
+        data = bytes(self.rx[:count])
+        del self.rx[:count]
+        return data
+
+    def write(self, data):
+        self.tx += data
+
+
+def test_stray_sof_dropped_by_next_frame(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(protocol.time, "monotonic", lambda: now[0])
+    reader = protocol.FrameReader()
+
+    reader.feed(b'\xa5\x01\x00')
+    assert reader.next_frame() is None
+    now[0] += protocol.FRAME_TIMEOUT + 0.1
+    reader.feed(protocol.encode_frame(protocol.PING, 7))
+    assert reader.next_frame() == (protocol.PING, 7, b'')
+    assert reader.dropped == 3
+
+
+def test_frame_split_across_reads_kept():
+    reader = protocol.FrameReader()
+    frame = protocol.encode_frame(protocol.STATS, 1)
+
+    reader.feed(frame[:4])
+    assert reader.next_frame() is None
+    reader.feed(frame[4:])
+    assert reader.next_frame() == (protocol.STATS, 1, b'')
+
+
+def test_retried_command_gets_the_same_reply(rfid):
+    stream = Stream()
+    service = Service(rfid, [0xFF] * 6, None, stream)
+    calls = []
+    service.handlers[protocol.CLEAR_SLOT] = lambda payload: calls.append(payload) or b'\x02'
+
+    frame = protocol.encode_frame(protocol.CLEAR_SLOT, 9, b'\x01')
+    stream.rx += frame
+    assert service.poll() == protocol.OK
+    reply = bytes(stream.tx)
+    stream.tx.clear()
+
+    stream.rx += frame
+    assert service.poll() == protocol.OK
+    assert bytes(stream.tx) == reply
+    assert calls == [b'\x01']
+
+    # A new sequence number runs the command again
+    stream.rx += protocol.encode_frame(protocol.CLEAR_SLOT, 10, b'\x01')
+    service.poll()
+    assert len(calls) == 2
@@ -0,0 +1,214 @@
+import pytest
+
+from crc import crc16
+from mfrc522 import CardInfo
+from rfidpass import crypto, migrate, slotdir, slots
+from rfidpass.snapshot import CardSnapshot
+
+RAW_UID = [0xDE, 0xAD, 0xBE, 0xEF]
+
+
+class FakeReader:
+    """
+    Sector level MIFARE Classic 1K for the slot read paths.
+    """
+
+    OK = 0
+    ERR = 2
+    AUTHENT1A = 0x60
+
+    def __init__(self, sectors):
+        self.card_info = CardInfo(RAW_UID, 0x0004, 0x08)
+        self.blocks = {}
+        for sector, data in sectors.items():
+            first = CardInfo.first_block(sector)
+            for i in range(3):
+                self.blocks[first + i] = list(data[16 * i:16 * i + 16])
+        self.authed = []
+
+    def auth(self, mode, block, key, uid):
+        self.authed.append(CardInfo.sector_of(block))
+        return self.OK
+
+    def read(self, block):
+        return self.blocks.get(block, [0] * 16)
+
+    def reselect(self, uid):
+        return self.OK
+
+
+@pytest.fixture
+def keys(host_aes):
+    return crypto.SlotKeys(crypto.uid_key(RAW_UID))
+
+
+def plain_v1(password):
+    crc = crc16(password)
+    return (password + bytes(32 - len(password))
+            + bytes([crc >> 8, crc & 0xFF, len(password), 0]) + bytes(12))
+
+
+def legacy_plain_v1(password):
+    """
+    A slot as the baseline mfc-store-password-slots.py wrote it: the CRC
+    (its per-bit loop) over the blocks zero padded to 16 or 32 bytes.
+    """
+
+    blocks = password[:16].ljust(16, b'\x00')
+    if len(password) > 16:
+        blocks += password[16:32].ljust(16, b'\x00')
+    crc = 0xFFFF
+    for byte in blocks:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return (blocks.ljust(32, b'\x00')
+            + bytes([crc >> 8, crc & 0xFF, len(password) & 0xFF, len(password) >> 8]) + bytes(12))
+
+
+def false_v2(keys):
+    """
+    A plaintext v1 slot whose block 0 decrypts to a v2 header that claims
+    a chain of several sectors.
+    """
+
+    for i in range(100000):
+        password = "pw-{}".format(i).encode()
+        data = plain_v1(password)
+        header = keys.decrypt(data[:16])
+        if header[0] == slots.MAGIC_V2 and 2 <= header[1] <= slots.MAX_SECTORS:
+            return password, data
+    raise AssertionError("no colliding block 0")
+
+
+def test_plain_v1_with_v2_magic_decodes_as_v1(keys):
+    password, data = false_v2(keys)
+
+    assert slots.slot_sectors(keys, data) > 1
+    assert slots.slot_sectors(keys, data, plain_v1=True) == 1
+    assert slots.decode(keys, data, plain_v1=True) == (1, password)
+    # Without plaintext slots on the card it stays a broken v2 slot
+    assert slots.decode(keys, data) == (2, None)
+
+
+@pytest.mark.parametrize("length", [1, 16, 17, 20, 31, 32])
+def test_legacy_padded_crc_plain_v1(keys, length):
+    password = bytes(0x41 + i % 26 for i in range(length))
+    data = legacy_plain_v1(password)
+
+    assert slots.decode(keys, data, plain_v1=True) == (1, password)
+    assert slots.slot_sectors(keys, data, plain_v1=True) == 1
+    # A flipped bit still fails both CRCs
+    data = bytearray(data)
+    data[0] ^= 0x01
+    assert slots.decode(keys, data, plain_v1=True) == (1, None)
+
+
+def test_v2_still_preferred_with_plain_v1(keys):
+    data = slots.encode(keys, b"secret")
+    assert slots.decode(keys, data, plain_v1=True) == (2, b"secret")
+    chain = slots.encode(keys, b"x" * 100)
+    assert slots.slot_sectors(keys, chain[:48], plain_v1=True) == 3
+    assert slots.decode(keys, chain, plain_v1=True) == (2, b"x" * 100)
+
+
+def test_read_slot_stays_in_its_sector(keys):
+    password, data = false_v2(keys)
+    rfid = FakeReader({1: data})
+
+    assert slots.read_slot(rfid, RAW_UID, None, 1, keys, plain_v1=True) == (1, password)
+    assert rfid.authed == [1]
+
+
+def test_scan_and_migrate_see_plain_v1(keys):
+    password, data = false_v2(keys)
+    rfid = FakeReader({1: data, 2: plain_v1(b"next")})
+
+    directory = slotdir.scan(rfid, RAW_UID, None, keys)
+    assert directory.slots() == [(1, 1, slotdir.V1), (2, 1, slotdir.V1)]
+
+    snapshot = CardSnapshot.take(rfid, RAW_UID, None, keys)
+    found = migrate.plan(snapshot)
+    assert [(slot.sector, slot.span, slot.kind) for slot in found] == [
+        (1, 1, migrate.V1_PLAIN), (2, 1, migrate.V1_PLAIN)]
+    assert found[0].payload == password
+    assert slots.decode(keys, found[0].image) == (2, password)
+
+
+def test_snapshot_without_directory_only_scans_on_request(keys):
+    rfid = FakeReader({1: plain_v1(b"one")})
+
+    assert CardSnapshot.take(rfid, RAW_UID, None, keys, scan=False) is None
+    assert rfid.authed == [0]
+
+
+def test_migrate_legacy_plain_v1(keys):
+    passwords = {1: b"short", 2: b"twenty-byte-password", 3: b"x" * 31}
+    rfid = FakeReader({sector: legacy_plain_v1(pw) for sector, pw in passwords.items()})
+
+    snapshot = CardSnapshot.take(rfid, RAW_UID, None, keys)
+    found = migrate.plan(snapshot)
+    assert [(slot.sector, slot.kind) for slot in found] == [
+        (1, migrate.V1_PLAIN), (2, migrate.V1_PLAIN), (3, migrate.V1_PLAIN)]
+    for slot in found:
+        assert slots.decode(keys, slot.image) == (2, passwords[slot.sector])
+
+
+def b94(chars, first=slots.B94_FIRST):
+    return bytes(first + (i * 7) % slots.B94_BASE for i in range(chars))
+
+
+@pytest.mark.parametrize("chars, sectors", [(39, 1), (40, 2), (449, 8)])
+def test_packed_round_trip_at_sector_boundaries(keys, chars, sectors):
+    for password in (b94(chars), b"!" * chars, b"~" * chars):
+        image = slots.encode(keys, password, packed=True)
+        assert len(image) == sectors * slots.SLOT_BYTES
+        assert slots.slot_sectors(keys, image[:slots.SLOT_BYTES]) == sectors
+        assert slots.decode(keys, image) == (2, password)
+
+
+def test_packed_too_long_for_eight_sectors(keys):
+    with pytest.raises(ValueError):
+        slots.encode(keys, b94(450), packed=True)
+
+
+def packed_header_image(keys, chars, sectors=1):
+    # A correctly MACed slot whose header claims ``chars`` packed characters
+    header = bytearray(16)
+    header[0] = slots.MAGIC_V2
+    header[1] = sectors
+    length = slots.PACKED | chars
+    header[2], header[3] = length >> 8, length & 0xFF
+    header[4:12] = bytes(8)
+    body = bytes(slots.capacity(sectors))
+    header[12:16] = keys.cmac(bytes(header[:slots.HEADER_LEN]) + body)[:slots.MAC_LEN]
+    return bytes(keys.encrypt(header)) + body
+
+
+def test_packed_count_over_capacity_rejected(keys, monkeypatch):
+    assert slots.decode(keys, packed_header_image(keys, 39))[1] is not None
+    monkeypatch.setattr(slots, "unpack_b94", pytest.fail)
+
+    image = packed_header_image(keys, slots.packed_chars(slots.PAYLOAD_BYTES) + 1)
+    assert slots.decode(keys, image) == (2, None)
+
+
+def test_packed_bad_mac_rejected_before_unpacking(keys, monkeypatch):
+    image = bytearray(slots.encode(keys, b94(39), packed=True))
+    image[20] ^= 0x01
+    monkeypatch.setattr(slots, "unpack_b94", pytest.fail)
+
+    assert slots.decode(keys, image) == (2, None)
+
+
+def test_directory_labels_past_the_card_ignored():
+    directory = slotdir.SlotDirectory(40)
+    directory.add(3, 1, slotdir.V2, length=8, label="web")
+    directory.add(39, 1, slotdir.V2, length=12, label="4k")
+    index, labels = directory.to_blocks()
+
+    # The same blocks read as a 1K card
+    parsed = slotdir.SlotDirectory.parse(16, index, labels)
+    assert parsed.slots() == [(3, 1, slotdir.V2)]
+    assert parsed.labels == {3: "web"} and parsed.lengths == {3: 8}
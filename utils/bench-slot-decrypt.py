@@ -0,0 +1,94 @@
+import time
+import aesio
+from crc import crc16
+from rfidpass import config, crypto, slots
+from rfidpass.reader import open_reader
+
+# Times the slot read path of the firmwares on the device, with the code
+# they run: the slot key (KDF on a cache miss, cached on a hit), the
+# per-tap SlotKeys against the old aesio.AES per block, slots.decode() for
+# each slot format from RAM, and slots.read_slot() on a tapped card if one
+# shows up within TAP_TIMEOUT. utils/host/bench-slot-decrypt.py runs the
+# old-vs-new comparison on a PC.
+rounds = 50
+TAP_TIMEOUT = 10
+
+raw_uid = [0xDE, 0xAD, 0xBE, 0xEF]
+password = b'correct-horse-battery'
+
+def measure(name, func, count=rounds):
+    start = time.monotonic_ns()
+    for _ in range(count):
+        result = func()
+    elapsed = (time.monotonic_ns() - start) // count // 1000
+    print(f"  {name:<24} {elapsed:>8} us")
+    return result, elapsed
+
+# Slot images of every format under the UID key
+keys = crypto.SlotKeys(crypto.uid_key(raw_uid))
+crc = crc16(password)
+v1 = (password + bytes(32 - len(password))) + bytes([crc >> 8, crc & 0xFF, len(password), 0]) + bytes(12)
+v1_aes = b''.join(bytes(keys.encrypt(v1[i:i + 16])) for i in range(0, 48, 16))
+images = (
+    ("v1 AES", v1_aes),
+    ("v2", slots.encode(keys, password)),
+    ("v2 packed", slots.encode(keys, password, packed=True)),
+    ("v2 8 sectors", slots.encode(keys, bytes(slots.capacity(slots.MAX_SECTORS)))),
+)
+
+print(f"Slot keys, {rounds} rounds:")
+secret = bytes(range(16))
+measure(f"KDF {config.KDF_ROUNDS} rounds", lambda: crypto.derive_key(raw_uid, secret, config.KDF_ROUNDS), 3)
+cache = crypto.KeyCache(secret, config.KDF_ROUNDS)
+cache.key(raw_uid)
+measure("cache hit", lambda: cache.key(raw_uid))
+measure("SlotKeys per tap", lambda: crypto.SlotKeys(crypto.uid_key(raw_uid)))
+
+# The firmwares before SlotKeys expanded the key once per block
+def cipher_per_block():
+    key = crypto.uid_key(raw_uid)
+    out = bytearray(16)
+    for i in range(0, 48, 16):
+        aesio.AES(key, aesio.MODE_ECB).decrypt_into(v1_aes[i:i + 16], out)
+
+def slot_keys_per_tap():
+    keys = crypto.SlotKeys(crypto.uid_key(raw_uid))
+    for i in range(0, 48, 16):
+        keys.decrypt(v1_aes[i:i + 16])
+
+print(f"Decrypting a 48-byte slot, {rounds} rounds:")
+_, old = measure("cipher per block", cipher_per_block)
+_, new = measure("SlotKeys per tap", slot_keys_per_tap)
+print(f"  saved: {old - new} us per tap")
+
+print(f"slots.decode(), {rounds} rounds:")
+for name, image in images:
+    (version, payload), _ = measure(name, lambda: slots.decode(keys, image))
+    if payload is None:
+        print(f"  {name} did not decode!")
+
+# The same on a card, RF included
+rfid = open_reader()
+default_key = config.load_default_key()
+key_cache = crypto.load_key_cache()
+print(f"Tap a card with a slot 1 within {TAP_TIMEOUT} s to time slots.read_slot()...")
+deadline = time.monotonic() + TAP_TIMEOUT
+while time.monotonic() < deadline:
+    (status, tag_type) = rfid.request(rfid.REQIDL)
+    if status != rfid.OK:
+        time.sleep(0.05)
+        continue
+    (status, card_uid) = rfid.SelectTagSN()
+    if status != rfid.OK:
+        continue
+
+    card_keys = key_cache.slot_keys(card_uid)
+    start = time.monotonic_ns()
+    version, payload = slots.read_slot(rfid, card_uid, default_key, 1, card_keys)
+    elapsed = (time.monotonic_ns() - start) // 1000
+    rfid.stop_crypto1()
+    result = 'ok' if payload is not None else 'unreadable' if version == 0 else 'bad'
+    print(f"  read_slot v{version}, {result}: {elapsed} us")
+    break
+else:
+    print("  No card.")
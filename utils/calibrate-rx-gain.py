@@ -0,0 +1,144 @@
+import board
+import digitalio
+import time
+import json
+from mfrc522 import MFRC522
+import nvmstore
+
+# Define SPI pins for RP2040-Zero
+sck = board.GP2
+mosi = board.GP3
+miso = board.GP4
+cs = board.GP0
+rst = board.GP1
+
+# Initialize MFRC522
+rfid = MFRC522(sck, mosi, miso, rst, cs)
+
+# Initialize LEDs
+red_led = digitalio.DigitalInOut(board.GP27)
+red_led.direction = digitalio.Direction.OUTPUT
+green_led = digitalio.DigitalInOut(board.GP28)
+green_led.direction = digitalio.Direction.OUTPUT
+blue_led = digitalio.DigitalInOut(board.GP29)
+blue_led.direction = digitalio.Direction.OUTPUT
+
+# Turn off LEDs initially
+red_led.value = False
+green_led.value = False
+blue_led.value = False
+
+# Number of REQA+select+read cycles measured at every gain setting
+rounds_per_gain = 20
+
+# Block read in every cycle (sector 0 is readable on any card with the default key)
+reference_block = 1
+
+# Load default key from JSON file
+def load_default_key(file_path):
+    try:
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+            return data.get('default_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
+    except Exception as e:
+        print(f"Error loading default key: {e}. Using default key.")
+        return [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+
+# Path to the JSON file containing the default key
+default_key_file = 'default_key.json'
+default_key = load_default_key(default_key_file)
+
+def measure_gain(gain, raw_uid):
+    """Run REQA+select+read cycles at one gain, return successes and the error mix."""
+    rfid.set_antenna_gain(gain)
+    successes = 0
+    errors = {}
+
+    for _ in range(rounds_per_gain):
+        error = None
+        # Halted at the end of the previous cycle, so wake the card with WUPA
+        (status, tag_type) = rfid.request(rfid.REQALL)
+        if status == rfid.OK:
+            (status, uid) = rfid.SelectTagSN()
+            if status == rfid.OK and uid != raw_uid:
+                # The select itself went fine, error_text() would say "ok"
+                status = rfid.ERR
+                error = 'wrong card'
+        if status == rfid.OK:
+            status = rfid.auth(rfid.AUTHENT1A, reference_block, default_key, raw_uid)
+        if status == rfid.OK and rfid.read(reference_block) is None:
+            status = rfid.ERR
+
+        if status == rfid.OK:
+            successes += 1
+        else:
+            if error is None:
+                error = rfid.error_text()
+            errors[error] = errors.get(error, 0) + 1
+
+        rfid.halt()
+        rfid.stop_crypto1()
+
+    return successes, errors
+
+def pick_best_gain(results):
+    """Best success rate wins; among equals take the middle of the longest run."""
+    best = max(successes for _, _, successes, _ in results)
+    run = []
+    longest = []
+    for entry in results:
+        if entry[2] == best:
+            run.append(entry)
+            if len(run) > len(longest):
+                longest = list(run)
+        else:
+            run = []
+    return longest[len(longest) // 2]
+
+def calibrate():
+    print("Place the reference card on the reader and keep it still...")
+    rfid.init()
+
+    while True:
+        (status, tag_type) = rfid.request(rfid.REQIDL)
+        if status == rfid.OK:
+            (status, raw_uid) = rfid.SelectTagSN()
+            if status == rfid.OK:
+                break
+        time.sleep(0.2)
+
+    uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+    print("Reference card UID:", uid_hex)
+    blue_led.value = True
+    rfid.halt()
+
+    results = []
+    for gain, db in rfid.RX_GAINS:
+        successes, errors = measure_gain(gain, raw_uid)
+        results.append((gain, db, successes, errors))
+        mix = ', '.join(f"{name}: {count}" for name, count in errors.items())
+        print(f"  RxGain {db} dB: {successes}/{rounds_per_gain} ok  {mix}")
+
+    blue_led.value = False
+    gain, db, successes, errors = pick_best_gain(results)
+
+    if successes == 0:
+        print("The card could not be read at any gain. Nothing saved.")
+        rfid.set_antenna_gain(rfid.RXGAIN_33DB)
+        red_led.value = True
+        return
+
+    rfid.rx_gain = gain
+    rfid.set_antenna_gain(gain)
+    if nvmstore.save_rx_gain(gain):
+        print(f"Saved RxGain {db} dB ({successes}/{rounds_per_gain} ok), applied on every boot.")
+        green_led.value = True
+    else:
+        print("No NVM available, the setting could not be saved.")
+        red_led.value = True
+
+calibrate()
+time.sleep(1)
+red_led.value = False
+green_led.value = False
+blue_led.value = False
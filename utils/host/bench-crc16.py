@@ -0,0 +1,55 @@
+"""
+Host benchmark of ``lib/crc.py`` against the per-bit CRC-16 loop the
+firmwares used to carry, the golden values are checked in tests/test_crc.py.
+Runs with CPython on a PC.
+
+    python bench-crc16.py [rounds]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+
+from crc import crc16  # noqa: E402
+
+
+# CRC-16 checksum calculation, as copied into the scripts before lib/crc.py
+def calculate_crc(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+def measure(name, func, rounds, data):
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        func(data)
+    elapsed = (time.perf_counter_ns() - start) / rounds / 1000
+    print("  {:<18} {:8.2f} us per slot".format(name, elapsed))
+    return elapsed
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    # A full v1 slot: 32 password bytes
+    slot = bytearray(range(48))
+    payload = memoryview(slot)[:32]
+
+    print("CRC over a 32-byte password, {} rounds:".format(rounds))
+    old = measure("per-bit loop", calculate_crc, rounds, bytes(payload))
+    new = measure("table", crc16, rounds, payload)
+    print("  saved: {:.2f} us per slot ({:.0f}%)".format(old - new, 100 * (old - new) / old))
+
+
+if __name__ == "__main__":
+    main()
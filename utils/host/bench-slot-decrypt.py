@@ -0,0 +1,142 @@
+"""
+Host benchmark of the slot decryption in the AES firmwares: a new AES
+cipher per 16-byte block (the old code) against the ciphers of one
+``SlotKeys`` per tap. The new side runs ``lib/rfidpass`` itself with the
+block cipher swapped for the ``cryptography`` package, as in
+``encode-slot-images.py``; ``utils/bench-slot-decrypt.py`` runs the same
+comparison with aesio on the device.
+
+    python bench-slot-decrypt.py [rounds]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    sys.exit("This benchmark needs the 'cryptography' package (pip install cryptography).")
+
+from crc import crc16  # noqa: E402
+from rfidpass import crypto, slots  # noqa: E402
+
+
+class HostAES:
+    """
+    ``aesio.AES`` stand-in for ``rfidpass.crypto.new_cipher()``.
+    """
+
+    def __init__(self, key):
+        cipher = Cipher(algorithms.AES(bytes(key)), modes.ECB())
+        self.encryptor = cipher.encryptor()
+        self.decryptor = cipher.decryptor()
+
+    def encrypt_into(self, src, dst):
+        dst[:] = self.encryptor.update(bytes(src))
+
+    def decrypt_into(self, src, dst):
+        dst[:] = self.decryptor.update(bytes(src))
+
+
+# The old firmware path, one key expansion per block and the per-bit CRC
+def generate_encryption_key(raw_uid):
+    # Pad the UID with zeros to make it 16 bytes
+    return b'\x00' * (16 - len(raw_uid)) + bytes(raw_uid)
+
+
+def decrypt_block(block, key):
+    cipher = HostAES(key)
+    decrypted_block = bytearray(16)
+    cipher.decrypt_into(block, decrypted_block)
+    return decrypted_block
+
+
+def calculate_crc(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+def old_decrypt(raw_uid, slot_data):
+    key = generate_encryption_key(raw_uid)
+    return [decrypt_block(slot_data[i:i + 16], key) for i in range(0, 48, 16)]
+
+
+def old_read(raw_uid, slot_data):
+    block1, block2, block3 = old_decrypt(raw_uid, slot_data)
+    stored_crc = (block3[0] << 8) | block3[1]
+    password_len = block3[2] | (block3[3] << 8)
+    password = (block1 + block2)[:password_len]
+    return bytes(password) if calculate_crc(password) == stored_crc else None
+
+
+def one_cipher_decrypt(raw_uid, slot_data):
+    cipher = crypto.new_cipher(crypto.uid_key(raw_uid))
+    src = memoryview(slot_data)
+    out = bytearray(48)
+    dst = memoryview(out)
+    for i in range(0, 48, 16):
+        cipher.decrypt_into(src[i:i + 16], dst[i:i + 16])
+    return out
+
+
+def new_decrypt(raw_uid, slot_data):
+    keys = crypto.SlotKeys(crypto.uid_key(raw_uid))
+    return [keys.decrypt(slot_data[i:i + 16]) for i in range(0, 48, 16)]
+
+
+def new_read(raw_uid, slot_data):
+    return slots.decode(crypto.SlotKeys(crypto.uid_key(raw_uid)), slot_data)[1]
+
+
+def measure(name, func, rounds, *args):
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        func(*args)
+    elapsed = (time.perf_counter_ns() - start) / rounds / 1000
+    print("  {:<18} {:8.2f} us per slot".format(name, elapsed))
+    return elapsed
+
+
+def compare(title, old, new, rounds, *args):
+    print("{}, {} rounds:".format(title, rounds))
+    old_us = measure("cipher per block", old, rounds, *args)
+    for name, func in new:
+        new_us = measure(name, func, rounds, *args)
+        print("  saved: {:.2f} us per tap ({:.0f}%)".format(old_us - new_us, 100 * (old_us - new_us) / old_us))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    crypto.new_cipher = HostAES
+
+    # A v1 AES slot as the AES store utility writes it
+    raw_uid = [0xDE, 0xAD, 0xBE, 0xEF]
+    password = b'correct-horse-battery'
+    crc = crc16(password)
+    plain = password.ljust(32, b'\x00') + bytes([crc >> 8, crc & 0xFF, len(password), 0]) + bytes(12)
+    keys = crypto.SlotKeys(crypto.uid_key(raw_uid))
+    slot_data = b''.join(bytes(keys.encrypt(plain[i:i + 16])) for i in range(0, 48, 16))
+
+    if old_read(raw_uid, slot_data) != password or new_read(raw_uid, slot_data) != password:
+        sys.exit("Mismatch between the two decryptions!")
+
+    # SlotKeys also sets up the CMAC key of the v2 format
+    compare("Decrypting a 48-byte slot", old_decrypt,
+            [("one cipher per tap", one_cipher_decrypt), ("SlotKeys per tap", new_decrypt)],
+            rounds, raw_uid, slot_data)
+    compare("v1 AES slot to password", old_read, [("SlotKeys per tap", new_read)], rounds, raw_uid, slot_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Host side batch encoder of v2 password slots for offline provisioning.
+Runs with CPython on a PC and needs the ``cryptography`` package.
+
+    python encode-slot-images.py manifest.csv jobs.jsonl [--secret HEX --rounds N]
+                                 [--passwords generated.csv] [--jobs N] [--pack] [--check]
+
+The manifest is a CSV file with a ``uid,slot,password[,label]`` row per
+slot. ``password`` is the password itself, or ``generate`` / ``generate:N``
+for a random one of N characters (39 by default). Generated passwords are
+written to ``--passwords`` and, like on the device, packed base-94 when
+that saves sectors, so the default length fits one sector. With ``--pack``
+every password made of '!' to '~' only is stored packed, 39 characters per
+single sector.
+
+Each output line is a JSON object with the UID, the first sector, the
+encrypted slot image (48 bytes per sector, hex) and the length and label
+for the slot directory, so the device only has to write raw sectors. The
+images are built by ``lib/rfidpass/slots.py`` itself, with the block
+cipher swapped for ``cryptography``. ``--secret``/``--rounds`` must match
+``utils/provision-device-secret.py`` on the readers; without them the
+slot keys are the UIDs, as on a device that was never provisioned.
+"""
+
+import argparse
+import binascii
+import csv
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    sys.exit("This tool needs the 'cryptography' package (pip install cryptography).")
+
+from rfidpass import crypto, slots  # noqa: E402
+
+# Same alphabet as utils/mfc/mfc-store-password-slots-aes.py
+PRINTABLE = ('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+             '0123456789' '~!@#$%^&*()-_+={}[]|\\;:<>,./?')
+GENERATE = "generate"
+# Generated passwords that fit in one sector when packed
+DEFAULT_LENGTH = slots.packed_chars(slots.PAYLOAD_BYTES)
+# Slot N starts at sector N, a MIFARE Classic 4K has 40 sectors
+MAX_SLOT = 39
+
+
+class HostAES:
+    """
+    ``aesio.AES`` stand-in for ``rfidpass.crypto.new_cipher()``.
+    """
+
+    def __init__(self, key):
+        cipher = Cipher(algorithms.AES(bytes(key)), modes.ECB())
+        self.encryptor = cipher.encryptor()
+        self.decryptor = cipher.decryptor()
+
+    def encrypt_into(self, src, dst):
+        dst[:] = self.encryptor.update(bytes(src))
+
+    def decrypt_into(self, src, dst):
+        dst[:] = self.decryptor.update(bytes(src))
+
+
+class ManifestError(Exception):
+    pass
+
+
+def parse_manifest(path, pack=False):
+    """
+    ``(line, uid, slot, password, length, label)`` per manifest row.
+    ``password`` is ``None`` for a generated one of ``length`` characters.
+    """
+
+    rows = []
+    # Sectors taken per UID, a chained slot must not run into the next one
+    used = {}
+    with open(path, newline="") as f:
+        for line, row in enumerate(csv.reader(f), 1):
+            if not row or row[0].startswith("#") or row[0].strip().lower() == "uid":
+                continue
+            if len(row) < 3:
+                raise ManifestError("line {}: expected uid,slot,password[,label]".format(line))
+
+            try:
+                uid = binascii.unhexlify(row[0].strip().replace(":", ""))
+            except (binascii.Error, ValueError):
+                uid = b""
+            if len(uid) not in (4, 7, 10):
+                raise ManifestError("line {}: UID must be 4, 7 or 10 bytes of hex".format(line))
+
+            try:
+                slot = int(row[1])
+            except ValueError:
+                slot = 0
+            if not 1 <= slot <= MAX_SLOT:
+                raise ManifestError("line {}: slot must be 1-{}".format(line, MAX_SLOT))
+
+            password = row[2]
+            length = 0
+            if password == GENERATE or password.startswith(GENERATE + ":"):
+                try:
+                    length = int(password[len(GENERATE) + 1:] or DEFAULT_LENGTH)
+                except ValueError:
+                    length = 0
+                password = None
+                if length < 1:
+                    raise ManifestError("line {}: bad length for a generated password".format(line))
+            else:
+                length = len(password.encode("utf-8"))
+
+            size = length
+            if pack and (password is None or slots.can_pack(password.encode("utf-8"))):
+                size = slots.packed_size(length)
+            elif password is None and slots.sectors_needed(slots.packed_size(length)) < slots.sectors_needed(length):
+                size = slots.packed_size(length)
+            if size > slots.capacity(slots.MAX_SECTORS):
+                raise ManifestError("line {}: password longer than {} bytes".format(
+                    line, slots.capacity(slots.MAX_SECTORS)))
+
+            sectors = range(slot, slot + slots.sectors_needed(size))
+            if sectors[-1] > MAX_SLOT:
+                raise ManifestError("line {}: the slot runs past sector {}".format(line, MAX_SLOT))
+            taken = used.setdefault(uid, set())
+            if taken.intersection(sectors):
+                raise ManifestError("line {}: slot {} overlaps another slot of the card".format(line, slot))
+            taken.update(sectors)
+
+            label = row[3].strip() if len(row) > 3 else ""
+            rows.append((line, uid, slot, password, length, label))
+
+    return rows
+
+
+_key_cache = None
+_pack = False
+
+
+def init_worker(secret, rounds, pack=False):
+    global _key_cache, _pack
+    crypto.new_cipher = HostAES
+    _key_cache = crypto.KeyCache(secret, rounds, size=1)
+    _pack = pack
+
+
+def encode_row(row, check=False):
+    """
+    One output record, and the password if it was generated.
+    """
+
+    line, uid, slot, password, length, label = row
+    generated = password is None
+    if generated:
+        password = "".join(secrets.choice(PRINTABLE) for _ in range(length))
+
+    keys = _key_cache.slot_keys(uid)
+    payload = password.encode("utf-8")
+    packed = (_pack and slots.can_pack(payload)) or (generated and slots.should_pack(payload))
+    image = slots.encode(keys, payload, packed=packed)
+
+    if check and slots.decode(keys, image) != (2, payload):
+        raise RuntimeError("line {}: image does not decode".format(line))
+
+    record = {
+        "uid": binascii.hexlify(uid).decode().upper(),
+        "sector": slot,
+        "image": binascii.hexlify(image).decode(),
+        "length": len(payload),
+        "label": label,
+    }
+    return record, password if generated else None
+
+
+def _encode_chunk(rows, check):
+    return [encode_row(row, check) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("manifest", help="CSV file, uid,slot,password[,label] per row")
+    parser.add_argument("output", help="JSON lines file of slot images")
+    parser.add_argument("--secret", help="device secret, 32 hex digits")
+    parser.add_argument("--rounds", type=int, help="KDF rounds of the device secret")
+    parser.add_argument("--passwords", help="CSV file for the generated passwords")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--pack", action="store_true", help="pack passwords of '!' to '~' base-94")
+    parser.add_argument("--check", action="store_true", help="decode every image after encoding")
+    args = parser.parse_args()
+
+    secret = None
+    rounds = 1
+    if args.secret is not None:
+        try:
+            secret = binascii.unhexlify(args.secret)
+        except (binascii.Error, ValueError):
+            secret = b""
+        if len(secret) != 16 or args.rounds is None or not 0 < args.rounds <= 0xFFFF:
+            parser.error("--secret needs 16 bytes of hex and --rounds 1-65535")
+        rounds = args.rounds
+
+    try:
+        rows = parse_manifest(args.manifest, args.pack)
+    except ManifestError as e:
+        sys.exit("{}: {}".format(args.manifest, e))
+
+    if args.passwords is None and any(row[3] is None for row in rows):
+        parser.error("the manifest generates passwords, --passwords is needed to keep them")
+
+    start = time.perf_counter()
+
+    # Chunks of rows per task keep the process pool overhead small
+    jobs = max(1, args.jobs or 1)
+    chunk = max(1, min(256, len(rows) // (jobs * 4) or 1))
+    chunks = [rows[i:i + chunk] for i in range(0, len(rows), chunk)]
+    with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(secret, rounds, args.pack)) as pool:
+        results = [result for part in pool.map(_encode_chunk, chunks, [args.check] * len(chunks))
+                   for result in part]
+
+    with open(args.output, "w") as f:
+        for record, _ in results:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    if args.passwords is not None:
+        with open(args.passwords, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["uid", "slot", "password"])
+            for record, password in results:
+                if password is not None:
+                    writer.writerow([record["uid"], record["sector"], password])
+
+    elapsed = time.perf_counter() - start
+    print("{} slot images for {} cards in {:.2f} s ({:.0f} slots/s, {} workers)".format(
+        len(results), len({record["uid"] for record, _ in results}), elapsed,
+        len(results) / elapsed if elapsed else 0, jobs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Host client of the binary command channel served by
+``utils/usb-cdc-service.py`` on the second USB serial port of the device.
+Runs with CPython on a PC and needs the ``pyserial`` package.
+
+    python rfidpass_client.py PORT ping
+    python rfidpass_client.py PORT list
+    python rfidpass_client.py PORT dump
+    python rfidpass_client.py PORT stats
+    python rfidpass_client.py PORT clear SLOT
+    python rfidpass_client.py PORT write jobs.jsonl
+
+``write`` takes the output of ``encode-slot-images.py`` and writes the
+slots of the card in the field. As a library::
+
+    from rfidpass_client import Client
+
+    with Client("/dev/ttyACM1") as device:
+        card = device.list_slots()
+"""
+
+import argparse
+import binascii
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lib"))
+
+from rfidpass import protocol  # noqa: E402
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+
+class DeviceError(Exception):
+    """
+    The device answered a command with an error status.
+    """
+
+    def __init__(self, status, payload=b""):
+        super().__init__(protocol.STATUS_NAMES.get(status, "status {}".format(status)))
+        self.status = status
+        self.payload = payload
+
+
+class Client:
+    """
+    One connection to the device.
+
+    :param port: The data port (not the REPL console), e.g. ``/dev/ttyACM1``
+        or ``COM5``, or an open stream with ``read()`` and ``write()``.
+    :param timeout: Seconds to wait for a reply.
+    :param retries: Times a command is sent again after a timeout.
+    """
+
+    def __init__(self, port, timeout=2.0, retries=2):
+        if isinstance(port, str):
+            if serial is None:
+                raise RuntimeError("The client needs the 'pyserial' package (pip install pyserial).")
+            port = serial.Serial(port, 115200, timeout=0.05)
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.reader = protocol.FrameReader()
+        # Not where the last session stopped, the device replays the reply
+        # to a repeated sequence number
+        self.seq = random.randrange(256)
+
+    def close(self):
+        self.port.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, command, payload=b""):
+        """
+        Send a command and wait for its reply.
+
+        :return: The reply payload after the status byte.
+        :raises DeviceError: The device answered with an error status.
+        :raises TimeoutError: No reply after all retries.
+        """
+
+        self.seq = (self.seq + 1) & 0xFF
+        frame = protocol.encode_frame(command, self.seq, payload)
+        for _ in range(self.retries + 1):
+            self.port.write(frame)
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                data = self.port.read(4096)
+                if data:
+                    self.reader.feed(data)
+                reply = self.reader.next_frame()
+                while reply is not None:
+                    reply_command, seq, body = reply
+                    # Replies to earlier, timed out requests are skipped
+                    if reply_command == command | protocol.RESPONSE and seq == self.seq:
+                        if not body:
+                            raise DeviceError(protocol.BAD_REQUEST)
+                        if body[0] != protocol.OK:
+                            raise DeviceError(body[0], bytes(body[1:]))
+                        return bytes(body[1:])
+                    reply = self.reader.next_frame()
+        raise TimeoutError("no reply to command 0x{:02X}".format(command))
+
+    def ping(self):
+        """
+        Protocol version of the device.
+        """
+
+        return self.request(protocol.PING)[0]
+
+    def list_slots(self):
+        """
+        ``{"uid", "sectors", "directory", "writable", "slots"}`` of the card
+        in the field, ``slots`` a list of ``{"sector", "span", "version",
+        "length", "label"}``; ``length`` is ``None`` when unknown.
+        """
+
+        reply = self.request(protocol.LIST_SLOTS)
+        uid, at = protocol.unpack_uid(reply)
+        sectors, flags, count = reply[at], reply[at + 1], reply[at + 2]
+        at += 3
+
+        found = []
+        for _ in range(count):
+            length = (reply[at + 3] << 8) | reply[at + 4]
+            found.append({
+                "sector": reply[at],
+                "span": reply[at + 1],
+                "version": reply[at + 2],
+                "length": None if length == protocol.NO_LENGTH else length,
+                "label": reply[at + 5:at + 5 + protocol.LABEL_LEN].rstrip(b"\x00").decode(),
+            })
+            at += 5 + protocol.LABEL_LEN
+
+        return {
+            "uid": uid,
+            "sectors": sectors,
+            "directory": bool(flags & protocol.DIRECTORY),
+            "writable": bool(flags & protocol.WRITABLE),
+            "slots": found,
+        }
+
+    def write_slot(self, uid, sector, image, length=None, label=""):
+        """
+        Write an encoded slot image to the card with ``uid``, verified on
+        the device.
+
+        :return: ``True`` if the slot directory was updated as well.
+        """
+
+        if length is None:
+            length = protocol.NO_LENGTH
+        text = label.encode()[:protocol.LABEL_LEN]
+        payload = (protocol.pack_uid(uid) + bytes([sector, length >> 8, length & 0xFF])
+                   + text + b"\x00" * (protocol.LABEL_LEN - len(text)) + bytes(image))
+        return bool(self.request(protocol.WRITE_SLOT, payload)[0])
+
+    def clear_slot(self, uid, sector):
+        """
+        Clear the slot at ``sector`` of the card with ``uid``, returns the
+        number of sectors cleared.
+        """
+
+        return self.request(protocol.CLEAR_SLOT, protocol.pack_uid(uid) + bytes([sector]))[0]
+
+    def dump_card(self):
+        """
+        ``(uid, [data or None per sector])`` of the card in the field.
+        """
+
+        reply = self.request(protocol.DUMP_CARD)
+        uid, at = protocol.unpack_uid(reply)
+        sectors = reply[at]
+        at += 1
+
+        data = []
+        for sector in range(sectors):
+            readable = reply[at]
+            at += 1
+            if readable:
+                size = protocol.data_blocks(sector) * 16
+                data.append(reply[at:at + size])
+                at += size
+            else:
+                data.append(None)
+        return uid, data
+
+    def stats(self):
+        return json.loads(self.request(protocol.STATS).decode())
+
+
+def _write_jobs(device, path):
+    card = device.list_slots()
+    uid_hex = card["uid"].hex().upper()
+
+    with open(path) as f:
+        jobs = [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+    jobs = [job for job in jobs if job["uid"].upper() == uid_hex]
+    if not jobs:
+        print("No jobs for card {}.".format(uid_hex))
+        return 1
+
+    start = time.perf_counter()
+    for job in jobs:
+        image = binascii.unhexlify(job["image"])
+        directory = device.write_slot(card["uid"], job["sector"], image, job.get("length"), job.get("label", ""))
+        print("Slot {} written{}.".format(job["sector"], "" if directory else ", no slot directory"))
+    print("{} slots in {:.2f} s.".format(len(jobs), time.perf_counter() - start))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("port", help="serial data port of the device")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ping")
+    sub.add_parser("list")
+    sub.add_parser("dump")
+    sub.add_parser("stats")
+    p = sub.add_parser("clear")
+    p.add_argument("slot", type=int)
+    p = sub.add_parser("write")
+    p.add_argument("jobs", help="JSON lines from encode-slot-images.py")
+    args = parser.parse_args()
+
+    with Client(args.port) as device:
+        try:
+            if args.command == "ping":
+                print("Protocol version", device.ping())
+            elif args.command == "list":
+                card = device.list_slots()
+                print("Card {}, {} sectors, {}directory{}".format(
+                    card["uid"].hex().upper(), card["sectors"], "" if card["directory"] else "no ",
+                    "" if card["writable"] else " (read-only)"))
+                for slot in card["slots"]:
+                    print("  Slot {sector}: {span} sectors, v{version}, length {length}, '{label}'".format(**slot))
+            elif args.command == "dump":
+                uid, data = device.dump_card()
+                print("Card", uid.hex().upper())
+                for sector, blocks in enumerate(data):
+                    if blocks is None:
+                        print("Sector {:2}: unreadable".format(sector))
+                        continue
+                    for i in range(0, len(blocks), 16):
+                        print("Sector {:2} block {:2}: {}".format(sector, i // 16, blocks[i:i + 16].hex()))
+            elif args.command == "stats":
+                print(json.dumps(device.stats(), indent=2))
+            elif args.command == "clear":
+                uid = device.list_slots()["uid"]
+                print("{} sectors cleared.".format(device.clear_slot(uid, args.slot)))
+            elif args.command == "write":
+                return _write_jobs(device, args.jobs)
+        except DeviceError as e:
+            print("Device error:", e)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
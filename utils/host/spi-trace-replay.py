@@ -0,0 +1,321 @@
+"""
+Host side tool for SPI traces captured with ``lib/spitrace.py``
+(e.g. by ``utils/spi-trace-capture.py``). Runs with CPython on a PC.
+
+    python spi-trace-replay.py show tap.txt
+    python spi-trace-replay.py compare before.txt after.txt
+    python spi-trace-replay.py replay tap.txt --run "rfid.request(rfid.REQIDL); rfid.SelectTagSN()"
+
+``replay`` loads the driver from ``lib/`` against a mock bus that answers
+every register read with the value the real chip gave for that register,
+in order, so the driver's register traffic for the same tap can be
+compared with the trace after a driver change.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import types
+from collections import Counter, defaultdict, deque
+
+MAGIC = b"SPT1"
+RECORD = 6
+BEGIN = "-----BEGIN SPI TRACE-----"
+END = "-----END SPI TRACE-----"
+
+REGISTER_NAMES = {
+    0x01: "Command", 0x02: "ComIEn", 0x03: "DivIEn", 0x04: "ComIrq",
+    0x05: "DivIrq", 0x06: "Error", 0x07: "Status1", 0x08: "Status2",
+    0x09: "FIFOData", 0x0A: "FIFOLevel", 0x0B: "WaterLevel", 0x0C: "Control",
+    0x0D: "BitFraming", 0x0E: "Coll", 0x11: "Mode", 0x12: "TxMode",
+    0x13: "RxMode", 0x14: "TxControl", 0x15: "TxASK", 0x21: "CRCResultH",
+    0x22: "CRCResultL", 0x24: "ModWidth", 0x26: "RFCfg", 0x2A: "TMode",
+    0x2B: "TPrescaler", 0x2C: "TReloadH", 0x2D: "TReloadL", 0x37: "Version",
+}
+
+COMMAND_NAMES = {
+    0x00: "Idle", 0x03: "CalcCRC", 0x0C: "Transceive", 0x0E: "MFAuthent",
+    0x0F: "SoftReset",
+}
+
+
+def register_name(reg):
+    return REGISTER_NAMES.get(reg, "0x{:02X}".format(reg))
+
+
+def load_trace(path):
+    """
+    Read a binary dump or a console log with the hex dump between the
+    BEGIN/END markers. Returns a list of ``(read, reg, val, tick_us)``.
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        lines = data.decode("ascii", "replace").splitlines()
+        hexdata = []
+        inside = BEGIN not in "\n".join(lines)
+        for line in lines:
+            line = line.strip()
+            if line == BEGIN:
+                inside = True
+            elif line == END:
+                break
+            elif inside and line:
+                hexdata.append(line)
+        data = bytes.fromhex("".join(hexdata))
+
+    if not data.startswith(MAGIC):
+        raise ValueError("{}: not an SPI trace".format(path))
+
+    (count,) = struct.unpack_from("<H", data, len(MAGIC))
+    records = []
+    for i in range(count):
+        (addr, val, tick) = struct.unpack_from("<BBI", data, len(MAGIC) + 2 + i * RECORD)
+        records.append((bool(addr & 0x80), addr & 0x3F, val, tick))
+    return records
+
+
+def summarize(records):
+    """
+    Access counts per register and direction, chip commands and duration.
+    """
+
+    accesses = Counter((read, reg) for read, reg, _, _ in records)
+    commands = Counter(val & 0x0F for read, reg, val, _ in records if not read and reg == 0x01)
+    duration = 0
+    gaps = []
+    for prev, cur in zip(records, records[1:]):
+        gap = (cur[3] - prev[3]) & 0xFFFFFFFF
+        duration += gap
+        gaps.append((gap, cur))
+    gaps.sort(key=lambda g: g[0], reverse=True)
+    return accesses, commands, duration, gaps
+
+
+def show(records):
+    accesses, commands, duration, gaps = summarize(records)
+    reads = sum(n for (read, _), n in accesses.items() if read)
+
+    print("{} register accesses ({} reads, {} writes) in {} us".format(
+        len(records), reads, len(records) - reads, duration))
+
+    print("Commands:")
+    for cmd, n in sorted(commands.items()):
+        print("  {:<12} {}".format(COMMAND_NAMES.get(cmd, "0x{:X}".format(cmd)), n))
+
+    print("Accesses:")
+    for (read, reg), n in sorted(accesses.items(), key=lambda a: (a[0][1], a[0][0])):
+        print("  {:<12} {:<5} {}".format(register_name(reg), "read" if read else "write", n))
+
+    print("Longest gaps:")
+    for gap, (read, reg, val, _) in gaps[:5]:
+        print("  {:>8} us before {} {} 0x{:02X}".format(
+            gap, "read" if read else "write", register_name(reg), val))
+
+
+def compare(before, after):
+    a_acc, a_cmd, a_dur, _ = summarize(before)
+    b_acc, b_cmd, b_dur, _ = summarize(after)
+
+    print("{:<18} {:>8} {:>8} {:>8}".format("", "before", "after", "diff"))
+    print("{:<18} {:>8} {:>8} {:>+8}".format("accesses", len(before), len(after), len(after) - len(before)))
+    print("{:<18} {:>8} {:>8} {:>+8}".format("duration us", a_dur, b_dur, b_dur - a_dur))
+
+    for cmd in sorted(set(a_cmd) | set(b_cmd)):
+        name = COMMAND_NAMES.get(cmd, "0x{:X}".format(cmd))
+        print("{:<18} {:>8} {:>8} {:>+8}".format(name, a_cmd[cmd], b_cmd[cmd], b_cmd[cmd] - a_cmd[cmd]))
+
+    for key in sorted(set(a_acc) | set(b_acc), key=lambda k: (k[1], k[0])):
+        if a_acc[key] != b_acc[key]:
+            name = "{} {}".format(register_name(key[1]), "rd" if key[0] else "wr")
+            print("{:<18} {:>8} {:>8} {:>+8}".format(name, a_acc[key], b_acc[key], b_acc[key] - a_acc[key]))
+
+
+class ReplayChip:
+    """
+    Stands in for the MFRC522 behind the mock bus: reads of a register
+    return what the trace recorded for it, in order, the last value once
+    the trace runs out. Every access is recorded like on the device.
+    """
+
+    def __init__(self):
+        self.load([])
+
+    def load(self, records):
+        self.reads = defaultdict(deque)
+        for read, reg, val, _ in records:
+            if read:
+                self.reads[reg].append(val)
+        self.last = {}
+        self.misses = Counter()
+        self.log = []
+        self.begin()
+
+    def begin(self):
+        self.first = True
+        self.waddr = None
+        self.raddr = None
+
+    def read(self, reg):
+        queue = self.reads[reg]
+        if queue:
+            self.last[reg] = queue.popleft()
+        else:
+            self.misses[reg] += 1
+        val = self.last.get(reg, 0)
+        self.log.append((True, reg, val, 0))
+        return val
+
+    def xfer(self, byte):
+        out = 0
+        if self.raddr is not None:
+            out = self.read(self.raddr)
+            self.raddr = None
+
+        if self.waddr is not None:
+            self.log.append((False, self.waddr, byte, 0))
+        elif byte & 0x80:
+            self.raddr = (byte >> 1) & 0x3F
+        elif self.first:
+            self.waddr = (byte >> 1) & 0x3F
+        self.first = False
+        return out
+
+
+def install_mock(chip):
+    """
+    Minimal ``busio``/``digitalio``/``microcontroller``/``adafruit_bus_device``
+    modules so the CircuitPython driver imports on the host.
+    """
+
+    class SPI:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def try_lock(self):
+            return True
+
+        def unlock(self):
+            pass
+
+        def configure(self, **kwargs):
+            pass
+
+        def write(self, buf, start=0, end=None):
+            for b in bytes(buf)[start:end]:
+                chip.xfer(b)
+
+        def readinto(self, buf, start=0, end=None, write_value=0):
+            end = len(buf) if end is None else end
+            for i in range(start, end):
+                buf[i] = chip.xfer(write_value)
+
+        def write_readinto(self, out, into, **kwargs):
+            for i, b in enumerate(bytes(out)):
+                into[i] = chip.xfer(b)
+
+    class DigitalInOut:
+        def __init__(self, pin):
+            self._value = True
+
+        def switch_to_output(self, value=False, **kwargs):
+            self.value = value
+
+        @property
+        def value(self):
+            return self._value
+
+        @value.setter
+        def value(self, value):
+            if self._value and not value:
+                chip.begin()
+            self._value = value
+
+    class SPIDevice:
+        # Like the native SPIDevice, the settings are not readable back
+        def __init__(self, spi, chip_select, baudrate=100000, polarity=0, phase=0):
+            self.spi = spi
+            self.chip_select = chip_select
+            chip_select.switch_to_output(value=True)
+
+        def __enter__(self):
+            self.chip_select.value = False
+            return self.spi
+
+        def __exit__(self, *exc):
+            self.chip_select.value = True
+            return False
+
+    busio = types.ModuleType("busio")
+    busio.SPI = SPI
+    digitalio = types.ModuleType("digitalio")
+    digitalio.DigitalInOut = DigitalInOut
+    microcontroller = types.ModuleType("microcontroller")
+    microcontroller.Pin = object
+    bus_device = types.ModuleType("adafruit_bus_device")
+    spi_device = types.ModuleType("adafruit_bus_device.spi_device")
+    spi_device.SPIDevice = SPIDevice
+    bus_device.spi_device = spi_device
+
+    sys.modules.update({
+        "busio": busio,
+        "digitalio": digitalio,
+        "microcontroller": microcontroller,
+        "adafruit_bus_device": bus_device,
+        "adafruit_bus_device.spi_device": spi_device,
+    })
+
+
+def replay(records, run, lib):
+    chip = ReplayChip()
+    install_mock(chip)
+    sys.path.insert(0, lib)
+    from mfrc522 import MFRC522
+
+    # The trace starts at the tap, not with the driver's constructor, so
+    # the chip only gets the recorded answers once the reader is set up
+    rfid = MFRC522(None, None, None, None, None)
+    chip.load(records)
+
+    exec(run, {"rfid": rfid})
+
+    compare(records, chip.log)
+    if chip.misses:
+        print("Reads past the end of the trace (the driver polled more than the chip answered):")
+        for reg, n in sorted(chip.misses.items()):
+            print("  {:<12} {}".format(register_name(reg), n))
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("show", help="summarize a trace")
+    p.add_argument("trace")
+
+    p = sub.add_parser("compare", help="compare two traces")
+    p.add_argument("before")
+    p.add_argument("after")
+
+    p = sub.add_parser("replay", help="run the driver against a trace")
+    p.add_argument("trace")
+    p.add_argument("--run", default="rfid.request(rfid.REQIDL); rfid.SelectTagSN()",
+                   help="driver calls to replay, with the reader as 'rfid'")
+    p.add_argument("--lib", default=os.path.join(here, "..", "..", "lib"),
+                   help="directory holding mfrc522.py")
+
+    args = parser.parse_args()
+    if args.cmd == "show":
+        show(load_trace(args.trace))
+    elif args.cmd == "compare":
+        compare(load_trace(args.before), load_trace(args.after))
+    else:
+        replay(load_trace(args.trace), args.run, args.lib)
+
+
+if __name__ == "__main__":
+    main()
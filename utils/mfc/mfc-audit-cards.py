@@ -0,0 +1,111 @@
+import time
+from rfidpass import config, crypto, ui
+from rfidpass.reader import open_reader, wait_for_removal
+from rfidpass.snapshot import CardSnapshot
+
+# Checks every slot of every tapped card and logs one line per card,
+# without typing or printing any password:
+#
+#   uid,ok,bad,unreadable,read_ms,check_ms
+#
+# ok/bad/unreadable are bitmaps in hex, bit N for slot N: slots that pass
+# their MAC (v2) or CRC (v1), that fail it, and that could not be read.
+# The log goes to LOG_FILE when the CIRCUITPY drive is writable from code
+# (storage.remount() in boot.py), to the console otherwise.
+LOG_FILE = 'audit.csv'
+LOG_HEADER = 'uid,ok,bad,unreadable,read_ms,check_ms'
+
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
+
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
+
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
+
+# Open the log, appending to an existing one
+try:
+    log = open(LOG_FILE, 'a')
+    if log.tell() == 0:
+        log.write(LOG_HEADER + '\n')
+    print(f"Logging to {LOG_FILE}.")
+except OSError:
+    log = None
+    print("The drive is read-only, logging to the console.")
+    print(LOG_HEADER)
+
+# Status bitmaps of all slots in the snapshot
+def audit_slots(snapshot):
+    ok = bad = unreadable = 0
+    for sector, _ in snapshot.slots(plain_v1=True):
+        version, payload = snapshot.decode(sector)
+        if version != 0 and payload is None:
+            # Slots of mfc-store-password-slots.py are not encrypted
+            version, payload = snapshot.decode(sector, plain_v1=True)
+        if version == 0:
+            unreadable |= 1 << sector
+        elif payload is None:
+            bad |= 1 << sector
+        else:
+            ok |= 1 << sector
+    return ok, bad, unreadable
+
+# Main loop
+cards = 0
+failed_cards = 0
+started = None
+print("Waiting for RFID/NFC card...")
+while True:
+    (status, tag_type) = rfid.request(rfid.REQIDL)
+    if status != rfid.OK:
+        time.sleep(0.05)
+        continue
+
+    (status, raw_uid) = rfid.SelectTagSN()
+    if status != rfid.OK:
+        continue
+
+    leds.off()
+    blue_led.value = True
+    if started is None:
+        started = time.monotonic()
+    uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+
+    # Read every slot in one session, then check them from RAM
+    start = time.monotonic_ns()
+    keys = key_cache.slot_keys(raw_uid)
+    snapshot = CardSnapshot.take(rfid, raw_uid, default_key, keys)
+    rfid.stop_crypto1()
+    read_done = time.monotonic_ns()
+    ok, bad, unreadable = audit_slots(snapshot)
+    check_done = time.monotonic_ns()
+    snapshot.wipe()
+
+    line = '{},{:X},{:X},{:X},{},{}'.format(
+        uid_hex, ok, bad, unreadable, (read_done - start) // 1000000, (check_done - read_done) // 1000000)
+    if log is not None:
+        log.write(line + '\n')
+        log.flush()
+    else:
+        print(line)
+
+    cards += 1
+    blue_led.value = False
+    if bad or unreadable:
+        failed_cards += 1
+        red_led.value = True
+    else:
+        green_led.value = True
+    if log is not None:
+        elapsed = time.monotonic() - started
+        rate = cards * 60 / elapsed if elapsed > 0 else 0
+        print(f"{uid_hex}: {'FAILED' if bad or unreadable else 'OK'}. "
+              f"{cards} cards, {failed_cards} failed, {rate:.1f} cards/min.")
+
+    # Next card as soon as this one is taken away
+    wait_for_removal(rfid, raw_uid)
+    leds.off()
@@ -0,0 +1,104 @@
+import time
+from rfidpass import config, crypto, provision, ui
+from rfidpass.reader import open_reader, wait_for_removal
+
+# Writes slot images from utils/host/encode-slot-images.py to a batch of
+# cards: tap each card, wait for the LED, take it away, tap the next one.
+# Jobs come from JOB_FILE on the CIRCUITPY drive, or are pasted on the
+# console if there is no such file.
+JOB_FILE = 'jobs.jsonl'
+
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
+
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
+
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, only used to rebuild a torn slot directory
+key_cache = crypto.load_key_cache()
+
+# Load the job queue
+jobs = provision.JobQueue()
+try:
+    bad = jobs.load_file(JOB_FILE)
+    print(f"Loaded {JOB_FILE}.")
+except OSError:
+    print("Paste the job lines, then an empty line:")
+    bad = jobs.load_console()
+if bad:
+    print(f"{bad} invalid job lines skipped.")
+print(f"{len(jobs.pending)} cards in the queue.")
+
+# Write the queued slots of one card, returns True if they were verified
+def provision_card(raw_uid, images):
+    failed = provision.write_images(rfid, raw_uid, default_key, images)
+    if failed is not None:
+        print(f"  Write or verify failed at sector {failed}.")
+        return False
+
+    # The slots only show up as used once the directory is written
+    if provision.update_directory(rfid, raw_uid, default_key, images, key_cache.slot_keys(raw_uid)):
+        print("  Slot directory updated.")
+    else:
+        print("  No slot directory written.")
+    return True
+
+# Main loop
+failed_cards = 0
+started = None
+print("Waiting for RFID/NFC card...")
+while jobs.pending:
+    (status, tag_type) = rfid.request(rfid.REQIDL)
+    if status != rfid.OK:
+        time.sleep(0.05)
+        continue
+
+    (status, raw_uid) = rfid.SelectTagSN()
+    if status != rfid.OK:
+        continue
+
+    uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+    leds.off()
+    images = jobs.images(raw_uid)
+    if images is None:
+        if jobs.is_done(raw_uid):
+            print(f"Card {uid_hex} is already done.")
+            green_led.value = True
+        else:
+            print(f"Card {uid_hex} is not in the job queue.")
+            red_led.value = True
+    else:
+        if started is None:
+            started = time.monotonic()
+        print(f"Card {uid_hex}: {len(images)} slots.")
+        blue_led.value = True
+        card_start = time.monotonic()
+        ok = provision_card(raw_uid, images)
+        rfid.stop_crypto1()
+        blue_led.value = False
+
+        if ok:
+            jobs.finish(raw_uid)
+            green_led.value = True
+        else:
+            # The card stays queued, tap it again to retry
+            failed_cards += 1
+            red_led.value = True
+
+        done = len(jobs.done)
+        elapsed = time.monotonic() - started
+        rate = done * 60 / elapsed if elapsed > 0 else 0
+        print(f"  {'OK' if ok else 'FAILED'} in {time.monotonic() - card_start:.2f} s. "
+              f"{done} done, {len(jobs.pending)} left, {failed_cards} failures, {rate:.1f} cards/min.")
+
+    # Next card as soon as this one is taken away
+    wait_for_removal(rfid, raw_uid)
+    leds.off()
+
+print("All cards in the queue are done.")
+green_led.value = True
+time.sleep(1)
+green_led.value = False
@@ -1,111 +1,78 @@
-import board
-import digitalio
 import time
-from mfrc522 import MFRC522
-import json
-
-# Define SPI pins for RP2040-Zero
-sck = board.GP2
-mosi = board.GP3
-miso = board.GP4
-cs = board.GP0
-rst = board.GP1
-
-# Initialize MFRC522
-rfid = MFRC522(sck, mosi, miso, rst, cs)
-
-# Initialize LEDs
-red_led = digitalio.DigitalInOut(board.GP27)
-red_led.direction = digitalio.Direction.OUTPUT
-green_led = digitalio.DigitalInOut(board.GP28)
-green_led.direction = digitalio.Direction.OUTPUT
-blue_led = digitalio.DigitalInOut(board.GP29)
-blue_led.direction = digitalio.Direction.OUTPUT
-
-# Turn off LEDs initially
-red_led.value = False
-green_led.value = False
-blue_led.value = False
+from mfrc522 import CardInfo
+from rfidpass import config, crypto, slotdir, slots, ui
+from rfidpass.reader import open_reader
 
-# Load default key from JSON file
-def load_default_key(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data.get('default_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
-    except Exception as e:
-        print(f"Error loading default key: {e}. Using default key.")
-        return [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
 
-# Path to the JSON file containing the default key
-default_key_file = 'default_key.json'
-default_key = load_default_key(default_key_file)
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
+
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
 
 # Default trailer block (key A, access bits, key B)
 default_trailer_block = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0x07, 0x80, 0x69, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
 
-def is_sector_in_use(sector, raw_uid):
-    """Check if a sector is in use (contains data in blocks 0, 1, or 2)."""
-    if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
-        for block in range(3):  # Blocks 0, 1, and 2
-            data = rfid.read(sector * 4 + block)
-            if data is not None and any(byte != 0 for byte in data):
-                return True
-        return False
-    else:
-        print(f"Authentication for sector {sector} failed.")
-        return False
-
-def read_sector_data(sector, raw_uid):
-    """Read data from a specific sector and decode the password and CRC."""
-    if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
-        print(f"Authentication for sector {sector} successful!")
-
-        # Read block 0 and block 1 (password data)
-        block0 = rfid.read(sector * 4)
-        block1 = rfid.read(sector * 4 + 1)
-        if block0 is None or block1 is None:
-            print(f"Failed to read password data from sector {sector}.")
-            return None
-
-        # Read block 2 (password length and CRC)
-        block2 = rfid.read(sector * 4 + 2)
-        if block2 is None:
-            print(f"Failed to read CRC data from sector {sector}.")
-            return None
+def load_directory(raw_uid, keys):
+    """Read the slot directory, probing every sector on cards without one."""
+    directory, writable = slotdir.load(rfid, raw_uid, default_key)
+    if directory is None:
+        print("No slot directory on the card, checking every sector...")
+        directory = slotdir.scan(rfid, raw_uid, default_key, keys)
+    return directory, writable
+
+def remove_from_directory(directory, writable, removed, raw_uid):
+    """Drop slots from the directory before their sectors get wiped."""
+    for slot in removed:
+        directory.remove(slot)
+    if writable:
+        if slotdir.save(rfid, raw_uid, default_key, directory):
+            print("Slot directory updated.")
+        else:
+            print("Failed to update the slot directory.")
 
-        # Extract password length and CRC (little-endian format)
-        password_len = (block2[1] << 8) | block2[0]  # First two bytes: password length
-        stored_crc = (block2[3] << 8) | block2[2]  # Next two bytes: CRC (little-endian)
+def read_sector_data(sector, span, raw_uid, keys):
+    """Read the sectors of a slot and decode the password and format version."""
+    data = slots.read_sectors(rfid, raw_uid, default_key, sector, span)
+    if data is None:
+        print(f"Failed to read slot data from sector {sector}.")
+        return None
 
-        # Combine password data from block 0 and block 1
-        password_bytes = bytes(block0) + bytes(block1)
-        password_bytes = password_bytes[:password_len]  # Trim to actual password length
+    # AES slots first, then the plain v1 slots of mfc-store-password-slots.py
+    version, password_bytes = slots.decode(keys, data)
+    if version == 1 and password_bytes is None:
+        version, password_bytes = slots.decode(keys, data, plain_v1=True)
+    if password_bytes is None:
+        return None
 
-        # Decode the password from UTF-8 bytes
+    try:
         password = password_bytes.decode('utf-8')
-
-        return password, stored_crc
-    else:
-        print(f"Authentication for sector {sector} failed.")
+    except UnicodeError:
         return None
 
+    return password, version
+
 def clear_sector(sector, raw_uid):
     """Clear all data blocks and reset the trailer block for a specific sector."""
-    if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
+    if rfid.auth(rfid.AUTHENT1A, CardInfo.first_block(sector), default_key, raw_uid) == rfid.OK:
         print(f"Authentication for sector {sector} successful!")
 
         # Clear data blocks (blocks 0, 1, and 2)
         for block in range(3):  # Blocks 0, 1, and 2
-            write_status = rfid.write(sector * 4 + block, [0x00] * 16)  # Write 16 zeros
+            write_status = rfid.write(CardInfo.first_block(sector) + block, [0x00] * 16)  # Write 16 zeros
             if write_status == rfid.OK:
                 print(f"Block {block} cleared successfully!")
             else:
                 print(f"Failed to clear block {block}.")
                 return False
 
-        # Reset the trailer block (block 3) to default values
-        write_status = rfid.write(sector * 4 + 3, default_trailer_block)
+        # Reset the trailer block (last block of the sector) to default values
+        write_status = rfid.write(CardInfo.trailer_block(sector), default_trailer_block)
         if write_status == rfid.OK:
             print(f"Trailer block reset to default values.")
             return True
@@ -139,31 +106,32 @@ def clear_sectors():
         if status == rfid.OK:
             uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
             print("Card UID:", uid_hex)
-            print("  - tag type: 0x%02x" % tag_type)
+            print("  - card:", rfid.card_info.family_name)
 
-            # Check which sectors are in use
-            in_use_sectors = []
-            for sector in range(1, 16):  # Sectors 1 to 15
-                if is_sector_in_use(sector, raw_uid):
-                    in_use_sectors.append(sector)
+            # Check which sectors are in use, a chained slot takes the
+            # following sectors as well
+            keys = key_cache.slot_keys(raw_uid)
+            directory, writable = load_directory(raw_uid, keys)
+            in_use_slots = {sector: span for sector, span, _ in directory.slots()}
 
-            if not in_use_sectors:
+            if not in_use_slots:
                 print("No sectors in use. All sectors are empty.")
                 return
 
             # Display list of sectors in use
             print("Sectors in use (can be cleared):")
-            for sector in in_use_sectors:
-                print(f"  Slot {sector} (Sector {sector})")
+            for sector in in_use_slots:
+                print(f"  {directory.describe(sector)}")
             print("  Option: all")
 
             # Prompt user to select a slot to clear
-            user_input = input("Enter the slot number to clear (1-15) or 'all' to clear all sectors: ").strip().lower()
+            user_input = input(f"Enter the slot number to clear (1-{rfid.card_info.sectors - 1}) or 'all' to clear all sectors: ").strip().lower()
 
             if user_input == "all":
-                # Clear all sectors
-                for sector in range(1, 16):
-                    if sector in in_use_sectors:
+                # Clear all sectors, the directory first so a torn clear leaves no listed slot behind
+                remove_from_directory(directory, writable, in_use_slots, raw_uid)
+                for slot, span in in_use_slots.items():
+                    for sector in range(slot, slot + span):
                         print(f"Clearing sector {sector}...")
                         if clear_sector(sector, raw_uid):
                             print(f"Sector {sector} cleared successfully!")
@@ -171,40 +139,41 @@ def clear_sectors():
                         else:
                             print(f"Failed to clear sector {sector}.")
                             red_led.value = True
-                    else:
-                        print(f"Sector {sector} is empty or invalid. Skipping...")
                 return
             else:
                 try:
                     slot = int(user_input)
-                    if slot < 1 or slot > 15:
-                        print("Invalid slot number. Please enter a number between 1 and 15.")
+                    if slot < 1 or slot >= rfid.card_info.sectors:
+                        print(f"Invalid slot number. Please enter a number between 1 and {rfid.card_info.sectors - 1}.")
                         return
-                    if slot not in in_use_sectors:
+                    if slot not in in_use_slots:
                         print("Selected slot is empty or invalid. Please choose a sector from the list above.")
                         return
+                    span = in_use_slots[slot]
 
                     # Read and display data from the selected sector
-                    sector_data = read_sector_data(slot, raw_uid)
+                    sector_data = read_sector_data(slot, span, raw_uid, keys)
                     if sector_data:
-                        password, stored_crc = sector_data
+                        password, version = sector_data
                         print(f"Stored Password: {password}")
-                        print(f"Stored CRC: {stored_crc:04X}")
-
-                        # Ask for confirmation before clearing
-                        confirmation = input("Are you sure you want to clear this sector? (yes/no): ").strip().lower()
-                        if confirmation == "yes":
-                            # Clear the sector
-                            if clear_sector(slot, raw_uid):
-                                print(f"Sector {slot} cleared successfully!")
+                        print(f"Slot format: v{version}, {span} sector(s)")
+                    else:
+                        print(f"No valid data found in slot {slot} (sector {slot}).")
+
+                    # Ask for confirmation before clearing, unreadable slots can be cleared too
+                    confirmation = input("Are you sure you want to clear this slot? (yes/no): ").strip().lower()
+                    if confirmation == "yes":
+                        # Clear every sector of the slot, after dropping it from the directory
+                        remove_from_directory(directory, writable, [slot], raw_uid)
+                        for sector in range(slot, slot + span):
+                            if clear_sector(sector, raw_uid):
+                                print(f"Sector {sector} cleared successfully!")
                                 green_led.value = True
                             else:
-                                print(f"Failed to clear sector {slot}.")
+                                print(f"Failed to clear sector {sector}.")
                                 red_led.value = True
-                        else:
-                            print("Clear operation cancelled.")
                     else:
-                        print(f"No valid data found in slot {slot} (sector {slot}).")
+                        print("Clear operation cancelled.")
 
                 except ValueError:
                     print("Invalid input. Please enter a number or 'all'.")
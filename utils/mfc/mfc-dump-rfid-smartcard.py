@@ -1,30 +1,15 @@
-import board
 import time
-from mfrc522 import MFRC522
+from mfrc522 import CardInfo
+from rfidpass import config, crypto, slotdir, slots
+from rfidpass.reader import open_reader
 
-# Define SPI pins for RP2040-Zero
-sck = board.GP2
-mosi = board.GP3
-miso = board.GP4
-cs = board.GP0
-rst = board.GP1
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
 
-# Initialize MFRC522
-rfid = MFRC522(sck, mosi, miso, rst, cs)
-
-# Load default key from JSON file
-def load_default_key(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data.get('default_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
-    except Exception as e:
-        print(f"Error loading default key: {e}. Using default key.")
-        return [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
-
-# Path to the JSON file containing the default key
-default_key_file = 'default_key.json'
-default_key = load_default_key(default_key_file)
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
 
 # Function to check if data is ASCII-readable
 def is_ascii_readable(data):
@@ -61,18 +46,28 @@ def dump_smartcard_data():
     print("Card UID: {}".format(uid_hex))
     print("=============================================")
 
+    # Slot headers are encrypted with the card key, chained slots span sectors
+    keys = key_cache.slot_keys(raw_uid)
+    chain_head = 0
+    chain_end = 0
+    directory_found = False
+
     # Loop through all sectors and blocks
-    for sector in range(16):  # Assuming a MIFARE Classic 1K card (16 sectors)
+    for sector in range(rfid.card_info.sectors):  # 16 sectors on a 1K card, 40 on a 4K card
         print("\nSector {}:".format(sector))
         print("-----------------------------")
 
         # Authenticate with the default key
-        if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
+        if rfid.auth(rfid.AUTHENT1A, CardInfo.first_block(sector), default_key, raw_uid) == rfid.OK:
             print("Authentication successful for sector {}.".format(sector))
 
+            # Blocks 0-2 of a slot sector
+            slot_data = b''
+            slot_ascii = None
+
             # Loop through all blocks in the sector
-            for block in range(4):  # 4 blocks per sector
-                block_number = sector * 4 + block
+            for block in range(CardInfo.sector_blocks(sector)):  # 4 blocks per sector, 16 in the last 8 of a 4K card
+                block_number = CardInfo.first_block(sector) + block
                 data = rfid.read(block_number)
 
                 if data is not None:
@@ -89,26 +84,53 @@ def dump_smartcard_data():
                     # Highlight special blocks
                     if block_number == 0:
                         print("  ** Manufacturer Block **")
-                    elif block % 4 == 3:
+                    elif block_number == slotdir.INDEX_BLOCK and data[0] == slotdir.MAGIC:
+                        directory_found = True
+                        print("  ** Slot Directory **")
+                    elif block_number == slotdir.LABEL_BLOCK and directory_found:
+                        print("  ** Slot Directory Labels **")
+                    elif block_number == CardInfo.trailer_block(sector):
                         print("  ** Sector Trailer Block **")
                         print("    Key A: {}".format(' '.join(['{:02X}'.format(byte) for byte in data[:6]])))
                         print("    Access Bits: {}".format(' '.join(['{:02X}'.format(byte) for byte in data[6:10]])))
                         print("    Key B: {}".format(' '.join(['{:02X}'.format(byte) for byte in data[10:16]])))
 
-                    # Identify password slots starting from sector 1 for slot 1
-                    if sector >= 1 and block == 0:  # Slot 1 = Sector 1, Slot 2 = Sector 2, etc.
-                        slot = sector
-                        print("  ** Password Slot {} **".format(slot))
-                        if ascii_data:
-                            print("    Password: {}".format(ascii_data))
+                    # Identify password slots starting from sector 1 for slot 1, once
+                    # blocks 0-2 are in: one plaintext v1 block 0 in 256 decrypts to
+                    # a v2 header
+                    if block == 0:
+                        slot_ascii = ascii_data
+                    if block < 3:
+                        slot_data += bytes(data)
+                    if sector >= 1 and block == 2:  # Slot 1 = Sector 1, Slot 2 = Sector 2, etc.
+                        header = keys.decrypt(slot_data[:16])
+                        if sector < chain_end:
+                            print("  ** Password Slot {} (continued) **".format(chain_head))
+                        elif header[0] == slots.MAGIC_V2 and slots.decode(keys, slot_data, plain_v1=True)[0] == 2:
+                            chain_head = sector
+                            chain_end = sector + max(slots.slot_sectors(keys, slot_data, plain_v1=True), 1)
+                            print("  ** Password Slot {} **".format(sector))
+                            length = (header[2] << 8) | header[3]
+                            if length & slots.PACKED:
+                                size = "{} characters, packed".format(length & ~slots.PACKED)
+                            else:
+                                size = "{} bytes".format(length)
+                            print("    Format: v2, {} in sectors {}-{}".format(size, sector, chain_end - 1))
                         else:
-                            print("    Password: Not readable or empty")
+                            slot = sector
+                            print("  ** Password Slot {} **".format(slot))
+                            if slot_ascii:
+                                print("    Password: {}".format(slot_ascii))
+                            else:
+                                print("    Password: Not readable or empty")
                 else:
                     print("Failed to read block {}.".format(block_number))
 
             time.sleep(0.2)
         else:
             print("Authentication failed for sector {}.".format(sector))
+            # A failed authentication halts the card, wake it up for the next sector
+            rfid.reselect(raw_uid)
 
     print("\nData dump complete.")
     print("=============================================")
@@ -0,0 +1,91 @@
+import time
+from rfidpass import config, crypto, migrate, ui
+from rfidpass.reader import open_reader, wait_for_removal
+from rfidpass.snapshot import CardSnapshot
+
+# Re-encodes the legacy slots of every tapped card into v2 under the card's
+# slot key: plaintext v1 slots (mfc-store-password-slots.py), AES v1 slots
+# and, on a device with a secret, v2 slots written under the UID key.
+# Current slots are left alone, slots that decode in no format are reported
+# and never touched. Keep the card on the reader until the LED turns green
+# or red; a card taken away too early can be tapped again, the passwords of
+# its unfinished slots are kept in RAM until it is.
+
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
+
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
+
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
+
+# UID -> {sector: Migration} of cards whose writes failed
+unfinished = {}
+
+# Detect, re-encode and write the slots of one card, returns True if every
+# legacy slot was migrated and no slot is left in an unknown format
+def migrate_card(raw_uid, uid_hex):
+    keys = key_cache.slot_keys(raw_uid)
+    legacy_keys = None
+    if key_cache.secret is not None:
+        legacy_keys = crypto.SlotKeys(crypto.uid_key(raw_uid))
+
+    snapshot = CardSnapshot.take(rfid, raw_uid, default_key, keys, labels=True)
+    found = migrate.plan(snapshot, legacy_keys, unfinished.get(uid_hex))
+    snapshot.wipe()
+
+    for slot in found:
+        if slot.image is not None:
+            print(f"  Slot {slot.sector}: {slot.kind}, {len(slot.payload)} bytes -> v2.")
+        else:
+            print(f"  Slot {slot.sector}: {slot.kind}.")
+
+    failed, directory = migrate.apply(rfid, raw_uid, default_key, keys, found)
+    pending = {slot.sector: slot for slot in found if slot.image is not None}
+    if failed is not None:
+        print(f"  Write or verify failed at sector {failed}, tap the card again.")
+        unfinished[uid_hex] = pending
+        return False
+    unfinished.pop(uid_hex, None)
+    for slot in pending.values():
+        slot.payload = None
+
+    if pending:
+        print(f"  {len(pending)} slots migrated, slot directory {'updated' if directory else 'not written'}.")
+    else:
+        print("  Nothing to migrate.")
+    return all(slot.kind not in (migrate.UNKNOWN, migrate.UNREADABLE) for slot in found)
+
+# Main loop
+print("Waiting for RFID/NFC card...")
+while True:
+    (status, tag_type) = rfid.request(rfid.REQIDL)
+    if status != rfid.OK:
+        time.sleep(0.05)
+        continue
+
+    (status, raw_uid) = rfid.SelectTagSN()
+    if status != rfid.OK:
+        continue
+
+    uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+    print(f"Card {uid_hex}:")
+    leds.off()
+    blue_led.value = True
+    start = time.monotonic()
+    ok = migrate_card(raw_uid, uid_hex)
+    rfid.stop_crypto1()
+    blue_led.value = False
+    if ok:
+        green_led.value = True
+    else:
+        red_led.value = True
+    print(f"  {'OK' if ok else 'FAILED'} in {time.monotonic() - start:.2f} s.")
+
+    # Next card as soon as this one is taken away
+    wait_for_removal(rfid, raw_uid)
+    leds.off()
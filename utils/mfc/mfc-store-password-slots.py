@@ -1,12 +1,9 @@
-import board
-import digitalio
 import time
-from mfrc522 import MFRC522
-import usb_hid
-from adafruit_hid.keyboard import Keyboard
-from adafruit_hid.keycode import Keycode
-import json
+from mfrc522 import CardInfo
 import random
+from crc import crc16
+from rfidpass import config, crypto, slotdir, ui
+from rfidpass.reader import open_reader
 
 # Manually define printable ASCII characters
 ascii_letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
@@ -14,62 +11,21 @@ digits = '0123456789'
 punctuation = '~!@#$%^&*()-_+={}[]|\;:<>,./?'
 printable = ascii_letters + digits + punctuation
 
-# Define SPI pins for RP2040-Zero
-sck = board.GP2
-mosi = board.GP3
-miso = board.GP4
-cs = board.GP0
-rst = board.GP1
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
 
-# Initialize MFRC522
-rfid = MFRC522(sck, mosi, miso, rst, cs)
-
-# Initialize USB HID Keyboard
-kbd = Keyboard(usb_hid.devices)
-
-# Initialize LEDs
-red_led = digitalio.DigitalInOut(board.GP27)
-red_led.direction = digitalio.Direction.OUTPUT
-green_led = digitalio.DigitalInOut(board.GP28)
-green_led.direction = digitalio.Direction.OUTPUT
-blue_led = digitalio.DigitalInOut(board.GP29)
-blue_led.direction = digitalio.Direction.OUTPUT
-
-# Turn off LEDs initially
-red_led.value = False
-green_led.value = False
-blue_led.value = False
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
 
 # Function to generate a random 32-byte password
 def generate_random_password():
     return ''.join(random.choice(printable) for _ in range(32))
 
-# Load default key from JSON file
-def load_default_key(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            return data.get('default_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
-    except Exception as e:
-        print(f"Error loading default key: {e}. Using default key.")
-        return [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
-
-# Path to the JSON file containing the default key
-default_key_file = 'default_key.json'
-default_key = load_default_key(default_key_file)
-
-# CRC-16 checksum calculation
-def calculate_crc(data):
-    crc = 0xFFFF
-    for byte in data:
-        crc ^= byte << 8
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ 0x1021
-            else:
-                crc <<= 1
-            crc &= 0xFFFF
-    return crc
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
 
 # Prepare password for storage
 def prepare_password(password):
@@ -89,25 +45,22 @@ def prepare_password(password):
 
     return block1, block2, password_len
 
-# Check if a sector is empty (skip trailer block)
-def is_sector_empty(sector, raw_uid):
-    if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
-        # Check only the first three blocks (ignore the trailer block)
-        for block in range(3):  # Blocks 0, 1, and 2
-            data = rfid.read(sector * 4 + block)
-            if data is not None and any(byte != 0 for byte in data):
-                return False
-        return True
-    return False
+# Read the slot directory, probing every sector on cards without one
+def load_directory(raw_uid):
+    directory, writable = slotdir.load(rfid, raw_uid, default_key)
+    if directory is None:
+        print("No slot directory on the card, checking every sector...")
+        # The card key tells v2 slots of the AES utility from plain ones
+        keys = key_cache.slot_keys(raw_uid)
+        directory = slotdir.scan(rfid, raw_uid, default_key, keys)
+    return directory, writable
 
 # Prompt user to select a sector
-def select_sector(raw_uid):
+def select_sector(directory):
     print("Available sectors (slots):")
-    available_sectors = []
-    for sector in range(1, 16):  # Sectors 1 to 15
-        if is_sector_empty(sector, raw_uid):
-            available_sectors.append(sector)
-            print(f"  Slot {sector} (Sector {sector})")
+    available_sectors = directory.free_slots()
+    for sector in available_sectors:
+        print(f"  Slot {sector} (Sector {sector})")
 
     if not available_sectors:
         print("No available sectors. All sectors are in use.")
@@ -129,8 +82,7 @@ def write_password_to_sector(password, sector, raw_uid):
     block1, block2, password_len = prepare_password(password)
 
     # Calculate CRC for the password
-    password_bytes = block1 + block2 if block2 else block1
-    crc = calculate_crc(password_bytes)
+    crc = crc16(password.encode('utf-8'))
     crc_bytes = [(crc >> 8) & 0xFF, crc & 0xFF]
 
     # Prepare third block (CRC + password length)
@@ -140,23 +92,23 @@ def write_password_to_sector(password, sector, raw_uid):
     print(f"CRC to be stored: {crc:04X}")
 
     # Authenticate and write to the sector
-    if rfid.auth(rfid.AUTHENT1A, sector * 4, default_key, raw_uid) == rfid.OK:
+    if rfid.auth(rfid.AUTHENT1A, CardInfo.first_block(sector), default_key, raw_uid) == rfid.OK:
         print(f"Authentication for sector {sector} successful!")
 
         # Write block 1 (first 16 bytes of password)
-        if rfid.write(sector * 4, list(block1)) == rfid.OK:
+        if rfid.write(CardInfo.first_block(sector), list(block1)) == rfid.OK:
             print(f"Block 1 written to sector {sector}.")
 
             # Write block 2 (next 16 bytes of password, if any)
             if block2:
-                if rfid.write(sector * 4 + 1, list(block2)) == rfid.OK:
+                if rfid.write(CardInfo.first_block(sector) + 1, list(block2)) == rfid.OK:
                     print(f"Block 2 written to sector {sector}.")
                 else:
                     print(f"Failed to write block 2 to sector {sector}.")
                     return False
 
             # Write block 3 (CRC + password length)
-            if rfid.write(sector * 4 + 2, len_crc_block) == rfid.OK:
+            if rfid.write(CardInfo.first_block(sector) + 2, len_crc_block) == rfid.OK:
                 print(f"Block 3 (CRC + length) written to sector {sector}.")
                 return True
             else:
@@ -172,9 +124,9 @@ def write_password_to_sector(password, sector, raw_uid):
 # Function to validate the stored password
 def validate_stored_password(sector, raw_uid):
     # Read the password blocks back
-    block1 = sector * 4
-    block2 = sector * 4 + 1
-    block3 = sector * 4 + 2
+    block1 = CardInfo.first_block(sector)
+    block2 = CardInfo.first_block(sector) + 1
+    block3 = CardInfo.first_block(sector) + 2
 
     if rfid.auth(rfid.AUTHENT1A, block1, default_key, raw_uid) == rfid.OK:
         # Read block 1 (first 16 bytes of password)
@@ -197,17 +149,19 @@ def validate_stored_password(sector, raw_uid):
 
         # Extract CRC and password length from block 3
         stored_crc = (data3[0] << 8) | data3[1]  # First two bytes: CRC
-        password_len = (data3[2] << 8) | data3[3]  # Next two bytes: password length
+        password_len = data3[2] | (data3[3] << 8)  # Next two bytes: password length (little-endian, as stored)
 
         # Combine password data from block 1 and block 2
         password_bytes = bytes(data1) + bytes(data2)
         password_bytes = password_bytes[:password_len]  # Trim to actual password length
 
         # Calculate CRC for the password
-        calculated_crc = calculate_crc(password_bytes)
+        calculated_crc = crc16(password_bytes)
+        # Slots written before lib/crc.py have it over the zero padded blocks
+        padded_crc = crc16((bytes(data1) + bytes(data2))[:16 if password_len <= 16 else 32])
 
         # Verify CRC
-        if stored_crc == calculated_crc:
+        if stored_crc in (calculated_crc, padded_crc):
             print(f"Password validation successful! CRC matched: {stored_crc:04X}")
             return True
         else:
@@ -236,12 +190,17 @@ def manage_password():
             uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
             print("Card UID:", uid_hex)
 
+            # Used and free slots from the directory in sector 0
+            directory, writable = load_directory(raw_uid)
+
             # Prompt user to select a sector
-            selected_sector = select_sector(raw_uid)
+            selected_sector = select_sector(directory)
             if selected_sector is None:
                 print("No available sectors. Exiting.")
                 return
 
+            label = input(f"Label for the slot (up to {slotdir.LABEL_LEN} characters, optional): ").strip()
+
             # Ask if user wants to use a random password
             use_random = input("Do you want to use a random 32-byte password? (yes/no): ").strip().lower()
             if use_random == 'yes':
@@ -251,6 +210,7 @@ def manage_password():
                 password_to_store = input("Enter your password (max 32 bytes): ").strip()
                 if len(password_to_store.encode('utf-8')) > 32:
                     print("Password is too long. Maximum length is 32 bytes.")
+                    print("Longer passwords are chained over several sectors by mfc-store-password-slots-aes.py.")
                     red_led.value = True
                     return
 
@@ -262,6 +222,14 @@ def manage_password():
                 if validate_stored_password(selected_sector, raw_uid):
                     print("Password validation successful! Data is intact.")
                     green_led.value = True
+
+                    # The slot only shows up as used once the directory is written
+                    if writable:
+                        directory.add(selected_sector, 1, slotdir.V1, len(password_to_store.encode('utf-8')), label)
+                        if slotdir.save(rfid, raw_uid, default_key, directory):
+                            print("Slot directory updated.")
+                        else:
+                            print("Failed to update the slot directory.")
                 else:
                     print("Password validation failed. Data may be corrupted.")
                     red_led.value = True
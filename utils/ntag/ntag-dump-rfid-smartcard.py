@@ -1,7 +1,7 @@
 import board
 import digitalio
 import time
-from mfrc522 import MFRC522
+from mfrc522 import MFRC522, CardInfo
 
 # Define SPI pins for RP2040-Zero
 sck = board.GP2
@@ -25,18 +25,21 @@ def dump_smartcard(rfid, key):
     if status == rfid.OK:
         uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
         print("Card UID:", uid_hex)
-        
-        if rfid.IsNTAG():
-            print("Got NTAG{}".format(rfid.NTAG))
+        print("Card:", rfid.card_info)
+
+        # The SAK from the select already tells the family apart, so the card
+        # stays selected and no GET_VERSION/re-select round trip is needed
+        if rfid.card_info.family == CardInfo.ULTRALIGHT:
             rfid.MFRC522_Dump_NTAG()
-                    
+
+        elif rfid.card_info.is_classic:
+            # Mini, 1K or 4K: dump up to the block after the last sector
+            end = CardInfo.first_block(rfid.card_info.sectors)
+            rfid.MFRC522_DumpClassic1K(raw_uid, End=end, keyA=key)
+
         else:
-            (stat, tag_type) = rfid.request(rfid.REQIDL)
-            if stat == rfid.OK:
-                (stat, raw_uid) = rfid.SelectTagSN()
-                if stat == rfid.OK:
-                    rfid.MFRC522_DumpClassic1K(raw_uid, keyA=key)
-                    
+            print("Unsupported card family.")
+
         # Stop crypto
         rfid.stop_crypto1()
         
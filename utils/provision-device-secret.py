@@ -0,0 +1,73 @@
+import binascii
+import os
+import time
+import nvmstore
+from rfidpass import config, crypto
+
+# Stores the device secret the slot keys are derived from (see
+# rfidpass.crypto.derive_key). Readers that share cards need the same secret
+# and KDF cost. Slots written before the device was provisioned are keyed by
+# the UID alone and have to be written again.
+
+def time_kdf(secret, rounds):
+    start = time.monotonic_ns()
+    crypto.derive_key(b'\x01\x02\x03\x04', secret, rounds)
+    return (time.monotonic_ns() - start) / 1000000
+
+def read_secret():
+    text = input("Enter the 32 hex digit secret, or nothing to generate one: ").strip()
+    if not text:
+        return os.urandom(16), True
+    try:
+        secret = binascii.unhexlify(text)
+    except ValueError:
+        secret = b''
+    if len(secret) != 16:
+        print("The secret must be 16 bytes (32 hex digits).")
+        return None, False
+    return secret, False
+
+def read_rounds():
+    text = input("KDF rounds (default {}): ".format(config.KDF_ROUNDS)).strip()
+    if not text:
+        return config.KDF_ROUNDS
+    try:
+        rounds = int(text)
+    except ValueError:
+        rounds = 0
+    if not 0 < rounds <= 0xFFFF:
+        print("The number of rounds must be between 1 and 65535.")
+        return None
+    return rounds
+
+def provision():
+    current = nvmstore.load_device_secret()
+    if current is None:
+        print("This device has no secret, slot keys are derived from the card UID alone.")
+    else:
+        print("This device is provisioned, KDF rounds: {}.".format(current[1]))
+        confirm = input("Replace the secret? Cards written with the old one become unreadable (yes/no): ")
+        if confirm.strip().lower() != 'yes':
+            print("Nothing changed.")
+            return
+
+    secret, generated = read_secret()
+    if secret is None:
+        return
+    rounds = read_rounds()
+    if rounds is None:
+        return
+
+    print("Key derivation takes {:.1f} ms per new card.".format(time_kdf(secret, rounds)))
+
+    if not nvmstore.save_device_secret(secret, rounds):
+        print("No NVM available, the secret could not be saved.")
+        return
+
+    print("Device secret saved.")
+    if generated:
+        # The only time the secret is shown, other readers need it
+        print("Secret: {}".format(binascii.hexlify(secret).decode()))
+        print("Keep it safe, every reader that shares these cards needs it.")
+
+provision()
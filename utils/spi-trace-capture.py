@@ -0,0 +1,68 @@
+import board
+import time
+import json
+from mfrc522 import MFRC522
+import nvmstore
+from spitrace import SpiTrace
+
+# Define SPI pins for RP2040-Zero
+sck = board.GP2
+mosi = board.GP3
+miso = board.GP4
+cs = board.GP0
+rst = board.GP1
+
+# Every register access of the tap below ends up in the ring buffer
+trace = SpiTrace(1024)
+
+# Initialize MFRC522
+rfid = MFRC522(sck, mosi, miso, rst, cs, rx_gain=nvmstore.load_rx_gain(), trace=trace)
+
+# Block read during the captured tap
+reference_block = 1
+
+# Load default key from JSON file
+def load_default_key(file_path):
+    try:
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+            return data.get('default_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
+    except Exception as e:
+        print(f"Error loading default key: {e}. Using default key.")
+        return [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+
+# Path to the JSON file containing the default key
+default_key_file = 'default_key.json'
+default_key = load_default_key(default_key_file)
+
+def capture_tap():
+    print("Place a card on the reader...")
+
+    # Only keep the polls right before the card shows up
+    while True:
+        trace.clear()
+        (status, tag_type) = rfid.request(rfid.REQIDL)
+        if status == rfid.OK:
+            break
+        time.sleep(0.1)
+
+    (status, raw_uid) = rfid.SelectTagSN()
+    if status == rfid.OK:
+        uid_hex = ''.join('{:02X}'.format(x) for x in raw_uid)
+        print("Card UID:", uid_hex)
+        print("  - card:", rfid.card_info.family_name)
+
+        if rfid.card_info.is_classic:
+            status = rfid.auth(rfid.AUTHENT1A, reference_block, default_key, raw_uid)
+        if status == rfid.OK and rfid.read(reference_block) is None:
+            status = rfid.ERR
+        rfid.stop_crypto1()
+
+    print("Tap result:", rfid.error_text(status))
+    print("Register accesses:", trace.total, "kept:", len(trace))
+
+    # Save the lines between the markers to a file and feed it to
+    # utils/host/spi-trace-replay.py
+    trace.dump()
+
+capture_tap()
@@ -0,0 +1,40 @@
+import time
+import usb_cdc
+from rfidpass import config, crypto, protocol, ui
+from rfidpass.reader import open_reader
+from rfidpass.service import Service
+
+# Serves the binary command channel of rfidpass.protocol on the second USB
+# serial port, for utils/host/rfidpass_client.py. The port only exists when
+# boot.py enables it:
+#
+#   import usb_cdc
+#   usb_cdc.enable(console=True, data=True)
+
+# Initialize MFRC522 on the board pins, with the calibrated receiver gain
+rfid = open_reader()
+
+# Initialize LEDs, off
+leds = ui.Leds()
+red_led, green_led, blue_led = leds.red, leds.green, leds.blue
+
+# Key A of the password sectors from default_key.json
+default_key = config.load_default_key()
+# Slot keys, derived from the device secret on a provisioned device
+key_cache = crypto.load_key_cache()
+
+if usb_cdc.data is None:
+    print("No usb_cdc data port, enable it in boot.py.")
+    red_led.value = True
+else:
+    service = Service(rfid, default_key, key_cache, usb_cdc.data)
+    print("Serving commands on the usb_cdc data port.")
+    blue_led.value = True
+    while True:
+        key_cache.expire(time.monotonic())
+        status = service.poll()
+        if status is not None:
+            # Last command OK or not, until the next one
+            green_led.value = status == protocol.OK
+            red_led.value = status != protocol.OK
+        time.sleep(0.005)